@@ -30,13 +30,15 @@ setup(
     license='Apache License 2.0',
     packages=find_packages(),
     install_requires=[
-        'spaceone-core',
+        'spaceone-core~=1.7.4',
         'spaceone-api',
         'mongoengine',
         'pandas',
         'numpy',
         'python-consul',
-        'redis'
+        'redis',
+        'croniter',
+        'cachetools'
     ],
     zip_safe=False,
 )
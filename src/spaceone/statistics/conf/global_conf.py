@@ -27,6 +27,153 @@ CONNECTORS = {
     }
 }
 
+# PluginManager endpoint cache of (plugin_id, version, domain_id) -> endpoint
+#   - ttl: seconds to reuse a resolved endpoint (invalidated by update_plugin or a connection failure)
+PLUGIN_ENDPOINT_CACHE = {
+    'enabled': False,
+    'ttl': 300,
+    'max_size': 256
+}
+
+# Process-wide gRPC channel pool of the connectors
+#   - size: channels per endpoint (used in round-robin)
+#   - keepalive_time_ms / keepalive_timeout_ms: HTTP/2 keepalive pings to detect broken channels
+GRPC_CHANNEL_POOL = {
+    'enabled': False,
+    'size': 2,
+    'keepalive_time_ms': 30000,
+    'keepalive_timeout_ms': 10000
+}
+
+# Fetch query/join/concat stages of Resource.stat concurrently
+#   - mode: THREAD (a thread per sub query, up to max_workers) |
+#           ASYNC (all sub queries are awaited on the event loop by AsyncServiceConnector)
+AGGREGATE_PARALLEL_QUERY = {
+    'enabled': False,
+    'mode': 'THREAD',
+    'max_workers': 4
+}
+
+# Share the results of the identical leading query/join/concat stages
+# between the History jobs of the same scheduler tick in a domain
+#   - ttl: seconds to keep a shared result (longer than the jobs of a tick take)
+#   - max_size: number of shared results
+AGGREGATE_SHARED_EXECUTION = {
+    'enabled': False,
+    'ttl': 300,
+    'max_size': 64
+}
+
+# Coalesce identical concurrent requests into one execution (single-flight)
+#   - Resource.stat: the same aggregate and page in a domain
+#   - ServiceConnector.stat_resource: the same upstream query in a domain
+STAT_SINGLE_FLIGHT = {
+    'enabled': False
+}
+
+# Deadline(seconds) of the upstream stat requests of ServiceConnector and AsyncServiceConnector
+#   - services: deadline per service (e.g. {'inventory': 10, 'monitoring': 60}, 0 = no deadline)
+#   - wait_margin: seconds added to the longest deadline to wait for the asynchronous sub queries
+#   - max_wait: upper bound(seconds) of the wait, also used if any deadline is 0
+STAT_RESOURCE_DEADLINE = {
+    'default': 0,
+    'services': {},
+    'wait_margin': 10,
+    'max_wait': 600
+}
+
+# Resilience of the upstream stat requests per resource type (service.resource)
+#   - hedge: send a duplicate request if the first one is slower than the percentile latency
+#       - the response of the duplicate request is used if the first one fails
+#       - requires STAT_RESOURCE_DEADLINE, hedging is off for the services without a deadline
+#       - min_samples: latencies needed before hedging, min_delay: lower bound(seconds) of the hedge delay
+#       - budget: max ratio of hedged requests to all requests
+#       - max_workers: threads of the hedged requests (the first requests run on the caller threads)
+#   - circuit_breaker: reject requests for recovery_time(seconds) after failure_threshold consecutive failures
+#       - stale_fallback: return the expired STAT_RESOURCE_CACHE response (up to stale_ttl seconds) while open
+STAT_RESOURCE_RESILIENCE = {
+    'hedge': {
+        'enabled': False,
+        'percentile': 95,
+        'window_size': 100,
+        'min_samples': 20,
+        'min_delay': 0.05,
+        'budget': 0.1,
+        'max_workers': 16
+    },
+    'circuit_breaker': {
+        'enabled': False,
+        'failure_threshold': 5,
+        'recovery_time': 30,
+        'stale_fallback': False,
+        'stale_ttl': 3600
+    }
+}
+
+# ServiceConnector.stat_resource cache
+#   - backends: CACHES backend names to look up in order (e.g. local LRU -> redis)
+#   - resource_ttl: TTL(seconds) per resource type. (e.g. {'inventory.Server': 600}, 0 = no cache)
+STAT_RESOURCE_CACHE = {
+    'enabled': False,
+    'backends': ['local', 'default'],
+    'ttl': 300,
+    'resource_ttl': {},
+    'max_result_count': 10000
+}
+
+# HistoryManager.create_history bulk write
+HISTORY_BULK_INSERT = {
+    'chunk_size': 1000
+}
+
+# History storage layout
+#   - layout: ROW (one document per row) | BUCKET (one document per bucket_size rows of a run)
+HISTORY_STORAGE = {
+    'layout': 'ROW',
+    'bucket_size': 1000
+}
+
+# Delta persistence: write only the changed rows of a run
+#   - keys: key fields of a row (required when delta is enabled)
+#   - snapshot_interval: hours between full snapshots
+#   - topics: {<topic>: {'enabled': True, ...}} overrides per topic
+#   - schedule.options.delta overrides per schedule
+#   - History.list / stat return the history of a delta topic only if the query has a topic filter
+HISTORY_DELTA = {
+    'enabled': False,
+    'keys': [],
+    'snapshot_interval': 24,
+    'topics': {}
+}
+
+# History retention and rollup
+#   - raw_days / daily_days / monthly_days: days to keep each granularity (0: forever)
+#   - topics: {<topic>: {'raw_days': 7, ...}} overrides per topic
+#   - schedule.options.retention overrides per schedule
+#   - rollup_hour: UTC hour when the scheduler rolls up the previous day (and month)
+#   - stat_granularity_days: HistoryService.stat with granularity AUTO reads DAILY/MONTHLY rollups
+#                            when the time range is longer than these days
+HISTORY_RETENTION = {
+    'enabled': False,
+    'raw_days': 30,
+    'daily_days': 730,
+    'monthly_days': 0,
+    'topics': {},
+    'rollup_hour': 0,
+    'stat_granularity_days': {
+        'DAILY': 7,
+        'MONTHLY': 180
+    }
+}
+
+# Schedule change notifications from ScheduleManager to StatScheduler
+#   - queue: QUEUES name of a pub/sub backend (e.g. RedisQueue with a dedicated channel)
+#            which has to be configured in both the API server and the scheduler
+SCHEDULE_NOTIFICATION = {
+    'enabled': False,
+    'queue': 'schedule_notification_q'
+}
+
 ENDPOINTS = {}
 LOG = {}
 QUEUES = {}
@@ -3,3 +3,4 @@ from spaceone.statistics.connector.identity_connector import IdentityConnector
 from spaceone.statistics.connector.repository_connector import RepositoryConnector
 from spaceone.statistics.connector.plugin_connector import PluginConnector
 from spaceone.statistics.connector.secret_connector import SecretConnector
+from spaceone.statistics.connector.async_service_connector import AsyncServiceConnector
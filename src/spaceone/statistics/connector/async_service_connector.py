@@ -0,0 +1,239 @@
+import asyncio
+import logging
+import random
+import ssl
+import time
+
+import grpc
+from google.protobuf import symbol_database
+
+from spaceone.core import config
+from spaceone.statistics.connector.service_connector import ServiceConnector
+from spaceone.statistics.lib import pygrpc_adapter, resilience, single_flight
+from spaceone.statistics.error.resource import *
+
+__all__ = ['AsyncServiceConnector']
+
+_LOGGER = logging.getLogger(__name__)
+
+# grpc.aio channels, TLS credentials and stat methods of the event loop (lib.event_loop)
+_AIO_CHANNELS = {}
+_AIO_CREDENTIALS = {}
+_STAT_METHODS = {}
+
+# Exponential backoff (seconds) with full jitter between the retries of UNAVAILABLE
+RETRY_BACKOFF = 0.1
+RETRY_BACKOFF_MAX = 2
+
+
+class AsyncServiceConnector(ServiceConnector):
+    """ asyncio variant of ServiceConnector on grpc.aio
+
+    stat_resource is a coroutine, so that many upstream requests can be awaited from one thread.
+    It has to be awaited on the event loop of lib.event_loop, which owns the grpc.aio channels.
+    Request messages are made with the reflection of the pooled client of the endpoint.
+    Blocking work (the reflection, TLS handshake and cache) is run in the default executor of the loop.
+    """
+
+    def __init__(self, transaction, config):
+        # The endpoints of ServiceConnector are used unless they are set for AsyncServiceConnector
+        super().__init__(transaction, config or _get_service_connector_conf())
+
+    async def stat_resource(self, service, resource, query, domain_id, use_cache=True):
+        if not config.get_global('STAT_SINGLE_FLIGHT', {}).get('enabled', False):
+            return await self._stat_resource(service, resource, query, domain_id, use_cache)
+
+        # Identical requests in flight share one upstream request
+        single_flight_key = f'{self._make_cache_key(service, resource, query, domain_id)}:{use_cache}'
+        return await single_flight.get_single_flight('async_stat_resource').do_async(
+            single_flight_key, self._stat_resource, service, resource, query, domain_id, use_cache)
+
+    async def _stat_resource(self, service, resource, query, domain_id, use_cache=True):
+        _LOGGER.debug(f'[stat_resource] {service}.{resource} : {query}')
+
+        resource_type = f'{service}.{resource}'
+        cache_conf = config.get_global('STAT_RESOURCE_CACHE', {})
+        cache_ttl = self._get_cache_ttl(service, resource, cache_conf)
+        use_cache = use_cache and cache_conf.get('enabled', False) and cache_ttl > 0
+        cache_key = self._make_cache_key(service, resource, query, domain_id) if use_cache else None
+
+        loop = asyncio.get_running_loop()
+
+        if use_cache:
+            cached_response = await loop.run_in_executor(None, self._get_cached_response, cache_key, cache_conf)
+            if cached_response is not None:
+                _LOGGER.debug(f'[stat_resource] cache hit: {cache_key}')
+                return cached_response
+
+        circuit_breaker = self._get_circuit_breaker(resource_type)
+        if circuit_breaker and not circuit_breaker.allow_request():
+            return await loop.run_in_executor(None, self._reject_request, resource_type, cache_key, cache_conf)
+
+        resilience.count(resource_type, 'requests')
+
+        try:
+            if service not in self.client:
+                await loop.run_in_executor(None, self._init_client, service, resource)
+
+            self._check_resource_type(service, resource)
+
+            response = await self._call_stat_with_hedging(service, resource, {
+                'domain_id': domain_id,
+                'query': query
+            })
+
+        except Exception as e:
+            self._record_result(resource_type, circuit_breaker, e)
+            raise e
+
+        self._record_result(resource_type, circuit_breaker)
+
+        response = self._change_message(response)
+
+        if use_cache:
+            await loop.run_in_executor(None, self._set_cached_response, cache_key, response, cache_ttl, cache_conf)
+
+        return response
+
+    def _init_client(self, service, resource):
+        super()._init_client(service, resource)
+
+        endpoint = self._get_endpoint(service, resource)
+        if self._is_ssl_enabled(service) and endpoint not in _AIO_CREDENTIALS:
+            _AIO_CREDENTIALS[endpoint] = _get_ssl_credentials(endpoint)
+
+    async def _call_stat_with_hedging(self, service, resource, request):
+        """ Send a hedged (duplicate) request if the first one is slower than the hedge delay
+
+        The response which arrives first is returned and the other request is cancelled.
+        """
+        resource_type = f'{service}.{resource}'
+        hedge_delay = resilience.get_hedge_delay(resource_type)
+
+        first_task = asyncio.ensure_future(self._call_stat(service, resource, request))
+        if hedge_delay is None:
+            return await first_task
+
+        await asyncio.wait([first_task], timeout=hedge_delay)
+
+        pending = {first_task}
+        if not first_task.done():
+            _LOGGER.debug(f'[_call_stat_with_hedging] send a hedged request: {resource_type} '
+                          f'(delay = {hedge_delay})')
+            resilience.count(resource_type, 'hedges')
+            pending.add(asyncio.ensure_future(self._call_stat(service, resource, request)))
+
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    error = task.exception()
+                    continue
+
+                for pending_task in pending:
+                    pending_task.cancel()
+
+                if task is not first_task:
+                    resilience.count(resource_type, 'hedge_wins')
+
+                return task.result()
+
+        raise error
+
+    async def _call_stat(self, service, resource, request):
+        client = self.client[service]
+        endpoint = self._get_endpoint(service, resource)
+        method_key, stat_method = self._get_stat_method(endpoint, client, resource)
+        message = pygrpc_adapter.make_message(client, request, method_key)
+        metadata = self.transaction.get_connection_meta()
+
+        deadline = self._get_deadline(service)
+        expired_at = time.time() + deadline if deadline else None
+        retries = 0
+
+        while True:
+            timeout = max(expired_at - time.time(), 0) if expired_at else None
+
+            try:
+                started_at = time.time()
+                response = await stat_method(message, metadata=metadata, timeout=timeout)
+                resilience.get_latency_tracker(f'{service}.{resource}').add(time.time() - started_at)
+                return response
+
+            except grpc.aio.AioRpcError as e:
+                if e.code() == grpc.StatusCode.DEADLINE_EXCEEDED:
+                    raise ERROR_STAT_RESOURCE_DEADLINE(resource_type=f'{service}.{resource}', deadline=deadline)
+
+                if e.code() == grpc.StatusCode.UNAVAILABLE and retries < pygrpc_adapter.MAX_RETRIES:
+                    backoff = random.uniform(0, min(RETRY_BACKOFF * 2 ** retries, RETRY_BACKOFF_MAX))
+                    if expired_at:
+                        backoff = min(backoff, max(expired_at - time.time(), 0))
+
+                    retries += 1
+                    _LOGGER.debug(f'[_call_stat] retry gRPC call: reason = {e.details()}, retry = {retries} '
+                                  f'(backoff = {backoff:.3f})')
+                    await asyncio.sleep(backoff)
+                    continue
+
+                # Same errors as the synchronous client
+                pygrpc_adapter.check_error(client, e)
+                raise e
+
+    @staticmethod
+    def _get_stat_method(endpoint, client, resource):
+        """
+        Returns:
+            method_key (str): e.g. /spaceone.api.inventory.v1.Server/stat
+            stat_method (grpc.aio.UnaryUnaryMultiCallable)
+        """
+        method_key = pygrpc_adapter.find_method_key(client, resource, 'stat')
+        if method_key is None:
+            raise ERROR_NOT_SUPPORT_RESOURCE_TYPE(resource_type=resource)
+
+        if (endpoint, method_key) not in _STAT_METHODS:
+            method_name = method_key.lstrip('/').replace('/', '.')
+            sym_db = symbol_database.Default()
+            output_type = sym_db.pool.FindMethodByName(method_name).output_type
+
+            _STAT_METHODS[(endpoint, method_key)] = _get_aio_channel(endpoint).unary_unary(
+                method_key,
+                request_serializer=lambda message: message.SerializeToString(),
+                response_deserializer=sym_db.GetSymbol(output_type.full_name).FromString)
+
+        return method_key, _STAT_METHODS[(endpoint, method_key)]
+
+
+def _get_aio_channel(endpoint):
+    if endpoint not in _AIO_CHANNELS:
+        pool_conf = config.get_global('GRPC_CHANNEL_POOL', {})
+        options = [
+            ('grpc.keepalive_time_ms', pool_conf.get('keepalive_time_ms', 30000)),
+            ('grpc.keepalive_timeout_ms', pool_conf.get('keepalive_timeout_ms', 10000)),
+            ('grpc.keepalive_permit_without_calls', 1),
+            ('grpc.http2.max_pings_without_data', 0)
+        ]
+
+        # The credentials of a grpc+ssl endpoint are made by _init_client
+        if endpoint in _AIO_CREDENTIALS:
+            _AIO_CHANNELS[endpoint] = grpc.aio.secure_channel(endpoint, _AIO_CREDENTIALS[endpoint], options=options)
+        else:
+            _AIO_CHANNELS[endpoint] = grpc.aio.insecure_channel(endpoint, options=options)
+
+    return _AIO_CHANNELS[endpoint]
+
+
+def _get_ssl_credentials(endpoint):
+    """ Trust the certificate of the server like the secure channel of pygrpc.client """
+
+    host, port = endpoint.rsplit(':', 1)
+
+    try:
+        cert = ssl.get_server_certificate((host, int(port)))
+        return grpc.ssl_channel_credentials(str.encode(cert))
+    except Exception as e:
+        raise ERROR_GRPC_TLS_HANDSHAKE(reason=e)
+
+
+def _get_service_connector_conf():
+    return config.get_connector('ServiceConnector')
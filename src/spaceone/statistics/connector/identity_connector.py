@@ -3,9 +3,9 @@ import logging
 from google.protobuf.json_format import MessageToDict
 
 from spaceone.core.connector import BaseConnector
-from spaceone.core import pygrpc
 from spaceone.core.utils import parse_endpoint
 from spaceone.core.error import *
+from spaceone.statistics.lib import channel_pool
 
 
 __all__ = ['IdentityConnector']
@@ -24,7 +24,7 @@ class IdentityConnector(BaseConnector):
 
         for (k, v) in self.config['endpoint'].items():
             e = parse_endpoint(v)
-            self.client = pygrpc.client(endpoint=f'{e.get("hostname")}:{e.get("port")}', version=k)
+            self.client = channel_pool.get_client(endpoint=f'{e.get("hostname")}:{e.get("port")}', version=k)
 
     def get_user(self, user_id, domain_id):
         response = self.client.User.get({
@@ -3,9 +3,9 @@ import logging
 from google.protobuf.json_format import MessageToDict
 
 from spaceone.core.connector import BaseConnector
-from spaceone.core import pygrpc
 from spaceone.core.utils import parse_endpoint
 from spaceone.core.error import *
+from spaceone.statistics.lib import channel_pool
 from spaceone.statistics.error.resource import *
 
 __all__ = ['PluginConnector']
@@ -25,7 +25,7 @@ class PluginConnector(BaseConnector):
         if static_endpoint:
             endpoint = static_endpoint.get('v1')
         e = parse_endpoint(endpoint)
-        self.client = pygrpc.client(endpoint=f'{e.get("hostname")}:{e.get("port")}', version='plugin')
+        self.client = channel_pool.get_client(endpoint=f'{e.get("hostname")}:{e.get("port")}', version='plugin')
 
     def init_client(self, service, resource):
         if service not in self.client:
@@ -36,7 +36,7 @@ class PluginConnector(BaseConnector):
             if e.get('path') is None:
                 raise ERROR_CONNECTOR_CONFIGURATION(backend=self.__class__.__name__)
 
-            self.client[service] = pygrpc.client(endpoint=f'{e.get("hostname")}:{e.get("port")}')
+            self.client[service] = channel_pool.get_client(endpoint=f'{e.get("hostname")}:{e.get("port")}')
 
     def init(self, options):
         response = self.client.Plugin.init({
@@ -3,9 +3,9 @@ import logging
 from google.protobuf.json_format import MessageToDict
 
 from spaceone.core.connector import BaseConnector
-from spaceone.core import pygrpc
 from spaceone.core.utils import parse_endpoint
 from spaceone.core.error import *
+from spaceone.statistics.lib import channel_pool
 from spaceone.statistics.error.resource import *
 
 __all__ = ['RepositoryConnector']
@@ -23,7 +23,7 @@ class RepositoryConnector(BaseConnector):
     def _init_client(self):
         for version, uri in self.config['endpoint'].items():
             e = parse_endpoint(uri)
-            self.client = pygrpc.client(endpoint=f'{e.get("hostname")}:{e.get("port")}', version=version)
+            self.client = channel_pool.get_client(endpoint=f'{e.get("hostname")}:{e.get("port")}', version=version)
 
     def register_plugin(self, name, image, domain_id):
         response = self.client.Plugin.register({
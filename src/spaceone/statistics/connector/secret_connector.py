@@ -3,9 +3,9 @@ import logging
 from google.protobuf.json_format import MessageToDict
 
 from spaceone.core.connector import BaseConnector
-from spaceone.core import pygrpc
 from spaceone.core.utils import parse_endpoint
 from spaceone.core.error import *
+from spaceone.statistics.lib import channel_pool
 
 __all__ = ['SecretConnector']
 
@@ -22,7 +22,7 @@ class SecretConnector(BaseConnector):
     def _init_client(self):
         for version, uri in self.config['endpoint'].items():
             e = parse_endpoint(uri)
-            self.client = pygrpc.client(endpoint=f'{e.get("hostname")}:{e.get("port")}', version=version)
+            self.client = channel_pool.get_client(endpoint=f'{e.get("hostname")}:{e.get("port")}', version=version)
 
     def _check_config(self):
         if 'endpoint' not in self.config:
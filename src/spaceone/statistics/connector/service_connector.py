@@ -1,17 +1,24 @@
 import logging
+import hashlib
+import threading
+import time
 
 from google.protobuf.json_format import MessageToDict
 
 from spaceone.core.connector import BaseConnector
-from spaceone.core import pygrpc
+from spaceone.core import cache, config, utils
 from spaceone.core.utils import parse_endpoint
 from spaceone.core.error import *
+from spaceone.statistics.lib import channel_pool, resilience, single_flight
 from spaceone.statistics.error.resource import *
 
 __all__ = ['ServiceConnector']
 
 _LOGGER = logging.getLogger(__name__)
 
+# Result of a hedged request which is not sent
+_NOT_SENT = object()
+
 
 class ServiceConnector(BaseConnector):
 
@@ -21,14 +28,21 @@ class ServiceConnector(BaseConnector):
 
     def _init_client(self, service, resource):
         if service not in self.client:
-            if service not in self.config:
-                raise ERROR_INVALID_RESOURCE_TYPE(resource_type=f'{service}.{resource}')
+            self.client[service] = channel_pool.get_client(endpoint=self._get_endpoint(service, resource),
+                                                           ssl_enabled=self._is_ssl_enabled(service))
+
+    def _get_endpoint(self, service, resource):
+        if service not in self.config:
+            raise ERROR_INVALID_RESOURCE_TYPE(resource_type=f'{service}.{resource}')
+
+        e = parse_endpoint(self.config[service])
+        if e.get('path') is None:
+            raise ERROR_CONNECTOR_CONFIGURATION(backend=self.__class__.__name__)
 
-            e = parse_endpoint(self.config[service])
-            if e.get('path') is None:
-                raise ERROR_CONNECTOR_CONFIGURATION(backend=self.__class__.__name__)
+        return f'{e.get("hostname")}:{e.get("port")}'
 
-            self.client[service] = pygrpc.client(endpoint=f'{e.get("hostname")}:{e.get("port")}')
+    def _is_ssl_enabled(self, service):
+        return parse_endpoint(self.config[service]).get('scheme') == 'grpc+ssl'
 
     def _check_resource_type(self, service, resource):
         if service not in self.client.keys():
@@ -40,19 +54,252 @@ class ServiceConnector(BaseConnector):
         if not hasattr(getattr(self.client[service], resource), 'stat'):
             raise ERROR_NOT_SUPPORT_RESOURCE_TYPE(resource_type=f'{service}.{resource}')
 
-    def stat_resource(self, service, resource, query, domain_id):
+    def stat_resource(self, service, resource, query, domain_id, use_cache=True):
+        if not config.get_global('STAT_SINGLE_FLIGHT', {}).get('enabled', False):
+            return self._stat_resource(service, resource, query, domain_id, use_cache)
+
+        # Identical requests in flight share one upstream request
+        single_flight_key = f'{self._make_cache_key(service, resource, query, domain_id)}:{use_cache}'
+        return single_flight.get_single_flight('stat_resource').do(single_flight_key, self._stat_resource,
+                                                                   service, resource, query, domain_id, use_cache)
+
+    def _stat_resource(self, service, resource, query, domain_id, use_cache=True):
         _LOGGER.debug(f'[stat_resource] {service}.{resource} : {query}')
 
-        self._init_client(service, resource)
-        self._check_resource_type(service, resource)
+        resource_type = f'{service}.{resource}'
+        cache_conf = config.get_global('STAT_RESOURCE_CACHE', {})
+        cache_ttl = self._get_cache_ttl(service, resource, cache_conf)
+        use_cache = use_cache and cache_conf.get('enabled', False) and cache_ttl > 0
+        cache_key = self._make_cache_key(service, resource, query, domain_id) if use_cache else None
+
+        if use_cache:
+            cached_response = self._get_cached_response(cache_key, cache_conf)
+            if cached_response is not None:
+                _LOGGER.debug(f'[stat_resource] cache hit: {cache_key}')
+                return cached_response
+
+        circuit_breaker = self._get_circuit_breaker(resource_type)
+        if circuit_breaker and not circuit_breaker.allow_request():
+            return self._reject_request(resource_type, cache_key, cache_conf)
+
+        resilience.count(resource_type, 'requests')
+
+        try:
+            self._init_client(service, resource)
+            self._check_resource_type(service, resource)
 
-        response = getattr(self.client[service], resource).stat({
-            'domain_id': domain_id,
-            'query': query
-        }, metadata=self.transaction.get_connection_meta())
+            response = self._stat_with_hedging(resource_type, getattr(self.client[service], resource).stat, {
+                'domain_id': domain_id,
+                'query': query
+            }, self.transaction.get_connection_meta(), self._get_deadline(service))
 
-        return self._change_message(response)
+        except Exception as e:
+            self._record_result(resource_type, circuit_breaker, e)
+            raise e
+
+        self._record_result(resource_type, circuit_breaker)
+
+        response = self._change_message(response)
+
+        if use_cache:
+            self._set_cached_response(cache_key, response, cache_ttl, cache_conf)
+
+        return response
+
+    @staticmethod
+    def _stat_with_hedging(resource_type, stat_method, request, metadata, deadline):
+        """ Send a hedged (duplicate) request if the first one is slower than the hedge delay
+
+        The first request runs on the caller thread and only the hedged request runs in the hedge executor,
+        so the executor never limits the requests in flight. The response of the hedged request is used
+        if the first request fails. Hedging requires a deadline, so an unused hedged request ends by it.
+        """
+        latency_tracker = resilience.get_latency_tracker(resource_type)
+        hedge_delay = resilience.get_hedge_delay(resource_type) if deadline else None
+
+        def _stat():
+            started_at = time.time()
+
+            try:
+                response = stat_method(request, metadata=metadata, timeout=deadline)
+            except ERROR_INTERNAL_API as e:
+                if deadline and time.time() - started_at >= deadline:
+                    raise ERROR_STAT_RESOURCE_DEADLINE(resource_type=resource_type, deadline=deadline)
+                raise e
+
+            latency_tracker.add(time.time() - started_at)
+            return response
+
+        if hedge_delay is None or hedge_delay >= deadline:
+            return _stat()
+
+        first_done = threading.Event()
+
+        def _hedge():
+            # Nothing is sent if the first request is done within the hedge delay
+            if first_done.wait(hedge_delay):
+                return _NOT_SENT
+
+            _LOGGER.debug(f'[_stat_with_hedging] send a hedged request: {resource_type} (delay = {hedge_delay})')
+            resilience.count(resource_type, 'hedges')
+            return _stat()
+
+        hedge_future = resilience.get_hedge_executor().submit(_hedge)
+
+        try:
+            response = _stat()
+        except Exception as e:
+            first_done.set()
+
+            # The hedged request is still waiting in the executor queue
+            if hedge_future.cancel():
+                raise e
+
+            try:
+                response = hedge_future.result()
+            except Exception:
+                raise e
+
+            if response is _NOT_SENT:
+                raise e
+
+            resilience.count(resource_type, 'hedge_wins')
+            return response
+
+        first_done.set()
+        hedge_future.cancel()
+        return response
+
+    @staticmethod
+    def _get_circuit_breaker(resource_type):
+        breaker_conf = config.get_global('STAT_RESOURCE_RESILIENCE', {}).get('circuit_breaker', {})
+        if not breaker_conf.get('enabled', False):
+            return None
+
+        return resilience.get_circuit_breaker(resource_type)
+
+    def _reject_request(self, resource_type, cache_key, cache_conf):
+        """ Fall back to the stale cache while the circuit is open """
+        resilience.count(resource_type, 'rejected')
+
+        breaker_conf = config.get_global('STAT_RESOURCE_RESILIENCE', {}).get('circuit_breaker', {})
+        if cache_key and breaker_conf.get('stale_fallback', False):
+            stale_response = self._get_cached_response(cache_key, cache_conf, breaker_conf.get('stale_ttl', 3600))
+            if stale_response is not None:
+                _LOGGER.warning(f'[_reject_request] circuit is open, use the stale cache: {cache_key}')
+                resilience.count(resource_type, 'stale_fallbacks')
+                return stale_response
+
+        raise ERROR_STAT_RESOURCE_CIRCUIT_OPEN(resource_type=resource_type)
+
+    @staticmethod
+    def _record_result(resource_type, circuit_breaker, error=None):
+        # Errors of the upstream application (e.g. an invalid query) do not mean the upstream is unhealthy
+        if error is not None and _is_upstream_failure(error):
+            resilience.count(resource_type, 'failures')
+            if circuit_breaker:
+                circuit_breaker.record_failure()
+
+        elif circuit_breaker:
+            circuit_breaker.record_success()
+
+    @staticmethod
+    def _get_deadline(service):
+        """ Deadline(seconds) of the upstream stat request (STAT_RESOURCE_DEADLINE), None = no deadline """
+        deadline_conf = config.get_global('STAT_RESOURCE_DEADLINE', {})
+        deadline = deadline_conf.get('services', {}).get(service, deadline_conf.get('default', 0))
+        return deadline or None
+
+    @staticmethod
+    def _get_cache_ttl(service, resource, cache_conf):
+        resource_ttl = cache_conf.get('resource_ttl', {})
+        return resource_ttl.get(f'{service}.{resource}', cache_conf.get('ttl', 300))
+
+    def _make_cache_key(self, service, resource, query, domain_id):
+        query_hash = hashlib.md5(utils.dump_json(query, sort_keys=True).encode()).hexdigest()
+        return f'statistics:stat-resource:{domain_id}:{self._get_caller_id()}:{service}.{resource}:{query_hash}'
+
+    def _get_caller_id(self):
+        """ Upstream requests run with the token of the caller, so responses are shared by the same user only """
+        user_id = self.transaction.get_meta('user_id')
+        if user_id:
+            return user_id
+
+        token = self.transaction.get_meta('token')
+        return hashlib.md5(token.encode()).hexdigest() if token else ''
+
+    @staticmethod
+    def _get_cached_response(cache_key, cache_conf, stale_ttl=0):
+        """
+        Args:
+            stale_ttl (int): seconds to accept a response after its TTL (stale fallback)
+        """
+        backends = [backend for backend in cache_conf.get('backends', []) if cache.is_set(backend)]
+
+        for index, backend in enumerate(backends):
+            try:
+                cache_value = cache.get(cache_key, backend=backend)
+            except Exception as e:
+                _LOGGER.warning(f'[_get_cached_response] cache get error ({backend}): {e}')
+                continue
+
+            if cache_value and cache_value.get('expired_at', 0) + stale_ttl > time.time():
+                if cache_value['expired_at'] <= time.time():
+                    return cache_value['response']
+
+                # Promote to the faster cache backends (e.g. redis -> local)
+                for upper_backend in backends[:index]:
+                    ServiceConnector._set_cache_value(cache_key, cache_value, upper_backend)
+
+                return cache_value['response']
+
+        return None
+
+    @staticmethod
+    def _set_cached_response(cache_key, response, cache_ttl, cache_conf):
+        max_result_count = cache_conf.get('max_result_count', 10000)
+        if len(response.get('results', [])) > max_result_count:
+            return
+
+        cache_value = {
+            'expired_at': time.time() + cache_ttl,
+            'response': response
+        }
+
+        # Keep the response for the stale fallback after its TTL
+        breaker_conf = config.get_global('STAT_RESOURCE_RESILIENCE', {}).get('circuit_breaker', {})
+        if breaker_conf.get('enabled', False) and breaker_conf.get('stale_fallback', False):
+            cache_ttl += breaker_conf.get('stale_ttl', 3600)
+
+        for backend in cache_conf.get('backends', []):
+            if cache.is_set(backend):
+                ServiceConnector._set_cache_value(cache_key, cache_value, backend, cache_ttl)
+
+    @staticmethod
+    def _set_cache_value(cache_key, cache_value, backend, cache_ttl=None):
+        if cache_ttl is None:
+            cache_ttl = max(int(cache_value['expired_at'] - time.time()), 1)
+
+        try:
+            try:
+                cache.set(cache_key, cache_value, expire=cache_ttl, backend=backend)
+            except ERROR_CACHE_OPTION:
+                # LocalCache does not support expire per key. 'expired_at' is checked on get.
+                cache.set(cache_key, cache_value, backend=backend)
+        except Exception as e:
+            _LOGGER.warning(f'[_set_cache_value] cache set error ({backend}): {e}')
 
     @staticmethod
     def _change_message(message):
         return MessageToDict(message, preserving_proto_field_name=True)
+
+
+def _is_upstream_failure(error):
+    if isinstance(error, (ERROR_GRPC_CONNECTION, ERROR_STAT_RESOURCE_DEADLINE)):
+        return True
+
+    if isinstance(error, ERROR_BASE):
+        # ERROR_INTERNAL_API without an error code of the upstream application (e.g. UNKNOWN, INTERNAL)
+        return error.error_code == 'ERROR_INTERNAL_API'
+
+    return True
@@ -35,3 +35,17 @@ class ERROR_INVALID_RESOURCE_TYPE(ERROR_INVALID_ARGUMENT):
 
 class ERROR_REQUIRED_QUERY_OPERATION(ERROR_INVALID_ARGUMENT):
     _message = 'The first stage of aggregation requires a query.'
+
+
+class ERROR_STAT_RESOURCE_DEADLINE(ERROR_UNKNOWN):
+    _status_code = 'DEADLINE_EXCEEDED'
+    _message = 'Upstream stat request exceeded the deadline. (resource_type = {resource_type}, deadline = {deadline})'
+
+
+class ERROR_STAT_SUB_QUERY_TIMEOUT(ERROR_UNKNOWN):
+    _status_code = 'DEADLINE_EXCEEDED'
+    _message = 'Sub queries are not finished in time. (timeout = {timeout})'
+
+
+class ERROR_STAT_RESOURCE_CIRCUIT_OPEN(ERROR_GRPC_CONNECTION):
+    _message = 'Upstream is unavailable, the circuit is open. (resource_type = {resource_type})'
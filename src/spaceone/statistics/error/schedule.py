@@ -3,3 +3,15 @@ from spaceone.core.error import *
 
 class ERROR_SCHEDULE_OPTION(ERROR_INVALID_ARGUMENT):
     _message = 'Only one schedule option can be set. (cron | interval | minutes | hours)'
+
+
+class ERROR_SCHEDULE_VALUE(ERROR_INVALID_ARGUMENT):
+    _message = 'Schedule option is invalid. ({key}: {reason})'
+
+
+class ERROR_RETENTION_OPTION(ERROR_INVALID_ARGUMENT):
+    _message = 'Retention option is invalid. ({key} must be a non-negative integer)'
+
+
+class ERROR_DELTA_OPTION(ERROR_INVALID_ARGUMENT):
+    _message = 'Delta option is invalid. ({key}: {reason})'
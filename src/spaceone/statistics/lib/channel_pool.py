@@ -0,0 +1,147 @@
+import logging
+import threading
+
+import grpc
+
+from spaceone.core import config, pygrpc
+from spaceone.core.error import *
+from spaceone.statistics.lib.pygrpc_adapter import create_channel, create_client
+
+__all__ = ['get_client', 'get_stats']
+
+_LOGGER = logging.getLogger(__name__)
+
+# TRANSIENT_FAILURE recovers by reconnecting, so only a shut down channel is replaced
+_UNHEALTHY_STATES = [grpc.ChannelConnectivity.SHUTDOWN]
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+class _PooledChannel(object):
+
+    def __init__(self, endpoint, ssl_enabled, options, client_opts):
+        self.state = None
+
+        self.channel = create_channel(endpoint, ssl_enabled, options)
+        self.channel.subscribe(self._on_state_changed)
+
+        try:
+            # The reflection of the server is loaded once per channel
+            self.client = create_client(self.channel, endpoint, **client_opts)
+        except Exception as e:
+            self.close()
+            raise ERROR_GRPC_CONNECTION(channel=endpoint, message=e.details() if hasattr(e, 'details') else str(e))
+
+    @property
+    def is_healthy(self):
+        return self.state not in _UNHEALTHY_STATES
+
+    def close(self):
+        try:
+            self.channel.unsubscribe(self._on_state_changed)
+            self.channel.close()
+        except Exception as e:
+            _LOGGER.debug(f'[_PooledChannel.close] {e}')
+
+    def _on_state_changed(self, state):
+        self.state = state
+
+
+class ChannelPool(object):
+    """ gRPC channels (and their clients) shared by all connectors and transactions in a process
+
+    Up to size channels are opened per endpoint and used in round-robin. A SHUTDOWN channel is removed
+    from the pool and replaced on the next request. It is not closed by the pool, since connectors may
+    still hold its client; it is released by the garbage collector.
+    """
+
+    def __init__(self, size=2, keepalive_time_ms=30000, keepalive_timeout_ms=10000, **kwargs):
+        self.size = max(size, 1)
+        self.options = [
+            ('grpc.keepalive_time_ms', keepalive_time_ms),
+            ('grpc.keepalive_timeout_ms', keepalive_timeout_ms),
+            ('grpc.keepalive_permit_without_calls', 1),
+            ('grpc.http2.max_pings_without_data', 0)
+        ]
+
+        self._channels = {}
+        self._indexes = {}
+        self._stats = {}
+        self._endpoint_locks = {}
+        self._lock = threading.Lock()
+
+    def get_client(self, endpoint, ssl_enabled=False, max_message_length=None, **client_opts):
+        with self._lock:
+            stats = self._stats.setdefault(endpoint, {'hits': 0, 'new_channels': 0, 'evictions': 0})
+            channels = self._channels.setdefault(endpoint, [])
+
+            for pooled_channel in [pooled_channel for pooled_channel in channels if not pooled_channel.is_healthy]:
+                _LOGGER.warning(f'[get_client] evict an unhealthy channel: {endpoint} ({pooled_channel.state})')
+                channels.remove(pooled_channel)
+                stats['evictions'] += 1
+
+            if len(channels) >= self.size:
+                return self._get_next_client(endpoint, channels, stats)
+
+            endpoint_lock = self._endpoint_locks.setdefault(endpoint, threading.Lock())
+
+        # Connecting and loading the reflection take a while, so a channel is made out of the pool lock.
+        # Only the requests of the same endpoint wait for it.
+        with endpoint_lock:
+            with self._lock:
+                if len(channels) >= self.size:
+                    return self._get_next_client(endpoint, channels, stats)
+
+            options = list(self.options)
+            if max_message_length:
+                options.append(('grpc.max_send_message_length', max_message_length))
+                options.append(('grpc.max_receive_message_length', max_message_length))
+
+            pooled_channel = _PooledChannel(endpoint, ssl_enabled, options, client_opts)
+
+            with self._lock:
+                channels.append(pooled_channel)
+                stats['new_channels'] += 1
+
+            return pooled_channel.client
+
+    def _get_next_client(self, endpoint, channels, stats):
+        index = self._indexes.get(endpoint, 0) % len(channels)
+        self._indexes[endpoint] = index + 1
+        stats['hits'] += 1
+        return channels[index].client
+
+    def get_stats(self):
+        with self._lock:
+            return {endpoint: dict(stats, channels=len(self._channels.get(endpoint, [])))
+                    for endpoint, stats in self._stats.items()}
+
+
+def _get_pool():
+    global _POOL
+
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ChannelPool(**config.get_global('GRPC_CHANNEL_POOL', {}))
+
+        return _POOL
+
+
+def get_client(endpoint, ssl_enabled=False, max_message_length=None, **client_opts):
+    """ pygrpc.client of the process-wide channel pool (GRPC_CHANNEL_POOL) """
+
+    if not config.get_global('GRPC_CHANNEL_POOL', {}).get('enabled', False):
+        return pygrpc.client(endpoint=endpoint, ssl_enabled=ssl_enabled, max_message_length=max_message_length,
+                             **client_opts)
+
+    return _get_pool().get_client(endpoint, ssl_enabled, max_message_length, **client_opts)
+
+
+def get_stats():
+    """
+    Returns:
+        stats (dict): {endpoint: {'hits': 'int', 'new_channels': 'int', 'evictions': 'int', 'channels': 'int'}}
+    """
+
+    return _get_pool().get_stats()
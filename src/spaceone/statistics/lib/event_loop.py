@@ -0,0 +1,40 @@
+import asyncio
+import concurrent.futures
+import threading
+
+__all__ = ['run', 'get_loop']
+
+_LOOP = None
+_LOOP_LOCK = threading.Lock()
+
+
+def get_loop():
+    """ Process-wide event loop running in a background thread
+
+    grpc.aio channels are bound to the event loop that created them, so all asynchronous upstream
+    requests of a process are awaited on this loop and share its channels.
+    """
+    global _LOOP
+
+    with _LOOP_LOCK:
+        if _LOOP is None or _LOOP.is_closed():
+            _LOOP = asyncio.new_event_loop()
+            loop_thread = threading.Thread(target=_LOOP.run_forever, name='statistics-event-loop', daemon=True)
+            loop_thread.start()
+
+        return _LOOP
+
+
+def run(coro, timeout):
+    """ Run a coroutine on the background event loop and wait for its result in the calling thread
+
+    The coroutine is cancelled if it does not finish in timeout seconds, then TimeoutError is raised.
+    """
+
+    future = asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+    try:
+        return future.result(timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise
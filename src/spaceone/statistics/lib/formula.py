@@ -0,0 +1,220 @@
+import ast
+import logging
+from functools import lru_cache
+
+import numpy as np
+
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+
+from spaceone.statistics.error import *
+
+__all__ = ['compile_formula', 'execute_formula']
+
+_LOGGER = logging.getLogger(__name__)
+
+_MAX_CACHE_SIZE = 1024
+_NUMERIC_DTYPE_KINDS = 'biuf'
+
+_BIN_OPERATORS = {
+    ast.Add: '+',
+    ast.Sub: '-',
+    ast.Mult: '*',
+    ast.Div: '/',
+    ast.Mod: '%',
+    ast.Pow: '**'
+}
+_UNARY_OPERATORS = {
+    ast.UAdd: '+',
+    ast.USub: '-',
+    ast.Not: '~',
+    ast.Invert: '~'
+}
+_COMPARE_OPERATORS = {
+    ast.Eq: '==',
+    ast.NotEq: '!=',
+    ast.Lt: '<',
+    ast.LtE: '<=',
+    ast.Gt: '>',
+    ast.GtE: '>='
+}
+_BOOL_OPERATORS = {
+    ast.And: '&',
+    ast.Or: '|'
+}
+
+
+class _NotVectorizable(Exception):
+    pass
+
+
+class CompiledFormula(object):
+
+    def __init__(self, formula, operator, expressions=None):
+        """
+        Args:
+            formula (str): original formula
+            operator (str): 'eval' | 'query'
+            expressions (list): [(target, numexpr_expression, columns)]
+                None means that the formula is executed by pandas.
+                (target is None in case of 'query')
+        """
+        self.formula = formula
+        self.operator = operator
+        self.expressions = expressions
+
+    @property
+    def is_vectorized(self):
+        return numexpr is not None and self.expressions is not None
+
+
+@lru_cache(maxsize=_MAX_CACHE_SIZE)
+def compile_formula(formula, operator):
+    """ Parse and validate a formula once
+
+    Args:
+        formula (str): aggregate.formula.eval or aggregate.formula.query
+        operator (str): 'eval' | 'query'
+
+    Returns:
+        compiled_formula (CompiledFormula)
+    """
+
+    if not isinstance(formula, str) or formula.strip() == '':
+        raise ERROR_STATISTICS_FORMULA(formula=formula)
+
+    # Backtick column names and local variables are only supported by pandas
+    if '`' in formula or '@' in formula:
+        return CompiledFormula(formula, operator)
+
+    try:
+        if operator == 'eval':
+            nodes = _parse_eval_formula(formula)
+        else:
+            nodes = [(None, ast.parse(formula.strip(), mode='eval').body)]
+    except SyntaxError:
+        raise ERROR_STATISTICS_FORMULA(formula=formula)
+
+    try:
+        expressions = []
+        for target, node in nodes:
+            columns = set()
+            expression = _to_numexpr(node, columns)
+
+            # Constant expressions are left to pandas to broadcast
+            if len(columns) == 0:
+                raise _NotVectorizable()
+
+            expressions.append((target, expression, columns))
+
+        return CompiledFormula(formula, operator, expressions)
+
+    except _NotVectorizable:
+        return CompiledFormula(formula, operator)
+
+
+def execute_formula(formula, operator, df):
+    compiled_formula: CompiledFormula = compile_formula(formula, operator)
+
+    if compiled_formula.is_vectorized and _is_numeric_columns(compiled_formula, df):
+        return _execute_numexpr(compiled_formula, df)
+
+    if operator == 'eval':
+        return df.eval(formula)
+    else:
+        return df.query(formula)
+
+
+def _parse_eval_formula(formula):
+    nodes = []
+    for statement in ast.parse(formula.strip(), mode='exec').body:
+        if not isinstance(statement, ast.Assign) or len(statement.targets) != 1 \
+                or not isinstance(statement.targets[0], ast.Name):
+            raise SyntaxError(f'eval formula requires an assignment. ({formula})')
+
+        nodes.append((statement.targets[0].id, statement.value))
+
+    if len(nodes) == 0:
+        raise SyntaxError(f'eval formula is empty. ({formula})')
+
+    return nodes
+
+
+def _to_numexpr(node, columns):
+    if isinstance(node, ast.BinOp) and type(node.op) in _BIN_OPERATORS:
+        left = _to_numexpr(node.left, columns)
+        right = _to_numexpr(node.right, columns)
+        return f'({left} {_BIN_OPERATORS[type(node.op)]} {right})'
+
+    elif isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPERATORS:
+        return f'({_UNARY_OPERATORS[type(node.op)]}{_to_numexpr(node.operand, columns)})'
+
+    elif isinstance(node, ast.BoolOp) and type(node.op) in _BOOL_OPERATORS:
+        values = [_to_numexpr(value, columns) for value in node.values]
+        return '(' + f' {_BOOL_OPERATORS[type(node.op)]} '.join(values) + ')'
+
+    elif isinstance(node, ast.Compare):
+        # a < b < c => (a < b) & (b < c)
+        comparisons = []
+        left = _to_numexpr(node.left, columns)
+        for op, comparator in zip(node.ops, node.comparators):
+            if type(op) not in _COMPARE_OPERATORS:
+                raise _NotVectorizable()
+
+            right = _to_numexpr(comparator, columns)
+            comparisons.append(f'({left} {_COMPARE_OPERATORS[type(op)]} {right})')
+            left = right
+
+        return '(' + ' & '.join(comparisons) + ')'
+
+    elif isinstance(node, ast.Name):
+        columns.add(node.id)
+        return node.id
+
+    elif isinstance(node, ast.Constant) and isinstance(node.value, (bool, int, float)):
+        return repr(node.value)
+
+    raise _NotVectorizable()
+
+
+def _is_numeric_columns(compiled_formula, df):
+    assigned_columns = set()
+
+    for target, expression, columns in compiled_formula.expressions:
+        for column in columns - assigned_columns:
+            if column not in df.columns:
+                return False
+
+            dtype = df[column].dtype
+            if not isinstance(dtype, np.dtype) or dtype.kind not in _NUMERIC_DTYPE_KINDS:
+                return False
+
+        if target:
+            assigned_columns.add(target)
+
+    return True
+
+
+def _execute_numexpr(compiled_formula, df):
+    local_dict = {}
+
+    if compiled_formula.operator == 'eval':
+        df = df.copy(deep=False)
+
+        for target, expression, columns in compiled_formula.expressions:
+            for column in columns:
+                local_dict[column] = df[column].to_numpy()
+
+            df[target] = numexpr.evaluate(expression, local_dict=local_dict)
+            local_dict[target] = df[target].to_numpy()
+
+        return df
+
+    else:
+        target, expression, columns = compiled_formula.expressions[0]
+        for column in columns:
+            local_dict[column] = df[column].to_numpy()
+
+        return df[numexpr.evaluate(expression, local_dict=local_dict)]
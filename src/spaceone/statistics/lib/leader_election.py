@@ -0,0 +1,132 @@
+import logging
+import threading
+import time
+from uuid import uuid4
+
+import redis
+
+__all__ = ['LeaderElection']
+
+_LOGGER = logging.getLogger(__name__)
+
+_ACQUIRE_SCRIPT = """
+if redis.call('set', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    return redis.call('incr', KEYS[2])
+end
+return 0
+"""
+
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_RESIGN_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+_FENCED_PUSH_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] and redis.call('get', KEYS[2]) == ARGV[2] then
+    return redis.call('rpush', KEYS[3], ARGV[3])
+end
+return -1
+"""
+
+
+class LeaderElection(object):
+    """ Leader election with a lease on Redis
+
+    A candidate becomes the leader by setting the lease key with an expiry (lease_time) and
+    keeps it by renewing it every lease_time / 3 seconds. Each new leader increments the fencing token.
+    Items are pushed only if the lease and the fencing token still belong to the leader, so that
+    a deposed leader (e.g. paused longer than its lease) can not push anything after a takeover.
+    """
+
+    def __init__(self, name, lease_time=15, **redis_conf):
+        self.lease_key = f'{name}:leader'
+        self.fencing_key = f'{name}:fencing_token'
+        self.lease_time = lease_time
+        self.candidate_id = uuid4().hex
+        self.fencing_token = None
+
+        self.conn = redis.Redis(connection_pool=redis.ConnectionPool(**redis_conf))
+        self._acquire = self.conn.register_script(_ACQUIRE_SCRIPT)
+        self._renew = self.conn.register_script(_RENEW_SCRIPT)
+        self._resign = self.conn.register_script(_RESIGN_SCRIPT)
+        self._fenced_push = self.conn.register_script(_FENCED_PUSH_SCRIPT)
+
+    @property
+    def is_leader(self):
+        return self.fencing_token is not None
+
+    def start(self):
+        """ Campaign in a background thread """
+
+        campaigner = threading.Thread(target=self._campaign_forever, daemon=True)
+        campaigner.start()
+
+    def campaign(self):
+        """ Acquire or renew the lease
+
+        Returns:
+            is_leader (bool)
+        """
+
+        lease_ms = int(self.lease_time * 1000)
+
+        try:
+            if self.is_leader:
+                if not self._renew(keys=[self.lease_key], args=[self.candidate_id, lease_ms]):
+                    _LOGGER.warning(f'[campaign] lost the leadership (fencing_token: {self.fencing_token})')
+                    self.fencing_token = None
+
+            if not self.is_leader:
+                fencing_token = self._acquire(keys=[self.lease_key, self.fencing_key],
+                                              args=[self.candidate_id, lease_ms])
+                if fencing_token:
+                    self.fencing_token = str(fencing_token)
+                    _LOGGER.info(f'[campaign] became the leader (fencing_token: {self.fencing_token})')
+
+        except Exception as e:
+            # The lease expires by itself, so the leadership is given up on errors
+            _LOGGER.error(f'[campaign] {e}')
+            self.fencing_token = None
+
+        return self.is_leader
+
+    def resign(self):
+        if self.is_leader:
+            try:
+                self._resign(keys=[self.lease_key], args=[self.candidate_id])
+            except Exception as e:
+                _LOGGER.error(f'[resign] {e}')
+
+            self.fencing_token = None
+
+    def push(self, channel, item):
+        """ RPUSH an item to the channel only if this candidate is still the leader
+
+        Returns:
+            is_pushed (bool)
+        """
+
+        if not self.is_leader:
+            return False
+
+        if self._fenced_push(keys=[self.lease_key, self.fencing_key, channel],
+                             args=[self.candidate_id, self.fencing_token, item]) < 0:
+            _LOGGER.warning(f'[push] rejected by fencing (fencing_token: {self.fencing_token})')
+            self.fencing_token = None
+            return False
+
+        return True
+
+    def _campaign_forever(self):
+        while True:
+            self.campaign()
+            time.sleep(self.lease_time / 3)
@@ -0,0 +1,38 @@
+from spaceone.core.pygrpc.client import _GRPCClient, _MAX_RETRIES, _create_insecure_channel, \
+    _create_secure_channel
+
+__all__ = ['MAX_RETRIES', 'create_channel', 'create_client', 'find_method_key', 'make_message', 'check_error']
+
+# spaceone.core.pygrpc.client has no public API to open a channel with options, to make a client of
+# a given channel or to use the reflection of a client, so its private members are used only in this module.
+# They are checked against spaceone-core 1.7.x (pinned in setup.py).
+
+MAX_RETRIES = _MAX_RETRIES
+
+
+def create_channel(endpoint, ssl_enabled=False, options=None):
+    if ssl_enabled:
+        return _create_secure_channel(endpoint, options or [])
+    else:
+        return _create_insecure_channel(endpoint, options or [])
+
+
+def create_client(channel, endpoint, **client_opts):
+    """ pygrpc client of the channel, the reflection of the server is loaded here """
+    return _GRPCClient(channel, client_opts, endpoint)
+
+
+def find_method_key(client, service_name, method_name):
+    """ Full method name in the reflection of the client (e.g. /spaceone.api.inventory.v1.Server/stat) """
+    return next((key for key in client._client_interceptor._MESSAGE_TYPE_MAP
+                 if key.endswith(f'.{service_name}/{method_name}')), None)
+
+
+def make_message(client, request, method_key):
+    """ Request message of the method made from a dict, like the calls of the client """
+    return client._client_interceptor._make_message(request, method_key)
+
+
+def check_error(client, error):
+    """ Raise the SpaceONE error of a gRPC error, like the calls of the client """
+    client._client_interceptor._check_error(error)
@@ -0,0 +1,176 @@
+import logging
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from spaceone.core import config
+
+__all__ = ['CircuitBreaker', 'LatencyTracker', 'get_circuit_breaker', 'get_latency_tracker', 'get_hedge_delay',
+           'get_hedge_executor', 'count', 'get_stats']
+
+_LOGGER = logging.getLogger(__name__)
+
+_STAT_NAMES = ['requests', 'failures', 'hedges', 'hedge_wins', 'rejected', 'stale_fallbacks']
+
+_CIRCUIT_BREAKERS = {}
+_LATENCY_TRACKERS = {}
+_STATS = {}
+_HEDGE_EXECUTOR = None
+_LOCK = threading.Lock()
+
+
+class CircuitBreaker(object):
+    """ Circuit breaker of an upstream resource
+
+    CLOSED: requests are sent. After failure_threshold consecutive failures, it is OPEN.
+    OPEN: requests are rejected for recovery_time seconds, then it is HALF_OPEN.
+    HALF_OPEN: one probe request is sent. It is CLOSED on success and OPEN again on failure.
+    """
+
+    def __init__(self, failure_threshold=5, recovery_time=30, **kwargs):
+        self.failure_threshold = max(failure_threshold, 1)
+        self.recovery_time = recovery_time
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'CLOSED'
+        elif time.time() - self.opened_at < self.recovery_time:
+            return 'OPEN'
+        else:
+            return 'HALF_OPEN'
+
+    def allow_request(self):
+        with self._lock:
+            state = self.state
+            if state == 'CLOSED':
+                return True
+
+            if state == 'HALF_OPEN' and not self._probing:
+                self._probing = True
+                return True
+
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.time()
+
+            self._probing = False
+
+
+class LatencyTracker(object):
+    """ Latencies of the last window_size successful requests """
+
+    def __init__(self, window_size=100):
+        self._latencies = deque(maxlen=window_size)
+        self._lock = threading.Lock()
+
+    def add(self, latency):
+        with self._lock:
+            self._latencies.append(latency)
+
+    def get_percentile(self, percentile, min_samples=1):
+        with self._lock:
+            latencies = sorted(self._latencies)
+
+        if len(latencies) == 0 or len(latencies) < min_samples:
+            return None
+
+        return latencies[min(math.ceil(len(latencies) * percentile / 100) - 1, len(latencies) - 1)]
+
+
+def get_circuit_breaker(resource_type):
+    with _LOCK:
+        if resource_type not in _CIRCUIT_BREAKERS:
+            breaker_conf = config.get_global('STAT_RESOURCE_RESILIENCE', {}).get('circuit_breaker', {})
+            _CIRCUIT_BREAKERS[resource_type] = CircuitBreaker(**breaker_conf)
+
+        return _CIRCUIT_BREAKERS[resource_type]
+
+
+def get_latency_tracker(resource_type):
+    with _LOCK:
+        if resource_type not in _LATENCY_TRACKERS:
+            hedge_conf = config.get_global('STAT_RESOURCE_RESILIENCE', {}).get('hedge', {})
+            _LATENCY_TRACKERS[resource_type] = LatencyTracker(hedge_conf.get('window_size', 100))
+
+        return _LATENCY_TRACKERS[resource_type]
+
+
+def get_hedge_delay(resource_type):
+    """ Seconds to wait before sending a hedged request, None = no hedged request
+
+    The delay is the percentile latency of the resource type, so only the slowest requests are hedged.
+    Hedged requests are limited to the budget ratio of the requests not to double the load of a slow upstream.
+    """
+
+    hedge_conf = config.get_global('STAT_RESOURCE_RESILIENCE', {}).get('hedge', {})
+    if not hedge_conf.get('enabled', False):
+        return None
+
+    with _LOCK:
+        stats = _STATS.get(resource_type, {})
+        if stats.get('hedges', 0) >= stats.get('requests', 0) * hedge_conf.get('budget', 0.1):
+            return None
+
+    delay = get_latency_tracker(resource_type).get_percentile(hedge_conf.get('percentile', 95),
+                                                              hedge_conf.get('min_samples', 20))
+    if delay is None:
+        return None
+
+    return max(delay, hedge_conf.get('min_delay', 0.05))
+
+
+def get_hedge_executor():
+    global _HEDGE_EXECUTOR
+
+    with _LOCK:
+        if _HEDGE_EXECUTOR is None:
+            hedge_conf = config.get_global('STAT_RESOURCE_RESILIENCE', {}).get('hedge', {})
+            _HEDGE_EXECUTOR = ThreadPoolExecutor(max_workers=hedge_conf.get('max_workers', 16),
+                                                 thread_name_prefix='stat-resource-hedge')
+
+        return _HEDGE_EXECUTOR
+
+
+def count(resource_type, name, value=1):
+    with _LOCK:
+        stats = _STATS.setdefault(resource_type, dict.fromkeys(_STAT_NAMES, 0))
+        stats[name] += value
+
+
+def get_stats():
+    """
+    Returns:
+        stats (dict): {resource_type: {'requests': 'int', 'failures': 'int', 'hedges': 'int', 'hedge_wins': 'int',
+                                       'rejected': 'int', 'stale_fallbacks': 'int', 'state': 'str',
+                                       'p95_latency': 'float'}}
+    """
+
+    with _LOCK:
+        stats = {resource_type: dict(resource_stats) for resource_type, resource_stats in _STATS.items()}
+        circuit_breakers = dict(_CIRCUIT_BREAKERS)
+        latency_trackers = dict(_LATENCY_TRACKERS)
+
+    for resource_type, resource_stats in stats.items():
+        circuit_breaker = circuit_breakers.get(resource_type)
+        latency_tracker = latency_trackers.get(resource_type)
+        resource_stats['state'] = circuit_breaker.state if circuit_breaker else 'CLOSED'
+        resource_stats['p95_latency'] = latency_tracker.get_percentile(95) if latency_tracker else None
+
+    return stats
@@ -0,0 +1,123 @@
+import asyncio
+import copy
+import logging
+import threading
+
+__all__ = ['SingleFlight', 'get_single_flight', 'get_stats']
+
+_LOGGER = logging.getLogger(__name__)
+
+_SINGLE_FLIGHTS = {}
+_LOCK = threading.Lock()
+
+
+class _Call(object):
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.task = None
+        self.waiters = 0
+
+
+class SingleFlight(object):
+    """ Coalesce concurrent calls with the same key into one execution
+
+    The first caller of a key executes the function and the callers arriving while it is in flight
+    wait for it and get a copy of its result (or its error). Nothing is cached after the execution.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._stats = {'executions': 0, 'coalesced': 0}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self._stats['executions'] += 1
+                is_leader = True
+            else:
+                call.waiters += 1
+                self._stats['coalesced'] += 1
+                is_leader = False
+
+        if not is_leader:
+            _LOGGER.debug(f'[do] wait for the call in flight: {key}')
+            call.event.wait()
+
+            if call.error is not None:
+                raise call.error
+
+            # Callers may change their results, so each waiter gets its own copy
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = func(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise e
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+            call.event.set()
+
+        # The waiters copy the result, so the caller of the execution must not change it either
+        return copy.deepcopy(call.result) if call.waiters > 0 else call.result
+
+    async def do_async(self, key, func, *args, **kwargs):
+        """ do() of a coroutine function. The callers of a key have to be on the same event loop. """
+
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                call.task = asyncio.ensure_future(func(*args, **kwargs))
+                self._stats['executions'] += 1
+                is_leader = True
+            else:
+                call.waiters += 1
+                self._stats['coalesced'] += 1
+                is_leader = False
+
+        if not is_leader:
+            _LOGGER.debug(f'[do_async] wait for the call in flight: {key}')
+
+            # A cancelled waiter must not cancel the execution of the others
+            return copy.deepcopy(await asyncio.shield(call.task))
+
+        try:
+            result = await asyncio.shield(call.task)
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+        return copy.deepcopy(result) if call.waiters > 0 else result
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._calls))
+
+
+def get_single_flight(name):
+    with _LOCK:
+        if name not in _SINGLE_FLIGHTS:
+            _SINGLE_FLIGHTS[name] = SingleFlight()
+
+        return _SINGLE_FLIGHTS[name]
+
+
+def get_stats():
+    """
+    Returns:
+        stats (dict): {name: {'executions': 'int', 'coalesced': 'int', 'in_flight': 'int'}}
+    """
+
+    with _LOCK:
+        single_flights = dict(_SINGLE_FLIGHTS)
+
+    return {name: single_flight.get_stats() for name, single_flight in single_flights.items()}
@@ -1,6 +1,8 @@
 from spaceone.statistics.manager.resource_manager import ResourceManager
 from spaceone.statistics.manager.schedule_manager import ScheduleManager
+from spaceone.statistics.manager.history_delta_manager import HistoryDeltaManager
 from spaceone.statistics.manager.history_manager import HistoryManager
+from spaceone.statistics.manager.history_rollup_manager import HistoryRollupManager
 from spaceone.statistics.manager.storage_manager import StorageManager
 from spaceone.statistics.manager.secret_manager import SecretManager
 from spaceone.statistics.manager.plugin_manager import PluginManager
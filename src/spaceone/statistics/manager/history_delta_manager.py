@@ -0,0 +1,224 @@
+import hashlib
+import json
+import logging
+from datetime import timedelta
+
+from spaceone.core import config
+from spaceone.core.manager import BaseManager
+from spaceone.statistics.error import *
+from spaceone.statistics.model.history_model import HistoryDelta, HistoryRun
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class HistoryDeltaManager(BaseManager):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.history_delta_model: HistoryDelta = self.locator.get_model('HistoryDelta')
+        self.history_run_model: HistoryRun = self.locator.get_model('HistoryRun')
+
+    def create_history_delta(self, schedule_vo, topic, results, domain_id, run_id, created_at, delta_option,
+                             retention_days=None):
+        """ Write only the inserted, changed and removed rows of a run
+
+        Each row is identified by the hash of its key fields and compared with the hash of
+        the current version. A changed or removed row closes the current version by deleted_at.
+        Every delta_option.snapshot_interval hours, all current versions are closed and the whole
+        result set is written again, so that the old versions can expire by the retention.
+        The results of a run have to be written at once to detect the removed rows.
+
+        Args:
+            delta_option (dict): {'keys': 'list', 'snapshot_interval': 'int'}
+            retention_days (int): closed versions and runs expire after these days (None: forever)
+
+        Returns:
+            history_run_vo (HistoryRun)
+        """
+
+        def _rollback(rollback_run_id):
+            _LOGGER.info(f'[create_history_delta._rollback] '
+                         f'Delete history delta : {topic} ({rollback_run_id})')
+            self.history_delta_model.objects(run_id=rollback_run_id).delete()
+            self.history_delta_model._get_collection().update_many(
+                {'topic': topic, 'domain_id': domain_id, 'deleted_at': created_at},
+                {'$set': {'deleted_at': None, 'expire_at': None}})
+            self.history_run_model.objects(run_id=rollback_run_id).delete()
+
+        if self.history_run_model.objects(run_id=run_id).count() > 0:
+            raise ERROR_INVALID_PARAMETER(key='run_id', reason='A run of the delta history must be written at once.')
+
+        keys = delta_option.get('keys')
+        if not keys:
+            raise ERROR_DELTA_OPTION(key='options.delta.keys', reason='keys are required when delta is enabled.')
+
+        results = list(results)
+        is_snapshot = self._is_snapshot_run(topic, domain_id, created_at, delta_option)
+        current_versions = {} if is_snapshot else self._list_current_versions(topic, domain_id)
+
+        self.transaction.add_rollback(_rollback, run_id)
+
+        inserted_rows = []
+        closed_ids = []
+        key_hashes = set()
+
+        for values in results:
+            key_hash = self._make_hash([values.get(key) for key in keys])
+
+            # Rows which have the same keys are distinguished by their order
+            index = 1
+            unique_key_hash = key_hash
+            while unique_key_hash in key_hashes:
+                unique_key_hash = f'{key_hash}-{index}'
+                index += 1
+
+            key_hashes.add(unique_key_hash)
+            value_hash = self._make_hash(values)
+
+            current_version = current_versions.get(unique_key_hash)
+            if current_version and current_version['value_hash'] == value_hash:
+                continue
+
+            if current_version:
+                closed_ids.append(current_version['_id'])
+
+            inserted_rows.append((unique_key_hash, value_hash, values))
+
+        for key_hash, current_version in current_versions.items():
+            if key_hash not in key_hashes:
+                closed_ids.append(current_version['_id'])
+
+        if is_snapshot:
+            self._close_current_versions(topic, domain_id, created_at, retention_days)
+        else:
+            self._close_versions(closed_ids, created_at, retention_days)
+
+        self._insert_versions(schedule_vo, topic, domain_id, run_id, created_at, inserted_rows)
+
+        change_count = len(inserted_rows) + len(closed_ids)
+        _LOGGER.debug(f'[create_history_delta] {topic} ({run_id}): rows = {len(results)}, '
+                      f'changes = {change_count}, snapshot = {is_snapshot}')
+
+        return self.history_run_model.create({
+            'run_id': run_id,
+            'topic': topic,
+            'schedule': schedule_vo,
+            'is_snapshot': is_snapshot,
+            'row_count': len(results),
+            'change_count': change_count,
+            'domain_id': domain_id,
+            'created_at': created_at,
+            'expire_at': created_at + timedelta(days=retention_days) if retention_days else None
+        })
+
+    def list_run_times(self, topic, domain_id, start=None, end=None):
+        """ created_at of the runs in [start, end] """
+
+        query = {'topic': topic, 'domain_id': domain_id}
+        if start:
+            query['created_at__gte'] = start
+
+        if end:
+            query['created_at__lte'] = end
+
+        try:
+            return [history_run_vo.created_at for history_run_vo
+                    in self.history_run_model.objects(**query).only('created_at')]
+        except Exception as e:
+            raise ERROR_DB_QUERY(reason=e)
+
+    def get_latest_run_time(self, topic, domain_id, time):
+        try:
+            history_run_vo = self.history_run_model.objects(topic=topic, domain_id=domain_id, created_at__lte=time)\
+                .order_by('-created_at').only('created_at').first()
+        except Exception as e:
+            raise ERROR_DB_QUERY(reason=e)
+
+        return history_run_vo.created_at if history_run_vo else None
+
+    def list_history_values(self, topic, domain_id, start, end):
+        """ Iterate (created_at, values) of the rows rebuilt for the runs in [start, end) """
+
+        run_times = [run_time for run_time in self.list_run_times(topic, domain_id, start, end) if run_time < end]
+        pipeline = self.history_delta_model._make_unwind_pipeline([], [], run_times=run_times,
+                                                                  topic=topic, domain_id=domain_id)
+        pipeline.append({'$project': {'values': 1, 'created_at': 1}})
+
+        try:
+            for row in self.history_delta_model._get_collection().aggregate(pipeline):
+                yield row['created_at'], row.get('values', {})
+
+        except Exception as e:
+            raise ERROR_DB_QUERY(reason=e)
+
+    def list_history(self, query, topic, domain_id, start=None, end=None):
+        run_times = self.list_run_times(topic, domain_id, start, end)
+        return self.history_delta_model.query(**query, run_times=run_times, topic=topic, domain_id=domain_id)
+
+    def stat_history(self, query, topic, domain_id, start=None, end=None):
+        run_times = self.list_run_times(topic, domain_id, start, end)
+        return self.history_delta_model.stat(**query, run_times=run_times, topic=topic, domain_id=domain_id)
+
+    def _is_snapshot_run(self, topic, domain_id, created_at, delta_option):
+        snapshot_interval = delta_option.get('snapshot_interval', 24)
+
+        try:
+            history_run_vo = self.history_run_model.objects(topic=topic, domain_id=domain_id, is_snapshot=True)\
+                .order_by('-created_at').only('created_at').first()
+        except Exception as e:
+            raise ERROR_DB_QUERY(reason=e)
+
+        if history_run_vo is None:
+            return True
+
+        return created_at - history_run_vo.created_at >= timedelta(hours=snapshot_interval)
+
+    def _list_current_versions(self, topic, domain_id):
+        try:
+            cursor = self.history_delta_model._get_collection().find(
+                {'topic': topic, 'domain_id': domain_id, 'deleted_at': None},
+                {'key_hash': 1, 'value_hash': 1})
+
+            return {version['key_hash']: version for version in cursor}
+
+        except Exception as e:
+            raise ERROR_DB_QUERY(reason=e)
+
+    def _close_current_versions(self, topic, domain_id, deleted_at, retention_days):
+        self._update_versions({'topic': topic, 'domain_id': domain_id, 'deleted_at': None},
+                              deleted_at, retention_days)
+
+    def _close_versions(self, version_ids, deleted_at, retention_days):
+        chunk_size = config.get_global('HISTORY_BULK_INSERT', {}).get('chunk_size', 1000)
+
+        for i in range(0, len(version_ids), chunk_size):
+            self._update_versions({'_id': {'$in': version_ids[i:i + chunk_size]}}, deleted_at, retention_days)
+
+    def _update_versions(self, query, deleted_at, retention_days):
+        expire_at = deleted_at + timedelta(days=retention_days) if retention_days else None
+
+        try:
+            self.history_delta_model._get_collection().update_many(
+                query, {'$set': {'deleted_at': deleted_at, 'expire_at': expire_at}})
+        except Exception as e:
+            raise ERROR_DB_QUERY(reason=e)
+
+    def _insert_versions(self, schedule_vo, topic, domain_id, run_id, created_at, rows):
+        chunk_size = config.get_global('HISTORY_BULK_INSERT', {}).get('chunk_size', 1000)
+
+        for i in range(0, len(rows), chunk_size):
+            history_delta_vos = []
+            for key_hash, value_hash, values in rows[i:i + chunk_size]:
+                history_delta_vos.append(self.history_delta_model(topic=topic, schedule=schedule_vo, values=values,
+                                                                  key_hash=key_hash, value_hash=value_hash,
+                                                                  run_id=run_id, domain_id=domain_id,
+                                                                  created_at=created_at))
+
+            try:
+                self.history_delta_model.objects.insert(history_delta_vos, load_bulk=False)
+            except Exception as e:
+                raise ERROR_DB_QUERY(reason=e)
+
+    @staticmethod
+    def _make_hash(data):
+        return hashlib.md5(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
@@ -1,43 +1,545 @@
+import base64
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from mongoengine import Q
 
+from spaceone.core import config, utils
 from spaceone.core.manager import BaseManager
-from spaceone.statistics.model.history_model import History
+from spaceone.statistics.error import *
+from spaceone.statistics.manager.history_delta_manager import HistoryDeltaManager
+from spaceone.statistics.model.history_model import History, HistoryBucket
+from spaceone.statistics.model.schedule_model import Schedule
 
 _LOGGER = logging.getLogger(__name__)
 
+_RANGE_OPERATORS = {
+    'start': ['gt', 'gte', 'datetime_gt', 'datetime_gte'],
+    'end': ['lt', 'lte', 'datetime_lt', 'datetime_lte']
+}
+
 
 class HistoryManager(BaseManager):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.history_model: History = self.locator.get_model('History')
+        self.history_bucket_model: HistoryBucket = self.locator.get_model('HistoryBucket')
+        self.schedule_model: Schedule = self.locator.get_model('Schedule')
+        self.history_delta_mgr: HistoryDeltaManager = self.locator.get_manager('HistoryDeltaManager')
+        self._rollback_run_ids = set()
+        self._delta_topics = {}
+
+    def create_history(self, schedule_vo, topic, results, domain_id, run_id=None, created_at=None):
+        """ Insert the results of a schedule run with bulk writes
+
+        Results are inserted in chunks of HISTORY_BULK_INSERT.chunk_size rows. All rows of a run share
+        the run_id, so the whole run can be rolled back with a single delete. To stream the results of
+        a run chunk by chunk, call this method repeatedly with the same run_id and created_at.
+
+        If HISTORY_STORAGE.layout is BUCKET, every HISTORY_STORAGE.bucket_size rows are stored
+        in one HistoryBucket document instead. If HISTORY_RETENTION is enabled, the rows expire
+        after raw_days by the TTL index. If HISTORY_DELTA is enabled for the schedule, only the changes
+        from the previous run are written by HistoryDeltaManager.
 
-    def create_history(self, schedule_vo, topic, results, domain_id):
-        def _rollback(history_vo):
+        Returns:
+            run_id (str)
+        """
+
+        def _rollback(rollback_run_id):
             _LOGGER.info(f'[create_history._rollback] '
-                         f'Delete history : {history_vo.topic}')
-            history_vo.deregister()
+                         f'Delete history : {topic} ({rollback_run_id})')
+            self.history_model.objects(run_id=rollback_run_id).delete()
+            self.history_bucket_model.objects(run_id=rollback_run_id).delete()
+
+        run_id = run_id or utils.generate_id('run')
+        created_at = created_at or datetime.utcnow()
+        retention = self.get_retention(schedule_vo, topic)
+        expire_at = self.get_expire_at(created_at, retention, 'raw_days')
+
+        delta_option = self.get_delta_option(schedule_vo, topic)
+        if delta_option.get('enabled', False):
+            retention_days = retention.get('raw_days') if retention.get('enabled', False) else None
+            self.history_delta_mgr.create_history_delta(schedule_vo, topic, results, domain_id, run_id, created_at,
+                                                        delta_option, retention_days)
+            return run_id
+
+        if run_id not in self._rollback_run_ids:
+            self.transaction.add_rollback(_rollback, run_id)
+            self._rollback_run_ids.add(run_id)
 
-        created_at = datetime.utcnow()
+        if self._is_bucket_layout():
+            self._create_history_buckets(schedule_vo, topic, results, domain_id, run_id, created_at, expire_at)
+            return run_id
 
+        chunk_size = config.get_global('HISTORY_BULK_INSERT', {}).get('chunk_size', 1000)
+
+        history_vos = []
         for values in results:
-            history_data = {
-                'topic': topic,
-                'schedule': schedule_vo,
-                'values': values,
-                'created_at': created_at,
-                'domain_id': domain_id
-            }
+            history_vos.append(self.history_model(topic=topic, schedule=schedule_vo, values=values,
+                                                  run_id=run_id, created_at=created_at, expire_at=expire_at,
+                                                  domain_id=domain_id))
+
+            if len(history_vos) >= chunk_size:
+                self._insert_histories(history_vos)
+                history_vos = []
+
+        if len(history_vos) > 0:
+            self._insert_histories(history_vos)
+
+        return run_id
+
+    def _create_history_buckets(self, schedule_vo, topic, results, domain_id, run_id, created_at, expire_at):
+        bucket_size = config.get_global('HISTORY_STORAGE', {}).get('bucket_size', 1000)
+        chunk_size = config.get_global('HISTORY_BULK_INSERT', {}).get('chunk_size', 1000)
+
+        # Continue the bucket index when a run is streamed chunk by chunk
+        bucket_index = self.history_bucket_model.objects(run_id=run_id).count()
 
-            _LOGGER.debug(f'[create_history] create history: {history_data}')
+        def _make_bucket(bucket_values):
+            return self.history_bucket_model(topic=topic, schedule=schedule_vo, values=bucket_values,
+                                             value_count=len(bucket_values), run_id=run_id,
+                                             bucket_index=bucket_index, created_at=created_at,
+                                             expire_at=expire_at, domain_id=domain_id)
 
-            history_vo: History = self.history_model.create(history_data)
+        bucket_vos = []
+        values = []
+        for row in results:
+            values.append(row)
 
-            self.transaction.add_rollback(_rollback, history_vo)
+            if len(values) >= bucket_size:
+                bucket_vos.append(_make_bucket(values))
+                bucket_index += 1
+                values = []
+
+                if len(bucket_vos) * bucket_size >= chunk_size:
+                    self._insert_histories(bucket_vos, self.history_bucket_model)
+                    bucket_vos = []
+
+        if len(values) > 0:
+            bucket_vos.append(_make_bucket(values))
+
+        if len(bucket_vos) > 0:
+            self._insert_histories(bucket_vos, self.history_bucket_model)
+
+    def _insert_histories(self, history_vos, model=None):
+        model = model or self.history_model
+        _LOGGER.debug(f'[_insert_histories] insert {len(history_vos)} {model.__name__} documents')
+
+        try:
+            model.objects.insert(history_vos, load_bulk=False)
+        except Exception as e:
+            raise ERROR_DB_QUERY(reason=e)
 
     def list_history(self, query={}):
-        return self.history_model.query(**query)
+        delta_topic = self._get_delta_topic(query)
+        if delta_topic:
+            return self.history_delta_mgr.list_history(query, *delta_topic, *self.get_time_range(query))
+
+        return self._get_read_model().query(**query)
+
+    def list_history_page(self, query, next_token=None):
+        """ List history with keyset pagination on (created_at, _id)
+
+        A page after next_token is read by a range condition instead of skipping the earlier rows,
+        so every page costs the same. total_count is counted on the first page and carried by the token.
+        The token is made only when the history is sorted by created_at and page.limit is set.
+        (Offset pagination of page.start is used otherwise.)
+
+        Returns:
+            history_vos (list)
+            total_count (int)
+            next_token (str): None if there is no more page
+        """
+
+        sort = query.get('sort', {})
+        page = query.get('page', {})
+        limit = page.get('limit', 0)
+        desc = self._get_cursor_direction(sort)
+
+        is_delta_topic = self._get_delta_topic(query) is not None
+
+        if next_token:
+            if desc is None or self._is_bucket_layout() or is_delta_topic:
+                raise ERROR_INVALID_PARAMETER(key='next_token', reason='next_token requires a sort by created_at.')
+
+            cursor = self._decode_next_token(next_token)
+            if cursor['desc'] != desc:
+                raise ERROR_INVALID_PARAMETER(key='next_token', reason='The sort order has been changed.')
+
+            total_count = cursor['total_count']
+
+        elif desc is None or self._is_bucket_layout() or is_delta_topic or limit <= 0 or page.get('start', 1) > 1:
+            history_vos, total_count = self.list_history(query)
+            return history_vos, total_count, None
+
+        else:
+            cursor = None
+            total_count = None
+
+        _filter = self.history_model._make_filter(query.get('filter', []), query.get('filter_or', []))
+        operator = 'lt' if desc else 'gt'
+        direction = '-' if desc else ''
+
+        try:
+            if total_count is None:
+                total_count = self.history_model.objects.filter(_filter).count()
+
+            if cursor:
+                _filter = _filter & (Q(**{f'created_at__{operator}': cursor['created_at']}) |
+                                     Q(**{'created_at': cursor['created_at'], f'id__{operator}': cursor['id']}))
+
+            vos = self.history_model.objects.filter(_filter).order_by(f'{direction}created_at', f'{direction}id')
+
+            if query.get('only'):
+                vos = vos.only(*set(query['only'] + ['created_at']))
+
+            if limit > 0:
+                history_vos = list(vos.limit(limit + 1))
+            else:
+                history_vos = list(vos)
+
+        except Exception as e:
+            raise ERROR_DB_QUERY(reason=e)
+
+        if 0 < limit < len(history_vos):
+            history_vos = history_vos[:limit]
+            next_token = self._encode_next_token(history_vos[-1], desc, total_count)
+        else:
+            next_token = None
+
+        return history_vos, total_count, next_token
+
+    @staticmethod
+    def _get_cursor_direction(sort):
+        if 'key' not in sort:
+            # Default ordering: -created_at
+            return True
+        elif sort['key'] == 'created_at':
+            return sort.get('desc', False)
+        else:
+            return None
+
+    @staticmethod
+    def _encode_next_token(history_vo, desc, total_count):
+        cursor = {
+            'created_at': history_vo.created_at.isoformat(),
+            'id': str(history_vo.id),
+            'desc': desc,
+            'total_count': total_count
+        }
+        return base64.urlsafe_b64encode(utils.dump_json(cursor).encode()).decode()
+
+    @staticmethod
+    def _decode_next_token(next_token):
+        try:
+            cursor = utils.load_json(base64.urlsafe_b64decode(next_token.encode()).decode())
+            cursor['created_at'] = datetime.fromisoformat(cursor['created_at'])
+            return cursor
+        except Exception:
+            raise ERROR_INVALID_PARAMETER(key='next_token', reason='next_token is invalid.')
 
     def stat_history(self, query):
-        return self.history_model.stat(**query)
+        delta_topic = self._get_delta_topic(query)
+        if delta_topic:
+            return self.history_delta_mgr.stat_history(query, *delta_topic, *self.get_time_range(query))
+
+        return self._get_read_model().stat(**query)
+
+    def list_history_values(self, topic, domain_id, start, end):
+        """ Iterate (created_at, values) of the raw history in [start, end) regardless of the storage layout """
+
+        if self._is_delta_topic(topic, domain_id):
+            yield from self.history_delta_mgr.list_history_values(topic, domain_id, start, end)
+            return
+
+        query = {
+            'topic': topic,
+            'domain_id': domain_id,
+            'created_at': {'$gte': start, '$lt': end}
+        }
+
+        try:
+            if self._is_bucket_layout():
+                cursor = self.history_bucket_model._get_collection().find(query, {'values': 1, 'created_at': 1})
+                for bucket in cursor:
+                    for values in bucket.get('values', []):
+                        yield bucket['created_at'], values
+            else:
+                cursor = self.history_model._get_collection().find(query, {'values': 1, 'created_at': 1})
+                for row in cursor:
+                    yield row['created_at'], row.get('values', {})
+
+        except Exception as e:
+            raise ERROR_DB_QUERY(reason=e)
+
+    def diff_history(self, topic, domain_id, from_time, to_time, keys, fields=None, user_projects=None):
+        """ Compare the snapshots of a topic at two time points
+
+        Each time point is resolved to the latest run created at or before it. The rows of both
+        snapshots are aligned on the key fields and the deltas are computed column by column.
+
+        Args:
+            topic (str)
+            domain_id (str)
+            from_time (datetime)
+            to_time (datetime)
+            keys (list): key fields to align the rows (ex. ['project_id'])
+            fields (list): numeric fields to compare (default: all numeric fields)
+            user_projects (list): project_id filter of the PROJECT scope
+
+        Returns:
+            response (dict): {
+                'results': [{
+                    'key': {'project_id': 'project-xxx'},
+                    'status': 'ADDED' | 'DELETED' | 'CHANGED',
+                    'values': {'server_count': {'from': 1, 'to': 3, 'delta': 2, 'percentage': 200.0}}
+                }],
+                'from': 'datetime', 'to': 'datetime', 'total_count': 'int'
+            }
+        """
+
+        if to_time <= from_time:
+            raise ERROR_DIFF_TIME_RANGE()
+
+        from_created_at = self._get_snapshot_time(topic, domain_id, from_time)
+        to_created_at = self._get_snapshot_time(topic, domain_id, to_time)
+
+        if from_created_at is None or to_created_at is None or from_created_at == to_created_at:
+            raise ERROR_NOT_ENOUGH_DIFF_HISTORY(start=from_time, end=to_time)
+
+        from_df = self._load_snapshot(topic, domain_id, from_created_at, user_projects)
+        to_df = self._load_snapshot(topic, domain_id, to_created_at, user_projects)
+
+        missing_keys = [key for key in keys if key not in from_df.columns or key not in to_df.columns]
+        if len(missing_keys) > 0 or len(keys) == 0:
+            raise ERROR_NOT_FOUND_DIFF_FIELDS(field_type='keys', fields=missing_keys or keys)
+
+        if fields:
+            missing_fields = [field for field in fields if field not in from_df.columns and field not in to_df.columns]
+            if len(missing_fields) > 0:
+                raise ERROR_NOT_FOUND_DIFF_FIELDS(field_type='fields', fields=missing_fields)
+        else:
+            fields = [column for column in from_df.columns.union(to_df.columns, sort=False)
+                      if column not in keys and self._is_numeric_column(from_df, to_df, column)]
+
+        df = pd.merge(self._group_by_keys(from_df, keys, fields), self._group_by_keys(to_df, keys, fields),
+                      on=keys, how='outer', suffixes=('.from', '.to'), indicator=True)
+
+        status = np.select([df['_merge'] == 'right_only', df['_merge'] == 'left_only'],
+                           ['ADDED', 'DELETED'], default='CHANGED')
+        changed = status != 'CHANGED'
+
+        for field in fields:
+            from_values = df[f'{field}.from'].to_numpy(dtype=float)
+            to_values = df[f'{field}.to'].to_numpy(dtype=float)
+
+            delta = np.nan_to_num(to_values) - np.nan_to_num(from_values)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                percentage = np.where(np.nan_to_num(from_values) != 0, delta / from_values * 100, np.nan)
+
+            df[f'{field}.delta'] = delta
+            df[f'{field}.percentage'] = percentage
+            changed |= (delta != 0) | (np.isnan(from_values) != np.isnan(to_values))
+
+        df['status'] = status
+        df = df[changed]
+
+        results = []
+        for row in df.replace({np.nan: None}).to_dict('records'):
+            results.append({
+                'key': {key: row[key] for key in keys},
+                'status': row['status'],
+                'values': {
+                    field: {
+                        'from': row[f'{field}.from'],
+                        'to': row[f'{field}.to'],
+                        'delta': row[f'{field}.delta'],
+                        'percentage': row[f'{field}.percentage']
+                    } for field in fields
+                }
+            })
+
+        return {
+            'results': results,
+            'from': utils.datetime_to_iso8601(from_created_at),
+            'to': utils.datetime_to_iso8601(to_created_at),
+            'total_count': len(results)
+        }
+
+    def _get_snapshot_time(self, topic, domain_id, time):
+        if self._is_delta_topic(topic, domain_id):
+            return self.history_delta_mgr.get_latest_run_time(topic, domain_id, time)
+
+        try:
+            history_vo = self._get_read_model().objects(topic=topic, domain_id=domain_id, created_at__lte=time)\
+                .order_by('-created_at').only('created_at').first()
+        except Exception as e:
+            raise ERROR_DB_QUERY(reason=e)
+
+        return history_vo.created_at if history_vo else None
+
+    def _load_snapshot(self, topic, domain_id, created_at, user_projects=None):
+        # created_at is stored in milliseconds
+        rows = self.list_history_values(topic, domain_id, created_at, created_at + timedelta(milliseconds=1))
+        df = pd.DataFrame([values for _, values in rows])
+
+        if user_projects is not None:
+            if 'project_id' in df.columns:
+                df = df[df['project_id'].isin(user_projects)]
+            else:
+                df = df.iloc[0:0]
+
+        return df
+
+    @staticmethod
+    def _is_numeric_column(from_df, to_df, column):
+        for df in [from_df, to_df]:
+            if column in df.columns and df[column].dtype.kind not in 'iuf':
+                return False
+
+        return True
+
+    @staticmethod
+    def _group_by_keys(df, keys, fields):
+        df = df.reindex(columns=keys + fields)
+        for field in fields:
+            df[field] = pd.to_numeric(df[field], errors='coerce')
+
+        # Rows which have the same keys are summed up
+        return df.groupby(keys, dropna=False, sort=False)[fields].sum(min_count=1).reset_index()
+
+    @staticmethod
+    def get_retention(schedule_vo=None, topic=None):
+        """ Retention of a schedule (schedule.options.retention > HISTORY_RETENTION.topics > HISTORY_RETENTION)
+
+        Returns:
+            retention (dict): {'enabled': bool, 'raw_days': int, 'daily_days': int, 'monthly_days': int}
+        """
+
+        global_retention = config.get_global('HISTORY_RETENTION', {})
+        retention = {
+            'enabled': global_retention.get('enabled', False),
+            'raw_days': global_retention.get('raw_days', 0),
+            'daily_days': global_retention.get('daily_days', 0),
+            'monthly_days': global_retention.get('monthly_days', 0)
+        }
+
+        if schedule_vo is not None:
+            topic = topic or schedule_vo.topic
+
+        retention.update(global_retention.get('topics', {}).get(topic, {}))
+
+        if schedule_vo is not None and isinstance(schedule_vo.options, dict):
+            retention.update(schedule_vo.options.get('retention', {}))
+
+        return retention
+
+    @staticmethod
+    def get_delta_option(schedule_vo=None, topic=None):
+        """ Delta persistence of a schedule (schedule.options.delta > HISTORY_DELTA.topics > HISTORY_DELTA)
+
+        Returns:
+            delta_option (dict): {'enabled': bool, 'keys': list, 'snapshot_interval': int}
+        """
+
+        global_delta_option = config.get_global('HISTORY_DELTA', {})
+        delta_option = {
+            'enabled': global_delta_option.get('enabled', False),
+            'keys': global_delta_option.get('keys', []),
+            'snapshot_interval': global_delta_option.get('snapshot_interval', 24)
+        }
+
+        if schedule_vo is not None:
+            topic = topic or schedule_vo.topic
+
+        delta_option.update(global_delta_option.get('topics', {}).get(topic, {}))
+
+        if schedule_vo is not None and isinstance(schedule_vo.options, dict):
+            delta_option.update(schedule_vo.options.get('delta', {}))
+
+        return delta_option
+
+    @staticmethod
+    def get_time_range(query):
+        """ (start, end) of the created_at conditions in query.filter """
+
+        time_range = {'start': None, 'end': None}
+
+        for condition in query.get('filter', []):
+            if condition.get('k', condition.get('key')) != 'created_at':
+                continue
+
+            operator = condition.get('o', condition.get('operator'))
+            value = condition.get('v', condition.get('value'))
+
+            if isinstance(value, str):
+                try:
+                    value = utils.iso8601_to_datetime(value)
+                except ValueError:
+                    continue
+
+            if not isinstance(value, datetime):
+                continue
+
+            # Compare as naive UTC datetime
+            value = value.replace(tzinfo=None)
+
+            for boundary, operators in _RANGE_OPERATORS.items():
+                if operator in operators:
+                    time_range[boundary] = value
+
+        return time_range['start'], time_range['end']
+
+    @staticmethod
+    def get_expire_at(created_at, retention, days_key):
+        days = retention.get(days_key, 0)
+        if retention.get('enabled', False) and days and days > 0:
+            return created_at + timedelta(days=days)
+        else:
+            return None
+
+    def _get_delta_topic(self, query):
+        """ (topic, domain_id) if the query is on a topic persisted by HistoryDelta
+
+        Delta topics are read only by a query with 'topic' and 'domain_id' eq filters.
+        A query without them reads the History collection, which does not have the delta topics.
+        """
+
+        conditions = {}
+        for condition in query.get('filter', []):
+            key = condition.get('k', condition.get('key'))
+            operator = condition.get('o', condition.get('operator'))
+
+            if key in ['topic', 'domain_id'] and operator == 'eq':
+                conditions[key] = condition.get('v', condition.get('value'))
+
+        if 'topic' in conditions and 'domain_id' in conditions:
+            if self._is_delta_topic(conditions['topic'], conditions['domain_id']):
+                return conditions['topic'], conditions['domain_id']
+
+        return None
+
+    def _is_delta_topic(self, topic, domain_id):
+        if (topic, domain_id) not in self._delta_topics:
+            try:
+                schedule_vo = self.schedule_model.objects(topic=topic, domain_id=domain_id)\
+                    .only('topic', 'options').first()
+            except Exception as e:
+                raise ERROR_DB_QUERY(reason=e)
+
+            delta_option = self.get_delta_option(schedule_vo, topic)
+            self._delta_topics[(topic, domain_id)] = delta_option.get('enabled', False)
+
+        return self._delta_topics[(topic, domain_id)]
+
+    def _get_read_model(self):
+        if self._is_bucket_layout():
+            return self.history_bucket_model
+        else:
+            return self.history_model
+
+    @staticmethod
+    def _is_bucket_layout():
+        return config.get_global('HISTORY_STORAGE', {}).get('layout', 'ROW') == 'BUCKET'
@@ -0,0 +1,267 @@
+import logging
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from spaceone.core import config
+from spaceone.core.manager import BaseManager
+from spaceone.statistics.error import *
+from spaceone.statistics.manager.history_manager import HistoryManager
+from spaceone.statistics.model.history_model import HistoryRollup
+
+_LOGGER = logging.getLogger(__name__)
+
+GRANULARITIES = ['RAW', 'DAILY', 'MONTHLY']
+
+_RETENTION_DAYS_KEYS = {
+    'RAW': 'raw_days',
+    'DAILY': 'daily_days',
+    'MONTHLY': 'monthly_days'
+}
+_CREATED_AT = '__created_at'
+_SAMPLE_COUNT = '__sample_count'
+
+
+class HistoryRollupManager(BaseManager):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.history_mgr: HistoryManager = self.locator.get_manager('HistoryManager')
+        self.history_rollup_model: HistoryRollup = self.locator.get_model('HistoryRollup')
+
+    def rollup_history(self, schedule_vo, granularity, date):
+        """ Roll up the history of a schedule in a day or a month
+
+        DAILY rollups are made from the raw history and MONTHLY rollups are made from the DAILY rollups.
+        The rollups of the period are replaced, so it is safe to run again for the same period.
+
+        Args:
+            schedule_vo (Schedule)
+            granularity (str): DAILY | MONTHLY
+            date (datetime): any time in the day or the month
+
+        Returns:
+            rollup_count (int)
+        """
+
+        topic = schedule_vo.topic
+        domain_id = schedule_vo.domain_id
+        start, end = self.get_period(granularity, date)
+
+        if granularity == 'DAILY':
+            samples = self._make_raw_samples(self.history_mgr.list_history_values(topic, domain_id, start, end))
+        else:
+            samples = self._make_rollup_samples(topic, domain_id, 'DAILY', start, end)
+
+        retention = self.history_mgr.get_retention(schedule_vo)
+        expire_at = self.history_mgr.get_expire_at(start, retention, _RETENTION_DAYS_KEYS[granularity])
+
+        rollup_vos = []
+        for values, aggregates, sample_count in self._rollup_samples(*samples):
+            rollup_vos.append(self.history_rollup_model(topic=topic, schedule=schedule_vo, granularity=granularity,
+                                                        values=values, aggregates=aggregates,
+                                                        sample_count=sample_count, domain_id=domain_id,
+                                                        created_at=start, expire_at=expire_at))
+
+        _LOGGER.debug(f'[rollup_history] {granularity} rollup of {topic} ({start} ~ {end}): '
+                      f'{len(rollup_vos)} rows')
+
+        try:
+            self.history_rollup_model.objects(topic=topic, domain_id=domain_id, granularity=granularity,
+                                              created_at=start).delete()
+
+            if len(rollup_vos) > 0:
+                self.history_rollup_model.objects.insert(rollup_vos, load_bulk=False)
+
+        except Exception as e:
+            raise ERROR_DB_QUERY(reason=e)
+
+        return len(rollup_vos)
+
+    def stat_rollups(self, query, granularity):
+        query = dict(query)
+        query['filter'] = query.get('filter', []) + [{'k': 'granularity', 'v': granularity, 'o': 'eq'}]
+        return self.history_rollup_model.stat(**query)
+
+    def get_stat_granularity(self, retention, query):
+        """ The coarsest granularity that satisfies the time range of created_at filters
+
+        The time range picks the preferred granularity by HISTORY_RETENTION.stat_granularity_days.
+        If the start of the range has already expired in the preferred granularity, a coarser one is used.
+        Rollups of the current day (month) are made after it ends, so short ranges always read the raw history.
+        """
+
+        if not retention.get('enabled', False):
+            return 'RAW'
+
+        start, end = self.history_mgr.get_time_range(query)
+        if start is None:
+            return 'RAW'
+
+        now = datetime.utcnow()
+        end = end or now
+        range_days = (end - start).total_seconds() / 86400
+
+        thresholds = config.get_global('HISTORY_RETENTION', {}).get('stat_granularity_days', {})
+
+        preferred = 'RAW'
+        for granularity in ['DAILY', 'MONTHLY']:
+            if range_days > thresholds.get(granularity, float('inf')):
+                preferred = granularity
+
+        for granularity in GRANULARITIES[GRANULARITIES.index(preferred):]:
+            days = retention.get(_RETENTION_DAYS_KEYS[granularity], 0)
+            if not days or start >= now - timedelta(days=days):
+                return granularity
+
+        return 'MONTHLY'
+
+    @staticmethod
+    def get_period(granularity, date):
+        if granularity == 'DAILY':
+            start = datetime(date.year, date.month, date.day)
+            return start, start + timedelta(days=1)
+        else:
+            start = datetime(date.year, date.month, 1)
+            return start, (start + timedelta(days=32)).replace(day=1)
+
+    @staticmethod
+    def _make_raw_samples(rows):
+        records = []
+        for created_at, values in rows:
+            record = dict(values)
+            record[_CREATED_AT] = created_at
+            records.append(record)
+
+        df = pd.DataFrame(records)
+        if len(df) == 0:
+            return df, [], []
+
+        measures = [column for column in df.columns
+                    if column != _CREATED_AT and df[column].dtype.kind in 'iuf']
+        dimensions = _get_dimensions(df, measures)
+
+        samples = df[dimensions + [_CREATED_AT]].copy()
+        samples[_SAMPLE_COUNT] = 1
+        for measure in measures:
+            for operator in ['sum', 'min', 'max', 'last']:
+                samples[f'{measure}.{operator}'] = df[measure]
+
+            samples[f'{measure}.count'] = df[measure].notna().astype(int)
+
+        return samples, dimensions, measures
+
+    def _make_rollup_samples(self, topic, domain_id, granularity, start, end):
+        query = {
+            'topic': topic,
+            'domain_id': domain_id,
+            'granularity': granularity,
+            'created_at': {'$gte': start, '$lt': end}
+        }
+
+        records = []
+        measures = set()
+
+        try:
+            cursor = self.history_rollup_model._get_collection().find(query, {
+                'values': 1, 'aggregates': 1, 'sample_count': 1, 'created_at': 1
+            })
+
+            for rollup in cursor:
+                aggregates = rollup.get('aggregates', {})
+                record = {key: value for key, value in rollup.get('values', {}).items() if key not in aggregates}
+                record[_CREATED_AT] = rollup['created_at']
+                record[_SAMPLE_COUNT] = rollup.get('sample_count', 0)
+
+                for measure, aggregate in aggregates.items():
+                    measures.add(measure)
+                    for operator in ['sum', 'min', 'max', 'last', 'count']:
+                        record[f'{measure}.{operator}'] = aggregate.get(operator)
+
+                records.append(record)
+
+        except Exception as e:
+            raise ERROR_DB_QUERY(reason=e)
+
+        df = pd.DataFrame(records)
+        if len(df) == 0:
+            return df, [], []
+
+        measures = sorted(measures)
+        aggregate_columns = [f'{measure}.{operator}' for measure in measures
+                             for operator in ['sum', 'min', 'max', 'last', 'count']]
+
+        return df, _get_dimensions(df, aggregate_columns + [_SAMPLE_COUNT]), measures
+
+    @staticmethod
+    def _rollup_samples(samples, dimensions, measures):
+        if len(samples) == 0:
+            return
+
+        agg = {_SAMPLE_COUNT: 'sum'}
+        for measure in measures:
+            agg.update({
+                f'{measure}.sum': 'sum',
+                f'{measure}.min': 'min',
+                f'{measure}.max': 'max',
+                f'{measure}.last': 'last',
+                f'{measure}.count': 'sum'
+            })
+
+        samples = samples.sort_values(_CREATED_AT, kind='stable')
+
+        if dimensions:
+            df = samples.groupby(dimensions, dropna=False, sort=False).agg(agg).reset_index()
+        else:
+            df = pd.DataFrame([samples.agg(agg)])
+
+        for row in df.to_dict('records'):
+            values = {}
+            for dimension in dimensions:
+                value = _to_value(row[dimension])
+                if value is not None:
+                    values[dimension] = value
+
+            aggregates = {}
+            for measure in measures:
+                count = int(row[f'{measure}.count'])
+                total = _to_value(row[f'{measure}.sum']) if count > 0 else None
+
+                aggregates[measure] = {
+                    'sum': total,
+                    'avg': total / count if count > 0 else None,
+                    'min': _to_value(row[f'{measure}.min']),
+                    'max': _to_value(row[f'{measure}.max']),
+                    'last': _to_value(row[f'{measure}.last']),
+                    'count': count
+                }
+                values[measure] = aggregates[measure]['last']
+
+            yield values, aggregates, int(row[_SAMPLE_COUNT])
+
+
+def _get_dimensions(df, excluded_columns):
+    dimensions = []
+    for column in df.columns:
+        if column in excluded_columns or column == _CREATED_AT:
+            continue
+
+        # Nested values can not be a group key
+        if df[column].map(lambda value: isinstance(value, (dict, list))).any():
+            _LOGGER.debug(f'[_get_dimensions] skip nested field: {column}')
+            continue
+
+        dimensions.append(column)
+
+    return dimensions
+
+
+def _to_value(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+
+    if isinstance(value, float) and np.isnan(value):
+        return None
+
+    return value
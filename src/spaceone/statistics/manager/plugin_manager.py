@@ -1,13 +1,30 @@
 import logging
+import threading
+
+from cachetools import TTLCache
 
 from spaceone.core.manager import BaseManager
-from spaceone.core import utils
+from spaceone.core import config, utils
 from spaceone.statistics.error import *
 from spaceone.statistics.model.storage_model import Storage
 from spaceone.statistics.connector.plugin_connector import PluginConnector
 from spaceone.statistics.connector.repository_connector import RepositoryConnector
 _LOGGER = logging.getLogger(__name__)
 
+_PLUGIN_ENDPOINTS = None
+_PLUGIN_ENDPOINTS_LOCK = threading.Lock()
+
+
+def _get_plugin_endpoints():
+    global _PLUGIN_ENDPOINTS
+
+    with _PLUGIN_ENDPOINTS_LOCK:
+        if _PLUGIN_ENDPOINTS is None:
+            cache_conf = config.get_global('PLUGIN_ENDPOINT_CACHE', {})
+            _PLUGIN_ENDPOINTS = TTLCache(maxsize=cache_conf.get('max_size', 256), ttl=cache_conf.get('ttl', 300))
+
+        return _PLUGIN_ENDPOINTS
+
 
 class PluginManager(BaseManager):
 
@@ -15,14 +32,47 @@ class PluginManager(BaseManager):
         super().__init__(*args, **kwargs)
         self.plugin_connector: PluginConnector = self.locator.get_connector('PluginConnector')
         self.repository_connector: RepositoryConnector = self.locator.get_connector('RepositoryConnector')
+        self._plugin_key = None
+
+    def initialize(self, plugin_id, version, domain_id, use_cache=True):
+        """ Connect to the endpoint of the plugin
+
+        The endpoint is cached by (plugin_id, version, domain_id) for PLUGIN_ENDPOINT_CACHE.ttl.
+        The client is always taken from the connector, since a pooled channel may be closed after an eviction.
+        """
+        plugin_key = (plugin_id, version, domain_id)
+        use_cache = use_cache and config.get_global('PLUGIN_ENDPOINT_CACHE', {}).get('enabled', False)
+        self._plugin_key = plugin_key
+
+        if use_cache:
+            plugin_endpoints = _get_plugin_endpoints()
+            with _PLUGIN_ENDPOINTS_LOCK:
+                cached_endpoint = plugin_endpoints.get(plugin_key)
+
+            if cached_endpoint is not None:
+                _LOGGER.debug(f'[init_plugin] cached endpoint: {cached_endpoint}')
+                self.plugin_connector.initialize(cached_endpoint)
+                return
 
-    def initialize(self, plugin_id, version, domain_id):
         endpoint = self.plugin_connector.get_plugin_endpoint(plugin_id, version, domain_id)
         _LOGGER.debug(f'[init_plugin] endpoint: {endpoint}')
         self.plugin_connector.initialize(endpoint)
 
+        if use_cache:
+            with _PLUGIN_ENDPOINTS_LOCK:
+                plugin_endpoints[plugin_key] = endpoint
+
+    @staticmethod
+    def invalidate_endpoints(plugin_id, domain_id):
+        """ Remove the cached endpoints of all versions of the plugin (e.g. the plugin is updated) """
+        plugin_endpoints = _get_plugin_endpoints()
+        with _PLUGIN_ENDPOINTS_LOCK:
+            for plugin_key in [plugin_key for plugin_key in plugin_endpoints
+                               if plugin_key[0] == plugin_id and plugin_key[2] == domain_id]:
+                plugin_endpoints.pop(plugin_key, None)
+
     def init_plugin(self, options):
-        plugin_info = self.plugin_connector.init(options)
+        plugin_info = self._call_plugin('init', options)
         _LOGGER.debug(f'[plugin_info] {plugin_info}')
         plugin_metadata = plugin_info.get('metadata', {})
 
@@ -55,7 +105,23 @@ class PluginManager(BaseManager):
         return identity_connector.list_domains(query)
 
     def verify_plugin(self, params, secret_data):
-        self.plugin_connector.verify(params, secret_data)
+        self._call_plugin('verify', params, secret_data)
+
+    def _call_plugin(self, method, *args):
+        try:
+            return getattr(self.plugin_connector, method)(*args)
+        except ERROR_GRPC_CONNECTION as e:
+            if self._plugin_key is None:
+                raise e
+
+            # The plugin may have moved to another endpoint, so it is resolved again
+            _LOGGER.warning(f'[_call_plugin] refresh the plugin endpoint: {self._plugin_key} ({e.message})')
+            plugin_id, version, domain_id = self._plugin_key
+            self.invalidate_endpoints(plugin_id, domain_id)
+
+            self.plugin_connector = self.locator.get_connector('PluginConnector')
+            self.initialize(plugin_id, version, domain_id)
+            return getattr(self.plugin_connector, method)(*args)
 
     @staticmethod
     def _validate_plugin_metadata(plugin_metadata):
@@ -1,10 +1,22 @@
+import asyncio
+import hashlib
+import json
 import logging
+import threading
+import time
 import pandas as pd
 import numpy as np
+from cachetools import TTLCache
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
 
+from spaceone.core import config
 from spaceone.core.manager import BaseManager
 from spaceone.statistics.error import *
 from spaceone.statistics.connector.service_connector import ServiceConnector
+from spaceone.statistics.connector.async_service_connector import AsyncServiceConnector
+from spaceone.statistics.lib import event_loop, single_flight
+from spaceone.statistics.lib.formula import compile_formula, execute_formula
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -22,32 +34,157 @@ _SUPPORTED_AGGREGATE_OPERATIONS = [
     'formula',
     'fill_na'
 ]
+_SUB_QUERY_OPERATIONS = [
+    'query',
+    'join',
+    'concat'
+]
 
+_SHARED_RESULTS = None
+_SHARED_RESULTS_LOCK = threading.Lock()
 
-class ResourceManager(BaseManager):
 
-    def stat(self, aggregate, page, domain_id):
-        results = self._execute_aggregate_operations(aggregate, domain_id)
-        return self._page(page, results)
+def _get_shared_results():
+    global _SHARED_RESULTS
 
-    def _execute_aggregate_operations(self, aggregate, domain_id):
-        df = None
+    with _SHARED_RESULTS_LOCK:
+        if _SHARED_RESULTS is None:
+            shared_conf = config.get_global('AGGREGATE_SHARED_EXECUTION', {})
+            _SHARED_RESULTS = TTLCache(maxsize=shared_conf.get('max_size', 64), ttl=shared_conf.get('ttl', 300))
 
-        if 'query' not in aggregate[0]:
-            raise ERROR_REQUIRED_QUERY_OPERATION()
+        return _SHARED_RESULTS
+
+
+class ResourceManager(BaseManager):
 
+    @staticmethod
+    def verify_formulas(aggregate):
         for stage in aggregate:
+            if 'formula' in stage:
+                options = stage['formula']
+                if 'eval' in options:
+                    compile_formula(options['eval'], 'eval')
+                elif 'query' in options:
+                    compile_formula(options['query'], 'query')
+                else:
+                    raise ERROR_REQUIRED_PARAMETER(key='aggregate.formula.eval | aggregate.formula.query')
+
+    def stat(self, aggregate, page, domain_id, use_cache=True, explain=False, shared_key=None):
+        """
+        Args:
+            shared_key (str): aggregates executed with the same shared_key (e.g. a scheduler tick) share
+                              the results of their identical leading query/join/concat stages
+        """
+        started_at = time.time()
+        stage_explains = [] if explain else None
+        top_k = self._get_top_k(aggregate, page)
+
+        if explain or not config.get_global('AGGREGATE_SHARED_EXECUTION', {}).get('enabled', False):
+            shared_key = None
+
+        df, total_count = self._execute_aggregate_operations(aggregate, domain_id, use_cache, top_k, stage_explains,
+                                                             shared_key)
+
+        serialization_started_at = time.time()
+        response = self._page(page, df, total_count)
+
+        if explain:
+            response['explain'] = {
+                'stages': stage_explains,
+                'serialization_time': self._get_elapsed_time(serialization_started_at),
+                'total_time': self._get_elapsed_time(started_at)
+            }
+
+        return response
+
+    def _execute_aggregate_operations(self, aggregate, domain_id, use_cache=True, top_k=None, stage_explains=None,
+                                      shared_key=None):
+        """
+        Args:
+            top_k (int): if set, the trailing sort only has to order the first top_k rows
+            stage_explains (list): if set, the profile of each stage is appended
+            shared_key (str): if set, the results of the leading query/join/concat stages are shared
+
+        Returns:
+            df (DataFrame)
+            total_count (int): the number of rows before the trailing partial sort
+        """
+        self._validate_aggregate(aggregate)
+
+        if stage_explains is not None:
+            stage_explains.extend([self._init_stage_explain(stage) for stage in aggregate])
+
+        shared_prefix_keys = self._make_shared_prefix_keys(aggregate, domain_id, shared_key) if shared_key else []
+        start_index, df = self._get_shared_prefix(shared_prefix_keys)
+
+        if start_index < len(shared_prefix_keys):
+            # Concurrent jobs of the same tick wait for the one computing the shared prefix
+            df = single_flight.get_single_flight('aggregate_shared_prefix').do(
+                shared_prefix_keys[-1], self._execute_shared_prefix, aggregate[:len(shared_prefix_keys)], domain_id,
+                use_cache, shared_prefix_keys)
+            start_index = len(shared_prefix_keys)
+
+        df, total_count = self._execute_stages(aggregate, domain_id, use_cache, top_k, stage_explains, start_index, df)
+
+        if stage_explains is not None:
+            previous_memory_usage = 0
+            for stage_explain in stage_explains:
+                stage_explain['memory_delta'] = stage_explain['memory_usage'] - previous_memory_usage
+                previous_memory_usage = stage_explain['memory_usage']
+
+        return df, total_count
+
+    def _execute_shared_prefix(self, aggregate, domain_id, use_cache, shared_prefix_keys):
+        """ Execute the leading query/join/concat stages and share the result of each stage """
+
+        # The prefix may have been shared while this call was waiting to start
+        start_index, df = self._get_shared_prefix(shared_prefix_keys)
+        df, _ = self._execute_stages(aggregate, domain_id, use_cache, start_index=start_index, df=df,
+                                     shared_prefix_keys=shared_prefix_keys)
+        return df
+
+    def _execute_stages(self, aggregate, domain_id, use_cache=True, top_k=None, stage_explains=None, start_index=0,
+                        df=None, shared_prefix_keys=None):
+        """
+        Args:
+            start_index (int): index of the first stage to execute on df
+            shared_prefix_keys (list): if set, the result of each stage is shared with these keys
+
+        Returns:
+            df (DataFrame)
+            total_count (int): the number of rows before the trailing partial sort
+        """
+        total_count = None
+        shared_prefix_keys = shared_prefix_keys or []
+
+        prefetched_dfs = self._prefetch_sub_queries(aggregate, domain_id, use_cache, stage_explains, start_index)
+
+        for index, stage in enumerate(aggregate):
+            if index < start_index:
+                continue
+
+            stage_explain = stage_explains[index] if stage_explains is not None else None
+            stage_started_at = time.time()
+            rows_in = 0 if df is None else len(df)
+
             if 'query' in stage:
-                df = self._query(stage['query'], domain_id)
+                df = prefetched_dfs.get(index)
+                if df is None:
+                    df = self._query(stage['query'], domain_id, use_cache=use_cache, stage_explain=stage_explain)
 
             elif 'join' in stage:
-                df = self._join(stage['join'], domain_id, df)
+                df = self._join(stage['join'], domain_id, df, prefetched_dfs.get(index), use_cache, stage_explain)
 
             elif 'concat' in stage:
-                df = self._concat(stage['concat'], domain_id, df)
+                df = self._concat(stage['concat'], domain_id, df, prefetched_dfs.get(index), use_cache,
+                                  stage_explain)
 
             elif 'sort' in stage:
-                df = self._sort(stage['sort'], df)
+                if top_k and index == len(aggregate) - 1:
+                    total_count = len(df)
+                    df = self._sort(stage['sort'], df, top_k)
+                else:
+                    df = self._sort(stage['sort'], df)
 
             elif 'formula' in stage:
                 df = self._execute_formula(stage['formula'], df)
@@ -55,14 +192,174 @@ class ResourceManager(BaseManager):
             elif 'fill_na' in stage:
                 df = self._fill_na(stage['fill_na'], df)
 
-            else:
+            if stage_explain is not None:
+                stage_explain.update({
+                    'elapsed_time': self._get_elapsed_time(stage_started_at),
+                    'rows_in': rows_in,
+                    'rows_out': len(df),
+                    'memory_usage': self._get_memory_usage(df)
+                })
+
+            if index < len(shared_prefix_keys):
+                _get_shared_results()[shared_prefix_keys[index]] = df.copy()
+
+        if total_count is None:
+            total_count = len(df)
+
+        return df, total_count
+
+    def _validate_aggregate(self, aggregate):
+        """ Check every stage before any sub query is sent upstream """
+        if len(aggregate) == 0 or 'query' not in aggregate[0]:
+            raise ERROR_REQUIRED_QUERY_OPERATION()
+
+        for stage in aggregate:
+            operator = next((operator for operator in _SUPPORTED_AGGREGATE_OPERATIONS if operator in stage), None)
+
+            if operator is None:
                 raise ERROR_REQUIRED_PARAMETER(key='aggregate.query | aggregate.join | aggregate.concat | '
                                                    'aggregate.sort | aggregate.formula | aggregate.fill_na')
 
-        df = df.replace({np.nan: None})
-        results = df.to_dict('records')
+            if operator in _SUB_QUERY_OPERATIONS:
+                self._get_query_options(stage[operator], operator)
+
+            if operator == 'join' and 'type' in stage['join'] and stage['join']['type'] not in _JOIN_TYPE_MAP:
+                raise ERROR_INVALID_PARAMETER_TYPE(key='aggregate.join.type', type=list(_JOIN_TYPE_MAP.keys()))
+
+        self.verify_formulas(aggregate)
+
+    @staticmethod
+    def _make_shared_prefix_keys(aggregate, domain_id, shared_key):
+        """ Keys of the leading query/join/concat stages
+
+        Aggregates of the schedules created from the same template are the same up to domain_id,
+        so domain_id is removed from the fingerprint and added to the key instead.
+        """
+        keys = []
+        for index, stage in enumerate(aggregate):
+            if not any(operator in stage for operator in _SUB_QUERY_OPERATIONS):
+                break
+
+            fingerprint = json.dumps(_normalize_stage(aggregate[:index + 1]), sort_keys=True, default=str)
+            keys.append(f'{shared_key}:{domain_id}:{hashlib.md5(fingerprint.encode()).hexdigest()}')
+
+        return keys
+
+    @staticmethod
+    def _get_shared_prefix(shared_prefix_keys):
+        """ The longest shared prefix
+
+        Returns:
+            start_index (int): index of the first stage to execute
+            df (DataFrame): result of the shared prefix
+        """
+        shared_results = _get_shared_results() if shared_prefix_keys else {}
+        for index in range(len(shared_prefix_keys) - 1, -1, -1):
+            df = shared_results.get(shared_prefix_keys[index])
+            if df is not None:
+                _LOGGER.debug(f'[_get_shared_prefix] reuse the result of {index + 1} leading stages')
+                return index + 1, df.copy()
+
+        return 0, None
+
+    def _prefetch_sub_queries(self, aggregate, domain_id, use_cache=True, stage_explains=None, start_index=0):
+        """ Fetch the upstream data of query, join and concat stages concurrently
+
+        Sub queries only depend on their own options, so they can be requested in parallel.
+        Merges are still applied in the original stage order by the caller.
+
+        Returns:
+            prefetched_dfs (dict): {stage_index: DataFrame}
+        """
+        parallel_conf = config.get_global('AGGREGATE_PARALLEL_QUERY', {})
+        if not parallel_conf.get('enabled', False):
+            return {}
+
+        sub_queries = {}
+        for index, stage in enumerate(aggregate):
+            if index < start_index:
+                continue
+
+            for operator in _SUB_QUERY_OPERATIONS:
+                if operator in stage:
+                    sub_queries[index] = (stage[operator], 'query' if operator == 'query' else 'join')
+                    break
+
+        if len(sub_queries) < 2:
+            return {}
+
+        if parallel_conf.get('mode', 'THREAD') == 'ASYNC':
+            return self._prefetch_sub_queries_async(sub_queries, domain_id, use_cache, stage_explains)
+
+        max_workers = min(parallel_conf.get('max_workers', 4), len(sub_queries))
+        _LOGGER.debug(f'[_prefetch_sub_queries] fetch {len(sub_queries)} sub queries (max_workers = {max_workers})')
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {}
+            for index, (options, operator) in sub_queries.items():
+                stage_explain = stage_explains[index] if stage_explains is not None else None
+                futures[index] = executor.submit(self._query, options, domain_id, operator, use_cache, stage_explain)
+
+        # Raise the error of the earliest stage first
+        return {index: future.result() for index, future in futures.items()}
+
+    def _prefetch_sub_queries_async(self, sub_queries, domain_id, use_cache=True, stage_explains=None):
+        """ Await all sub queries on the event loop instead of a thread per sub query """
+        _LOGGER.debug(f'[_prefetch_sub_queries_async] fetch {len(sub_queries)} sub queries')
+
+        async_service_connector: AsyncServiceConnector = self.locator.get_connector('AsyncServiceConnector')
+        coroutines = []
+        for index, (options, operator) in sub_queries.items():
+            stage_explain = stage_explains[index] if stage_explains is not None else None
+            coroutines.append(self._query_async(async_service_connector, options, domain_id, operator, use_cache,
+                                                stage_explain))
+
+        timeout = self._get_prefetch_timeout()
+
+        try:
+            results = event_loop.run(_gather(coroutines), timeout)
+        except concurrent.futures.TimeoutError:
+            raise ERROR_STAT_SUB_QUERY_TIMEOUT(timeout=timeout)
+
+        # Raise the error of the earliest stage first
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+
+        return dict(zip(sub_queries.keys(), results))
+
+    @staticmethod
+    def _get_prefetch_timeout():
+        """ Seconds to wait for the sub queries on the event loop (the longest deadline + margin) """
+
+        deadline_conf = config.get_global('STAT_RESOURCE_DEADLINE', {})
+        deadlines = [deadline_conf.get('default', 0)] + list(deadline_conf.get('services', {}).values())
+        max_wait = deadline_conf.get('max_wait', 600)
+
+        if not all(deadlines):
+            return max_wait
+
+        return min(max(deadlines) + deadline_conf.get('wait_margin', 10), max_wait)
+
+    @staticmethod
+    def _init_stage_explain(stage):
+        stage_type = next(iter(stage.keys()), None)
+        stage_explain = {
+            'stage': stage_type
+        }
+
+        if stage_type in _SUB_QUERY_OPERATIONS:
+            stage_explain['resource_type'] = stage[stage_type].get('resource_type')
 
-        return results
+        return stage_explain
+
+    @staticmethod
+    def _get_elapsed_time(started_at):
+        return round(time.time() - started_at, 6)
+
+    @staticmethod
+    def _get_memory_usage(df):
+        return int(df.memory_usage(index=True, deep=True).sum())
 
     @staticmethod
     def _fill_na(options, base_df):
@@ -86,7 +383,7 @@ class ResourceManager(BaseManager):
     @staticmethod
     def _execute_formula_query(formula, base_df):
         try:
-            base_df = base_df.query(formula)
+            base_df = execute_formula(formula, 'query', base_df)
         except Exception as e:
             raise ERROR_STATISTICS_FORMULA(formula=formula)
 
@@ -95,25 +392,71 @@ class ResourceManager(BaseManager):
     @staticmethod
     def _execute_formula_eval(formula, base_df):
         try:
-            base_df = base_df.eval(formula)
+            base_df = execute_formula(formula, 'eval', base_df)
         except Exception as e:
             raise ERROR_STATISTICS_FORMULA(formula=formula)
 
         return base_df
 
     @staticmethod
-    def _sort(options, base_df):
+    def _get_top_k(aggregate, page):
+        """ Number of leading rows needed by the page when the last stage is a sort """
+        if len(aggregate) < 2 or 'sort' not in aggregate[-1]:
+            return None
+
+        if 'limit' in page and page['limit'] > 0:
+            start = max(page.get('start', 1), 1)
+            return int(start - 1 + page['limit'])
+
+        return None
+
+    def _sort(self, options, base_df, top_k=None):
         if 'key' in options and len(base_df) > 0:
             ascending = not options.get('desc', False)
             try:
+                if top_k and self._is_partial_sortable(options['key'], base_df, top_k):
+                    return self._partial_sort(options['key'], ascending, base_df, top_k)
+
                 return base_df.sort_values(by=options['key'], ascending=ascending)
             except Exception as e:
                 raise ERROR_STATISTICS_QUERY(reason=f'Sorting failed. (sort = {options})')
         else:
             return base_df
 
-    def _concat(self, options, domain_id, base_df):
-        concat_df = self._query(options, domain_id, operator='join')
+    @staticmethod
+    def _is_partial_sortable(sort_keys, base_df, top_k):
+        # nlargest/nsmallest drop NaN and only support numeric columns, so fall back to the full sort.
+        if top_k >= len(base_df):
+            return False
+
+        if not isinstance(sort_keys, list):
+            sort_keys = [sort_keys]
+
+        for key in sort_keys:
+            if key not in base_df.columns:
+                return False
+
+            column = base_df[key]
+            if not pd.api.types.is_numeric_dtype(column) or pd.api.types.is_bool_dtype(column):
+                return False
+
+            if column.isna().any():
+                return False
+
+        return True
+
+    @staticmethod
+    def _partial_sort(sort_keys, ascending, base_df, top_k):
+        """ Select the top k rows in O(n log k) instead of sorting the whole frame """
+        if ascending:
+            return base_df.nsmallest(top_k, sort_keys, keep='first')
+        else:
+            return base_df.nlargest(top_k, sort_keys, keep='first')
+
+    def _concat(self, options, domain_id, base_df, concat_df=None, use_cache=True, stage_explain=None):
+        if concat_df is None:
+            concat_df = self._query(options, domain_id, operator='join', use_cache=use_cache,
+                                    stage_explain=stage_explain)
 
         try:
             base_df = pd.concat([base_df, concat_df], ignore_index=True)
@@ -138,13 +481,16 @@ class ResourceManager(BaseManager):
 
         return pd.DataFrame(empty_join_data)
 
-    def _join(self, options, domain_id, base_df):
+    def _join(self, options, domain_id, base_df, join_df=None, use_cache=True, stage_explain=None):
         if 'type' in options and options['type'] not in _JOIN_TYPE_MAP:
             raise ERROR_INVALID_PARAMETER_TYPE(key='aggregate.join.type', type=list(_JOIN_TYPE_MAP.keys()))
 
         join_keys = options.get('keys')
         join_type = options.get('type', 'LEFT')
-        join_df = self._query(options, domain_id, operator='join')
+
+        if join_df is None:
+            join_df = self._query(options, domain_id, operator='join', use_cache=use_cache,
+                                  stage_explain=stage_explain)
 
         if len(join_df) == 0:
             join_df = self._generate_empty_data(options['query'])
@@ -164,10 +510,38 @@ class ResourceManager(BaseManager):
 
         return base_df
 
-    def _query(self, options, domain_id, operator='query'):
+    def _query(self, options, domain_id, operator='query', use_cache=True, stage_explain=None):
+        service, resource, query, extend_data = self._get_query_options(options, operator)
+
+        self.service_connector: ServiceConnector = self.locator.get_connector('ServiceConnector')
+
+        try:
+            upstream_started_at = time.time()
+            response = self.service_connector.stat_resource(service, resource, query, domain_id, use_cache)
+            return self._make_query_df(response, extend_data, upstream_started_at, stage_explain)
+
+        except ERROR_BASE as e:
+            raise ERROR_STATISTICS_QUERY(reason=e.message)
+        except Exception as e:
+            raise ERROR_STATISTICS_QUERY(reason=e)
+
+    async def _query_async(self, async_service_connector, options, domain_id, operator='query', use_cache=True,
+                           stage_explain=None):
+        service, resource, query, extend_data = self._get_query_options(options, operator)
+
+        try:
+            upstream_started_at = time.time()
+            response = await async_service_connector.stat_resource(service, resource, query, domain_id, use_cache)
+            return self._make_query_df(response, extend_data, upstream_started_at, stage_explain)
+
+        except ERROR_BASE as e:
+            raise ERROR_STATISTICS_QUERY(reason=e.message)
+        except Exception as e:
+            raise ERROR_STATISTICS_QUERY(reason=e)
+
+    def _get_query_options(self, options, operator):
         resource_type = options.get('resource_type')
         query = options.get('query')
-        extend_data = options.get('extend_data', {})
 
         if resource_type is None:
             raise ERROR_REQUIRED_PARAMETER(key=f'aggregate.{operator}.resource_type')
@@ -175,23 +549,21 @@ class ResourceManager(BaseManager):
         if query is None:
             raise ERROR_REQUIRED_PARAMETER(key=f'aggregate.{operator}.query')
 
-        self.service_connector: ServiceConnector = self.locator.get_connector('ServiceConnector')
         service, resource = self._parse_resource_type(resource_type)
+        return service, resource, query, options.get('extend_data', {})
 
-        try:
-            response = self.service_connector.stat_resource(service, resource, query, domain_id)
-            results = response.get('results', [])
+    def _make_query_df(self, response, extend_data, upstream_started_at, stage_explain=None):
+        results = response.get('results', [])
 
-            if len(results) > 0 and not isinstance(results[0], dict):
-                df = pd.DataFrame(results, columns=['value'])
-            else:
-                df = pd.DataFrame(results)
-            return self._extend_data(df, extend_data)
+        if stage_explain is not None:
+            stage_explain['upstream_time'] = self._get_elapsed_time(upstream_started_at)
+            stage_explain['upstream_rows'] = len(results)
 
-        except ERROR_BASE as e:
-            raise ERROR_STATISTICS_QUERY(reason=e.message)
-        except Exception as e:
-            raise ERROR_STATISTICS_QUERY(reason=e)
+        if len(results) > 0 and not isinstance(results[0], dict):
+            df = pd.DataFrame(results, columns=['value'])
+        else:
+            df = pd.DataFrame(results)
+        return self._extend_data(df, extend_data)
 
     @staticmethod
     def _parse_resource_type(resource_type):
@@ -210,20 +582,22 @@ class ResourceManager(BaseManager):
         return df
 
     @staticmethod
-    def _page(page, results):
+    def _page(page, df, total_count=None):
         response = {
-            'total_count': len(results)
+            'total_count': len(df) if total_count is None else total_count
         }
 
+        # Slice the frame first so that only the requested rows are converted to records
         if 'limit' in page and page['limit'] > 0:
             start = page.get('start', 1)
             if start < 1:
                 start = 1
             _start = int(start - 1)
             _end = int(start + page['limit'] - 1)
-            response['results'] = results[_start:_end]
-        else:
-            response['results'] = results
+            df = df.iloc[_start:_end]
+
+        df = df.replace({np.nan: None})
+        response['results'] = df.to_dict('records')
 
         return response
 
@@ -321,3 +695,17 @@ class ResourceManager(BaseManager):
     #             empty_join_data[field['name']] = []
     #
     #     return pd.DataFrame(empty_join_data)
+
+
+async def _gather(coroutines):
+    return await asyncio.gather(*coroutines, return_exceptions=True)
+
+
+def _normalize_stage(value):
+    if isinstance(value, dict):
+        return {key: _normalize_stage(item) for key, item in value.items() if key != 'domain_id'}
+    elif isinstance(value, list):
+        return [_normalize_stage(item) for item in value
+                if not (isinstance(item, dict) and item.get('k', item.get('key')) == 'domain_id')]
+    else:
+        return value
@@ -1,5 +1,7 @@
+import json
 import logging
 
+from spaceone.core import config, queue
 from spaceone.core.manager import BaseManager
 from spaceone.statistics.error import *
 from spaceone.statistics.model.schedule_model import Schedule
@@ -7,6 +9,11 @@ from spaceone.statistics.model.schedule_model import Schedule
 _LOGGER = logging.getLogger(__name__)
 
 
+@queue.connection
+def _publish(queue_cls, item):
+    return queue_cls.publish(item)
+
+
 class ScheduleManager(BaseManager):
 
     def __init__(self, *args, **kwargs):
@@ -17,12 +24,14 @@ class ScheduleManager(BaseManager):
         def _rollback(schedule_vo):
             _LOGGER.info(f'[add_schedule._rollback] '
                          f'Delete schedule : {schedule_vo.topic} '
-                         f'({schedule_vo.storage_id})')
+                         f'({schedule_vo.schedule_id})')
+            self.publish_schedule_event('DELETE', schedule_vo.schedule_id, schedule_vo.domain_id)
             schedule_vo.deregister()
 
         schedule_vo: Schedule = self.schedule_model.create(params)
         self.transaction.add_rollback(_rollback, schedule_vo)
 
+        self.publish_schedule_event('UPSERT', schedule_vo.schedule_id, schedule_vo.domain_id, schedule_vo)
         return schedule_vo
 
     def update_schedule(self, params):
@@ -33,15 +42,32 @@ class ScheduleManager(BaseManager):
         def _rollback(old_data):
             _LOGGER.info(f'[update_schedule_by_vo._rollback] Revert Data : '
                          f'{old_data["schedule_id"]}')
-            schedule_vo.update(old_data)
+            old_schedule_vo = schedule_vo.update(old_data)
+            self.publish_schedule_event('UPSERT', old_schedule_vo.schedule_id, old_schedule_vo.domain_id,
+                                        old_schedule_vo)
 
         self.transaction.add_rollback(_rollback, schedule_vo.to_dict())
 
-        return schedule_vo.update(params)
+        schedule_vo = schedule_vo.update(params)
+        self.publish_schedule_event('UPSERT', schedule_vo.schedule_id, schedule_vo.domain_id, schedule_vo)
+        return schedule_vo
 
     def delete_schedule(self, schedule_id, domain_id):
         schedule_vo: Schedule = self.get_schedule(schedule_id, domain_id)
         schedule_vo.delete()
+        self.publish_schedule_event('DELETE', schedule_id, domain_id)
+
+    def update_last_scheduled_at(self, schedule_id, domain_id, scheduled_at):
+        """ Advance last_scheduled_at to the tick of a completed run (backfilled runs never move it back) """
+
+        try:
+            self.schedule_model._get_collection().update_one({
+                'schedule_id': schedule_id,
+                'domain_id': domain_id,
+                '$or': [{'last_scheduled_at': None}, {'last_scheduled_at': {'$lt': scheduled_at}}]
+            }, {'$set': {'last_scheduled_at': scheduled_at}})
+        except Exception as e:
+            raise ERROR_DB_QUERY(reason=e)
 
     def get_schedule(self, schedule_id, domain_id, only=None):
         return self.schedule_model.get(schedule_id=schedule_id, domain_id=domain_id, only=only)
@@ -55,3 +81,32 @@ class ScheduleManager(BaseManager):
     def list_domains(self, query):
         identity_connector = self.locator.get_connector('IdentityConnector')
         return identity_connector.list_domains(query)
+
+    @staticmethod
+    def publish_schedule_event(event, schedule_id, domain_id, schedule_vo=None):
+        """ Notify the schedulers of a changed schedule (SCHEDULE_NOTIFICATION)
+
+        The schedulers resync all schedules periodically, so a lost event only delays the change.
+
+        Args:
+            event (str): UPSERT | DELETE
+        """
+
+        notification_conf = config.get_global('SCHEDULE_NOTIFICATION', {})
+        if not notification_conf.get('enabled', False):
+            return
+
+        message = {
+            'event': event,
+            'schedule_id': schedule_id,
+            'domain_id': domain_id
+        }
+
+        if schedule_vo:
+            message['state'] = schedule_vo.state
+            message['schedule'] = dict(schedule_vo.schedule.to_dict()) if schedule_vo.schedule else {}
+
+        try:
+            _publish(notification_conf['queue'], json.dumps(message))
+        except Exception as e:
+            _LOGGER.error(f'[publish_schedule_event] failed to publish {event} of {schedule_id}: {e}')
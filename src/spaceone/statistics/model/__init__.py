@@ -1,3 +1,4 @@
 from spaceone.statistics.model.schedule_model import Schedule
-from spaceone.statistics.model.history_model import History
+from spaceone.statistics.model.history_model import History, HistoryBucket, HistoryDelta, HistoryRun, \
+    HistoryRollup
 from spaceone.statistics.model.storage_model import Storage
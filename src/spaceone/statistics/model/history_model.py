@@ -1,6 +1,8 @@
+from datetime import datetime
 from mongoengine import *
 
 from spaceone.core.model.mongo_model import MongoModel
+from spaceone.core.error import *
 from spaceone.statistics.model.schedule_model import Schedule
 
 
@@ -8,8 +10,10 @@ class History(MongoModel):
     topic = StringField(max_length=255)
     schedule = ReferenceField('Schedule', reverse_delete_rule=NULLIFY)
     values = DictField()
+    run_id = StringField(max_length=40, default=None, null=True)
     domain_id = StringField(max_length=255)
     created_at = DateTimeField(required=True)
+    expire_at = DateTimeField(default=None, null=True)
 
     meta = {
         'updatable_fields': [],
@@ -20,9 +24,371 @@ class History(MongoModel):
             '-created_at'
         ],
         'indexes': [
+            {
+                'fields': ['domain_id', 'topic', '-created_at'],
+                'name': 'COMPOUND_INDEX_FOR_SEARCH'
+            },
+            {
+                'fields': ['domain_id', 'topic', 'values.project_id', '-created_at'],
+                'name': 'COMPOUND_INDEX_FOR_PROJECT_SEARCH'
+            },
+            {
+                'fields': ['expire_at'],
+                'expireAfterSeconds': 0,
+                'name': 'TTL_INDEX_FOR_RETENTION'
+            },
             'topic',
             'schedule',
-            'domain_id',
+            'run_id',
+            'created_at'
+        ]
+    }
+
+
+class _UnwoundHistoryValues(object):
+    """ QuerySet-like wrapper to run aggregations on the unwound history rows """
+
+    def __init__(self, collection, pipeline):
+        self._collection = collection
+        self._pipeline = pipeline
+
+    def aggregate(self, pipeline, **kwargs):
+        # $unwind and $sort of all the rows may exceed the memory limit of a stage
+        kwargs.setdefault('allowDiskUse', True)
+        return self._collection.aggregate(self._pipeline + pipeline, **kwargs)
+
+    def distinct(self, key):
+        cursor = self.aggregate([{'$group': {'_id': f'${key}'}}])
+        return [row['_id'] for row in cursor]
+
+
+class UnwoundHistoryModel(MongoModel):
+    """ Base model whose documents are unwound into History rows
+
+    query() and stat() run the aggregation of _make_unwind_pipeline() before the query,
+    so that they can be used in the same way as History.
+    """
+    meta = {
+        'abstract': True
+    }
+
+    # Fields which are not in History
+    _excluded_fields = []
+
+    @classmethod
+    def _make_unwind_pipeline(cls, filter, filter_or, **kwargs):
+        raise NotImplementedError()
+
+    @classmethod
+    def _append_filter(cls, pipeline, filter, filter_or):
+        _filter = cls._make_filter(filter, filter_or)
+        if _filter:
+            pipeline.append({'$match': _filter.to_query(cls)})
+
+        return pipeline
+
+    @classmethod
+    def query(cls, *args, filter=None, filter_or=None, sort=None, page=None, count_only=False, **kwargs):
+        if filter is None:
+            filter = []
+
+        if filter_or is None:
+            filter_or = []
+
+        if sort is None:
+            sort = {}
+
+        if page is None:
+            page = {}
+
+        try:
+            vos = _UnwoundHistoryValues(cls._get_collection(), cls._make_unwind_pipeline(filter, filter_or, **kwargs))
+
+            if count_only:
+                rows = list(vos.aggregate([{'$count': 'total_count'}]))
+                return [], rows[0]['total_count'] if rows else 0
+
+            pipeline = []
+            if 'key' in sort:
+                pipeline.append({'$sort': {sort['key']: -1 if sort.get('desc', False) else 1}})
+            else:
+                pipeline.append({'$sort': {'created_at': -1}})
+
+            page_pipeline = []
+            if 'limit' in page and page['limit'] > 0:
+                start = page.get('start', 1)
+                if start < 1:
+                    start = 1
+
+                if start > 1:
+                    page_pipeline.append({'$skip': start - 1})
+
+                page_pipeline.append({'$limit': page['limit']})
+
+            if cls._excluded_fields:
+                page_pipeline.append({'$project': {field: 0 for field in cls._excluded_fields}})
+
+            if 'limit' in page and page['limit'] > 0:
+                # The page and the total count are read by one aggregation
+                rows = list(vos.aggregate(pipeline + [{'$facet': {
+                    'results': page_pipeline,
+                    'total_count': [{'$count': 'total_count'}]
+                }}]))
+                results = rows[0]['results'] if rows else []
+                total_count = rows[0]['total_count'][0]['total_count'] if rows and rows[0]['total_count'] else 0
+            else:
+                results = list(vos.aggregate(pipeline + page_pipeline))
+                total_count = len(results)
+
+            history_vos = [History._from_son(row) for row in results]
+            return history_vos, total_count
+
+        except Exception as e:
+            raise ERROR_DB_QUERY(reason=e)
+
+    @classmethod
+    def stat(cls, *args, aggregate=None, distinct=None, filter=None, filter_or=None, page=None, **kwargs):
+        if filter is None:
+            filter = []
+
+        if filter_or is None:
+            filter_or = []
+
+        if page is None:
+            page = {}
+
+        if not (aggregate or distinct):
+            raise ERROR_REQUIRED_PARAMETER(key='aggregate')
+
+        try:
+            vos = _UnwoundHistoryValues(cls._get_collection(),
+                                        cls._make_unwind_pipeline(filter, filter_or, **kwargs))
+
+            if aggregate:
+                return cls._stat_aggregate(vos, aggregate, page)
+
+            elif distinct:
+                return cls._stat_distinct(vos, distinct, page)
+
+        except ERROR_BASE as e:
+            raise e
+        except Exception as e:
+            raise ERROR_DB_QUERY(reason=e)
+
+
+class HistoryBucket(UnwoundHistoryModel):
+    """ All (or a fixed-size chunk of) the values of a schedule run in one document """
+    topic = StringField(max_length=255)
+    schedule = ReferenceField('Schedule', reverse_delete_rule=NULLIFY)
+    values = ListField(DictField())
+    value_count = IntField(default=0)
+    run_id = StringField(max_length=40)
+    bucket_index = IntField(default=0)
+    domain_id = StringField(max_length=255)
+    created_at = DateTimeField(required=True)
+    expire_at = DateTimeField(default=None, null=True)
+
+    meta = {
+        'updatable_fields': [],
+        'change_query_keys': {
+            'user_projects': 'values.project_id'
+        },
+        'ordering': [
+            '-created_at'
+        ],
+        'indexes': [
+            {
+                'fields': ['domain_id', 'topic', '-created_at'],
+                'name': 'COMPOUND_INDEX_FOR_SEARCH'
+            },
+            {
+                'fields': ['domain_id', 'topic', 'values.project_id', '-created_at'],
+                'name': 'COMPOUND_INDEX_FOR_PROJECT_SEARCH'
+            },
+            {
+                'fields': ['expire_at'],
+                'expireAfterSeconds': 0,
+                'name': 'TTL_INDEX_FOR_RETENTION'
+            },
+            'topic',
+            'schedule',
+            'run_id',
+            'created_at'
+        ]
+    }
+
+    _excluded_fields = ['value_count', 'bucket_index', 'expire_at']
+
+    @classmethod
+    def _make_unwind_pipeline(cls, filter, filter_or, **kwargs):
+        pipeline = [
+            {'$unwind': '$values'}
+        ]
+
+        # MongoDB moves the conditions which do not refer to 'values' in front of $unwind
+        return cls._append_filter(pipeline, filter, filter_or)
+
+
+class HistoryDelta(UnwoundHistoryModel):
+    """ A version of a history row which is valid from created_at until deleted_at
+
+    A row is written only when it is inserted or changed, and the previous version is closed
+    by deleted_at. query() and stat() take run_times and expand each version into the runs
+    in which it was valid, so that the rows of every run are rebuilt.
+    """
+    topic = StringField(max_length=255)
+    schedule = ReferenceField('Schedule', reverse_delete_rule=NULLIFY)
+    values = DictField()
+    key_hash = StringField(max_length=40)
+    value_hash = StringField(max_length=40)
+    run_id = StringField(max_length=40)
+    domain_id = StringField(max_length=255)
+    created_at = DateTimeField(required=True)
+    deleted_at = DateTimeField(default=None, null=True)
+    expire_at = DateTimeField(default=None, null=True)
+
+    meta = {
+        'updatable_fields': [],
+        'change_query_keys': {
+            'user_projects': 'values.project_id'
+        },
+        'ordering': [
+            '-created_at'
+        ],
+        'indexes': [
+            {
+                'fields': ['domain_id', 'topic', 'deleted_at'],
+                'name': 'COMPOUND_INDEX_FOR_CURRENT_VERSIONS'
+            },
+            {
+                'fields': ['domain_id', 'topic', '-created_at'],
+                'name': 'COMPOUND_INDEX_FOR_SEARCH'
+            },
+            {
+                'fields': ['expire_at'],
+                'expireAfterSeconds': 0,
+                'name': 'TTL_INDEX_FOR_RETENTION'
+            },
+            'schedule',
+            'run_id'
+        ]
+    }
+
+    _excluded_fields = ['key_hash', 'value_hash', 'deleted_at', 'expire_at']
+
+    @classmethod
+    def _make_unwind_pipeline(cls, filter, filter_or, run_times=None, topic=None, domain_id=None, **kwargs):
+        if not run_times:
+            return [{'$match': {'_id': None}}]
+
+        run_times = sorted(run_times)
+        version_filter = {
+            'created_at': {'$lte': run_times[-1]},
+            '$or': [{'deleted_at': None}, {'deleted_at': {'$gt': run_times[0]}}]
+        }
+
+        if topic:
+            version_filter['topic'] = topic
+
+        if domain_id:
+            version_filter['domain_id'] = domain_id
+
+        pipeline = [
+            {'$match': version_filter},
+            {
+                '$addFields': {
+                    'created_at': {
+                        '$filter': {
+                            'input': run_times,
+                            'as': 'run_time',
+                            'cond': {
+                                '$and': [
+                                    {'$gte': ['$$run_time', '$created_at']},
+                                    {'$lt': ['$$run_time', {'$ifNull': ['$deleted_at', datetime.max]}]}
+                                ]
+                            }
+                        }
+                    }
+                }
+            },
+            {'$unwind': '$created_at'}
+        ]
+
+        return cls._append_filter(pipeline, filter, filter_or)
+
+
+class HistoryRun(MongoModel):
+    """ A run of a schedule persisted by HistoryDelta """
+    run_id = StringField(max_length=40)
+    topic = StringField(max_length=255)
+    schedule = ReferenceField('Schedule', reverse_delete_rule=NULLIFY)
+    is_snapshot = BooleanField(default=False)
+    row_count = IntField(default=0)
+    change_count = IntField(default=0)
+    domain_id = StringField(max_length=255)
+    created_at = DateTimeField(required=True)
+    expire_at = DateTimeField(default=None, null=True)
+
+    meta = {
+        'updatable_fields': [],
+        'ordering': [
+            '-created_at'
+        ],
+        'indexes': [
+            {
+                'fields': ['domain_id', 'topic', '-created_at'],
+                'name': 'COMPOUND_INDEX_FOR_SEARCH'
+            },
+            {
+                'fields': ['expire_at'],
+                'expireAfterSeconds': 0,
+                'name': 'TTL_INDEX_FOR_RETENTION'
+            },
+            'run_id'
+        ]
+    }
+
+
+class HistoryRollup(MongoModel):
+    """ Daily or monthly aggregates of the history of a topic
+
+    values has the dimension (non-numeric) fields and the last value of each numeric field,
+    so it can be queried in the same way as History. aggregates has sum, avg, min, max, last and count
+    of each numeric field. (ex. aggregates.server_count.max)
+    """
+    topic = StringField(max_length=255)
+    schedule = ReferenceField('Schedule', reverse_delete_rule=NULLIFY)
+    granularity = StringField(max_length=20, choices=('DAILY', 'MONTHLY'))
+    values = DictField()
+    aggregates = DictField()
+    sample_count = IntField(default=0)
+    domain_id = StringField(max_length=255)
+    created_at = DateTimeField(required=True)
+    expire_at = DateTimeField(default=None, null=True)
+
+    meta = {
+        'updatable_fields': [],
+        'change_query_keys': {
+            'user_projects': 'values.project_id'
+        },
+        'ordering': [
+            '-created_at'
+        ],
+        'indexes': [
+            {
+                'fields': ['domain_id', 'topic', 'granularity', '-created_at'],
+                'name': 'COMPOUND_INDEX_FOR_SEARCH'
+            },
+            {
+                'fields': ['domain_id', 'topic', 'granularity', 'values.project_id', '-created_at'],
+                'name': 'COMPOUND_INDEX_FOR_PROJECT_SEARCH'
+            },
+            {
+                'fields': ['expire_at'],
+                'expireAfterSeconds': 0,
+                'name': 'TTL_INDEX_FOR_RETENTION'
+            },
+            'schedule',
             'created_at'
         ]
     }
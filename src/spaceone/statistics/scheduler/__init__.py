@@ -1 +1,2 @@
 from spaceone.statistics.scheduler.stat_hourly_scheduler import StatHourlyScheduler
+from spaceone.statistics.scheduler.stat_scheduler import StatScheduler
@@ -43,6 +43,8 @@ def _validate_token(token):
 
 
 class StatHourlyScheduler(HourlyScheduler):
+    """ Deprecated: only schedule.hours is supported. Use StatScheduler. """
+
     def __init__(self, queue, interval, minute=':00'):
         super().__init__(queue, interval, minute)
         self.count = self._init_count()
@@ -71,20 +73,25 @@ class StatHourlyScheduler(HourlyScheduler):
 
     def create_task(self):
         # self.check_global_configuration()
-        domains = self.list_domains()
+        self.check_count()
+
+        # All schedules of this hour are listed in a query instead of a query per domain
+        schedules_by_domain = self._list_schedules_by_domain(self.count['hour'])
+
+        if self._is_rollup_hour():
+            for domain in self.list_domains():
+                schedules_by_domain.setdefault(domain['domain_id'], [])
+
         result = []
-        for domain in domains:
-            stp = self._create_job_request(domain)
+        for domain_id, schedules in schedules_by_domain.items():
+            stp = self._create_job_request(domain_id, schedules)
             result.append(stp)
+
+        self._update_count_ended_at()
         return result
 
     def list_domains(self):
         try:
-            ok = self.check_count()
-            if ok == False:
-                # ERROR LOGGING
-                pass
-            # Loop all domain, then find schedule
             metadata = {'token': self.TOKEN,
                         'service': 'statistics',
                         'resource': 'Schedule',
@@ -125,32 +132,52 @@ class StatHourlyScheduler(HourlyScheduler):
         cur = datetime.datetime.utcnow()
         self.count['ended_at'] = cur
 
-    def _list_schedule(self, hour, domain_id):
-        """ List statistics.Schedule
+        duration = (cur - self.count['started_at']).total_seconds()
+        headroom = self.config * 3600 - duration
+        _LOGGER.info(f'[create_task] tick duration: {duration:.3f}s (headroom: {headroom:.3f}s)')
+        if headroom < 0:
+            _LOGGER.error(f'[create_task] tick duration exceeds the interval ({self.config} hours)')
+
+    def _list_schedules_by_domain(self, hour):
+        """ List enabled statistics.Schedule of the hour in all domains
+
+        Returns:
+            schedules_by_domain (dict): {domain_id: [schedule_vo, ...]}
         """
         params = {'query': {
-                            'filter': [{'k': 'schedule.hours', 'v': hour, 'o': 'eq'}],
-                            },
-                  'domain_id': domain_id}
+                            'filter': [{'k': 'schedule.hours', 'v': hour, 'o': 'eq'},
+                                       {'k': 'state', 'v': 'ENABLED', 'o': 'eq'}],
+                            'only': ['schedule_id', 'domain_id']
+                            }}
         metadata = {'token': self.TOKEN,
                     'service': 'statistics',
                     'resource': 'Schedule',
-                    'verb': 'list',
+                    'verb': 'list_all',
                     'authorization': True,
                     'mutation': True,
                     'domain_id': self.domain_id}
-        schedule_svc = self.locator.get_service('ScheduleService', metadata)
-        schedules, total_count = schedule_svc.list(params)
-        _LOGGER.debug(f'[_list_schedule] schedules: {schedules}, total_count: {total_count}')
-        return schedules
 
-    def _create_job_request(self, domain):
+        schedules_by_domain = {}
+        try:
+            schedule_svc = self.locator.get_service('ScheduleService', metadata)
+            schedules, total_count = schedule_svc.list_all(params)
+            _LOGGER.debug(f'[_list_schedules_by_domain] hour: {hour}, total_count: {total_count}')
+
+            for schedule in schedules:
+                schedules_by_domain.setdefault(schedule.domain_id, []).append(schedule)
+
+        except Exception as e:
+            _LOGGER.error(f'[_list_schedules_by_domain] {e}')
+
+        return schedules_by_domain
+
+    def _create_job_request(self, domain_id, schedules):
         """ Based on domain, create Job Request
 
         Returns:
             jobs: SpaceONE Pipeline Template
         """
-        _LOGGER.debug(f'[_create_job_request] domain: {domain}')
+        _LOGGER.debug(f'[_create_job_request] domain: {domain_id}')
         metadata = {'token': self.TOKEN,
                     'service': 'statistics',
                     'resource': 'History',
@@ -158,7 +185,8 @@ class StatHourlyScheduler(HourlyScheduler):
                     'authorization': True,
                     'mutation': True,
                     'domain_id': self.domain_id}
-        schedules = self._list_schedule(self.count['hour'], domain['domain_id'])
+        # The jobs of a tick share the results of their identical leading stages
+        tick = self.count['started_at'].replace(minute=0, second=0, microsecond=0).isoformat()
         sched_jobs = []
         for schedule in schedules:
             sched_job = {
@@ -166,11 +194,22 @@ class StatHourlyScheduler(HourlyScheduler):
                 'name': 'HistoryService',
                 'metadata': metadata,
                 'method': 'create',
-                'params': {'params': {'schedule_id': schedule.storage_id, 'domain_id': domain['domain_id']}
+                'params': {'params': {'schedule_id': schedule.schedule_id, 'tick': tick, 'domain_id': domain_id}
                            }
                 }
             sched_jobs.append(sched_job)
 
+        if self._is_rollup_hour():
+            sched_jobs.append({
+                'locator': 'SERVICE',
+                'name': 'HistoryService',
+                'metadata': dict(metadata, verb='rollup'),
+                'method': 'rollup',
+                'params': {
+                    'params': {'domain_id': domain_id}
+                }
+            })
+
         stp = {'name': 'statistics_hourly_schedule',
                'version': 'v1',
                'executionEngine': 'BaseWorker',
@@ -178,6 +217,10 @@ class StatHourlyScheduler(HourlyScheduler):
         _LOGGER.debug(f'[_create_job_request] tasks: {stp}')
         return stp
 
+    def _is_rollup_hour(self):
+        retention = config.get_global('HISTORY_RETENTION', {})
+        return retention.get('enabled', False) and self.count['hour'] == retention.get('rollup_hour', 0)
+
     @staticmethod
     def _create_schedule_params(schedule, domain_id):
         dict_schedule = dict(schedule.to_dict())
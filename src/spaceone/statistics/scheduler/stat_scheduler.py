@@ -0,0 +1,502 @@
+import collections
+import datetime
+import hashlib
+import heapq
+import itertools
+import json
+import logging
+import threading
+import time
+
+import schedule
+from croniter import croniter
+from jsonschema import validate
+
+from spaceone.core import config, queue
+from spaceone.core.locator import Locator
+from spaceone.core.scheduler.scheduler import BaseScheduler
+from spaceone.core.scheduler.task_schema import SPACEONE_TASK_SCHEMA
+from spaceone.statistics.lib.leader_election import LeaderElection
+from spaceone.statistics.scheduler.stat_hourly_scheduler import _get_domain_id_from_token, _validate_token
+
+__all__ = ['StatScheduler', 'get_next_fire_time']
+
+_LOGGER = logging.getLogger(__name__)
+
+RESYNC_INTERVAL = 600  # seconds between full reloads of the schedules
+WAIT_INTERVAL = 10  # seconds to wait after a subscription error
+SPREAD_SAMPLES = 4  # number of periods to find the shortest period of a schedule
+BACKFILL_DAYS = 7  # fire times older than these days are not backfilled
+
+
+@queue.connection
+def _subscribe(queue_cls):
+    return queue_cls.subscribe()
+
+
+def get_next_fire_time(scheduled, base_time):
+    """ The first fire time after base_time (minute resolution, UTC)
+
+    Args:
+        scheduled (dict): {
+            'cron': 'str',      // cron expression (min hour day month week)
+            'interval': 'int',  // every N minutes from 00:00
+            'minutes': 'list',  // minutes of every hour
+            'hours': 'list'     // hours of every day (at HH:00)
+        }
+        base_time (datetime)
+
+    Returns:
+        next_fire_time (datetime): None if scheduled has no option
+    """
+
+    base_time = base_time.replace(second=0, microsecond=0)
+
+    if scheduled.get('cron'):
+        return croniter(scheduled['cron'], base_time).get_next(datetime.datetime)
+
+    elif scheduled.get('interval'):
+        interval = int(scheduled['interval'])
+        day_start = datetime.datetime.combine(base_time.date(), datetime.time.min)
+        elapsed_minutes = base_time.hour * 60 + base_time.minute
+        return day_start + datetime.timedelta(minutes=(elapsed_minutes // interval + 1) * interval)
+
+    elif scheduled.get('minutes'):
+        minutes = sorted(int(minute) for minute in scheduled['minutes'])
+        for minute in minutes:
+            if minute > base_time.minute:
+                return base_time.replace(minute=minute)
+
+        return base_time.replace(minute=minutes[0]) + datetime.timedelta(hours=1)
+
+    elif scheduled.get('hours'):
+        hours = sorted(int(hour) for hour in scheduled['hours'])
+        for hour in hours:
+            if hour > base_time.hour:
+                return base_time.replace(hour=hour, minute=0)
+
+        return base_time.replace(hour=hours[0], minute=0) + datetime.timedelta(days=1)
+
+    return None
+
+
+class StatScheduler(BaseScheduler):
+    """ Dispatch statistics schedules at their next fire time
+
+    The next fire time of every enabled schedule is kept in a timer heap. Each tick (at hh:mm:00)
+    pops only the due schedules and pushes one task per domain. The schedules are reloaded
+    every resync_interval seconds instead of being listed in each tick.
+
+    If SCHEDULE_NOTIFICATION is enabled, the changes published by ScheduleManager are applied
+    in the next tick and the periodic resync is only a safety net for lost notifications.
+
+    If spread_window (minutes) is set, each schedule is dispatched after a stable offset derived from
+    the hash of its key, so that the schedules of the same fire time do not hit the upstream at once.
+    The offset is shorter than the period of the schedule.
+
+    If backfill_limit is set, the fire times missed while the scheduler was down (since
+    Schedule.last_scheduled_at) or overran are dispatched as backfill jobs, at most backfill_limit
+    per schedule and backfill_per_tick per tick.
+
+    If leader_election ({'name': 'str', 'lease_time': 'int'}) is set, the replicas elect a leader
+    on the Redis of the queue. Standbys keep their registry current but only the leader pushes tasks,
+    fenced by its fencing token. A standby takes over within lease_time seconds.
+    """
+
+    def __init__(self, queue, interval=1, resync_interval=RESYNC_INTERVAL, spread_window=0,
+                 backfill_limit=0, backfill_per_tick=10, leader_election=None):
+        super().__init__(queue)
+        self.config = interval
+        self.resync_interval = resync_interval
+        self.spread_window = spread_window
+        self.backfill_limit = backfill_limit
+        self.backfill_per_tick = backfill_per_tick
+        self.leader_election_conf = leader_election
+        self.leader_election = None
+        self._channel = None
+        self.locator = Locator()
+        self.TOKEN = self._update_token()
+        self.domain_id = _get_domain_id_from_token(self.TOKEN)
+
+        self._timer_heap = []
+        self._entries = {}
+        self._sequence = itertools.count()
+        self._synced_at = None
+        self._events = collections.deque()
+        self._backfill_entries = collections.deque()
+
+    def run(self):
+        config.set_global_force(**self.global_config)
+
+        if self.leader_election_conf:
+            self.leader_election = self._create_leader_election(self.leader_election_conf)
+            self.leader_election.start()
+
+        notification_conf = config.get_global('SCHEDULE_NOTIFICATION', {})
+        if notification_conf.get('enabled', False):
+            listener = threading.Thread(target=self._listen_schedule_events, args=(notification_conf['queue'],),
+                                        daemon=True)
+            listener.start()
+
+        schedule.every(self.config).minutes.at(':00').do(self.push_task)
+        try:
+            while True:
+                schedule.run_pending()
+                time.sleep(1)
+        finally:
+            if self.leader_election:
+                self.leader_election.resign()
+
+    def push_task(self):
+        if self.leader_election is None:
+            return super().push_task()
+
+        try:
+            tasks = self.create_task()
+        except Exception as e:
+            _LOGGER.error(f'[push_task] error create_task: {e}')
+            tasks = []
+
+        for task in tasks:
+            try:
+                validate(task, schema=SPACEONE_TASK_SCHEMA)
+                if not self.leader_election.push(self._channel, json.dumps(task)):
+                    _LOGGER.warning('[push_task] drop the tasks of a deposed leader')
+                    break
+            except Exception as e:
+                _LOGGER.error(f'[push_task] Task schema: {task}, {e}')
+
+    def create_task(self):
+        now = datetime.datetime.utcnow()
+
+        if self._synced_at is None or (now - self._synced_at).total_seconds() >= self.resync_interval:
+            self.sync_schedules(now)
+        else:
+            self.apply_schedule_events(now)
+
+        tasks = [self._create_job_request(domain_id, entries)
+                 for domain_id, entries in self.pop_due_entries(now).items()]
+        tasks += [self._create_job_request(domain_id, entries)
+                  for domain_id, entries in self.pop_backfill_entries().items()]
+
+        # Standbys pop the due entries too, so that their timers are current when they take over
+        if self.leader_election and not self.leader_election.is_leader:
+            _LOGGER.debug(f'[create_task] standby: skip {len(tasks)} tasks')
+            return []
+
+        duration = (datetime.datetime.utcnow() - now).total_seconds()
+        headroom = self.config * 60 - duration
+        _LOGGER.info(f'[create_task] tasks: {len(tasks)}, tick duration: {duration:.3f}s '
+                     f'(headroom: {headroom:.3f}s)')
+        if headroom < 0:
+            _LOGGER.error(f'[create_task] tick duration exceeds the interval ({self.config} minutes)')
+
+        return tasks
+
+    def sync_schedules(self, now=None):
+        """ Reload the enabled schedules and reschedule the new or changed ones """
+
+        now = now or datetime.datetime.utcnow()
+        entries = {}
+
+        # The listing includes the changes notified until now
+        self._events.clear()
+
+        for schedule_vo in self._list_schedules():
+            scheduled = schedule_vo.schedule.to_dict() if schedule_vo.schedule else {}
+            entries[schedule_vo.schedule_id] = {
+                'kind': 'schedule',
+                'schedule_id': schedule_vo.schedule_id,
+                'domain_id': schedule_vo.domain_id,
+                'scheduled': dict(scheduled),
+                'last_scheduled_at': schedule_vo.last_scheduled_at
+            }
+
+        if self._get_rollup_scheduled():
+            for domain in self.list_domains():
+                domain_id = domain['domain_id']
+                entries[f'rollup:{domain_id}'] = {
+                    'kind': 'rollup',
+                    'domain_id': domain_id,
+                    'scheduled': self._get_rollup_scheduled()
+                }
+
+        self.update_entries(entries, now)
+        self._synced_at = now
+
+    def update_entries(self, entries, now):
+        """ Replace the entries. The timer of an unchanged entry is kept. """
+
+        for key in list(self._entries.keys()):
+            if key not in entries:
+                self._remove_entry(key)
+
+        for key, entry in entries.items():
+            self._set_entry(key, entry, now)
+
+        _LOGGER.debug(f'[update_entries] entries: {len(self._entries)}, timers: {len(self._timer_heap)}')
+
+    def apply_schedule_events(self, now):
+        """ Apply the schedule changes notified by ScheduleManager.publish_schedule_event """
+
+        while self._events:
+            event = self._events.popleft()
+            schedule_id = event['schedule_id']
+
+            if event['event'] == 'DELETE' or event.get('state') != 'ENABLED':
+                self._remove_entry(schedule_id)
+            else:
+                self._set_entry(schedule_id, {
+                    'kind': 'schedule',
+                    'schedule_id': schedule_id,
+                    'domain_id': event['domain_id'],
+                    'scheduled': event.get('schedule') or {}
+                }, now)
+
+            _LOGGER.debug(f'[apply_schedule_events] {event["event"]} {schedule_id}')
+
+    def _set_entry(self, key, entry, now):
+        current_entry = self._entries.get(key)
+        if current_entry and current_entry['scheduled'] == entry['scheduled']:
+            return
+
+        # Versions are unique, so the timers of a removed and re-added entry are also ignored
+        entry['version'] = next(self._sequence)
+        entry['offset'] = self._get_spread_offset(key, entry['scheduled'], now)
+        self._entries[key] = entry
+
+        base_time = now
+        if current_entry is None:
+            # A (re)started scheduler still fires the current minute, unless it has been scheduled already
+            base_time = now - datetime.timedelta(minutes=1)
+            if entry.get('last_scheduled_at'):
+                base_time = max(base_time, entry['last_scheduled_at'])
+
+        self._push_timer(key, entry, base_time)
+
+        # Catch up the fire times missed while the scheduler was down
+        if current_entry is None and entry.get('last_scheduled_at'):
+            self._add_backfill_entries(entry, entry['last_scheduled_at'], base_time)
+
+    def _remove_entry(self, key):
+        # The timer in the heap is ignored when it is popped
+        self._entries.pop(key, None)
+
+    def _listen_schedule_events(self, queue_name):
+        while True:
+            try:
+                message = _subscribe(queue_name)
+                if message.get('type') == 'message':
+                    self._events.append(json.loads(message['data']))
+
+            except Exception as e:
+                _LOGGER.error(f'[_listen_schedule_events] {e}')
+                time.sleep(WAIT_INTERVAL)
+
+    def pop_due_entries(self, now):
+        """ Pop the entries whose dispatch time (fire time + offset) has come
+
+        Returns:
+            due_entries (dict): {domain_id: [entry (with fire_time), ...]}
+        """
+
+        due_entries = {}
+        while self._timer_heap and self._timer_heap[0][0] <= now:
+            _, _, key, version, fire_time = heapq.heappop(self._timer_heap)
+            entry = self._entries.get(key)
+
+            if entry is None or entry['version'] != version:
+                continue
+
+            due_entries.setdefault(entry['domain_id'], []).append(dict(entry, fire_time=fire_time))
+            self._push_timer(key, entry, max(fire_time, now - entry['offset']))
+
+            # Catch up the fire times skipped by an overrun
+            self._add_backfill_entries(entry, fire_time, now - entry['offset'])
+
+        return due_entries
+
+    def pop_backfill_entries(self):
+        """ Pop at most backfill_per_tick backfill entries
+
+        Returns:
+            backfill_entries (dict): {domain_id: [entry (with fire_time), ...]}
+        """
+
+        backfill_entries = {}
+        for _ in range(min(self.backfill_per_tick, len(self._backfill_entries))):
+            entry = self._backfill_entries.popleft()
+
+            # Skip the backfill of a removed or changed schedule
+            current_entry = self._entries.get(entry.get('schedule_id'))
+            if current_entry is None or current_entry['version'] != entry['version']:
+                continue
+
+            backfill_entries.setdefault(entry['domain_id'], []).append(entry)
+
+        return backfill_entries
+
+    def _add_backfill_entries(self, entry, start, end):
+        """ Add the latest backfill_limit fire times in (start, end] """
+
+        if not self.backfill_limit or entry['kind'] != 'schedule':
+            return
+
+        start = max(start, end - datetime.timedelta(days=BACKFILL_DAYS))
+        fire_times = collections.deque(maxlen=self.backfill_limit)
+        fire_time = get_next_fire_time(entry['scheduled'], start)
+        while fire_time and fire_time <= end:
+            fire_times.append(fire_time)
+            fire_time = get_next_fire_time(entry['scheduled'], fire_time)
+
+        if fire_times:
+            _LOGGER.info(f'[_add_backfill_entries] {entry["schedule_id"]}: {len(fire_times)} missed ticks '
+                         f'({fire_times[0]} ~ {fire_times[-1]})')
+
+        for fire_time in fire_times:
+            self._backfill_entries.append(dict(entry, fire_time=fire_time, backfill=True))
+
+    def _push_timer(self, key, entry, base_time):
+        next_fire_time = get_next_fire_time(entry['scheduled'], base_time)
+        if next_fire_time:
+            heapq.heappush(self._timer_heap, (next_fire_time + entry['offset'], next(self._sequence), key,
+                                              entry['version'], next_fire_time))
+
+    def _get_spread_offset(self, key, scheduled, now):
+        if not self.spread_window:
+            return datetime.timedelta(0)
+
+        # The offset has to be shorter than the shortest period of the schedule
+        fire_times = [get_next_fire_time(scheduled, now)]
+        while fire_times[-1] and len(fire_times) <= SPREAD_SAMPLES:
+            fire_times.append(get_next_fire_time(scheduled, fire_times[-1]))
+
+        if None in fire_times:
+            return datetime.timedelta(0)
+
+        period = min((fire_times[i + 1] - fire_times[i]).total_seconds() // 60 for i in range(SPREAD_SAMPLES))
+        window = int(min(self.spread_window, period))
+        if window <= 1:
+            return datetime.timedelta(0)
+
+        return datetime.timedelta(minutes=int(hashlib.md5(key.encode()).hexdigest(), 16) % window)
+
+    def list_domains(self):
+        try:
+            metadata = {'token': self.TOKEN,
+                        'service': 'statistics',
+                        'resource': 'Schedule',
+                        'verb': 'list_domains',
+                        'authorization': True,
+                        'mutation': True,
+                        'domain_id': self.domain_id}
+            schedule_svc = self.locator.get_service('ScheduleService', metadata)
+            resp = schedule_svc.list_domains({})
+            _LOGGER.debug(f'[list_domains] num of domains: {resp["total_count"]}')
+            return resp['results']
+        except Exception as e:
+            _LOGGER.error(f'[list_domains] {e}')
+            return []
+
+    def _list_schedules(self):
+        """ List enabled statistics.Schedule of all domains in a query """
+
+        params = {
+            'query': {
+                'filter': [{'k': 'state', 'v': 'ENABLED', 'o': 'eq'}],
+                'only': ['schedule_id', 'schedule', 'domain_id', 'last_scheduled_at']
+            }
+        }
+        metadata = {'token': self.TOKEN,
+                    'service': 'statistics',
+                    'resource': 'Schedule',
+                    'verb': 'list_all',
+                    'authorization': True,
+                    'mutation': True,
+                    'domain_id': self.domain_id}
+
+        try:
+            schedule_svc = self.locator.get_service('ScheduleService', metadata)
+            schedule_vos, total_count = schedule_svc.list_all(params)
+            _LOGGER.debug(f'[_list_schedules] total_count: {total_count}')
+            return schedule_vos
+        except Exception as e:
+            _LOGGER.error(f'[_list_schedules] {e}')
+            return []
+
+    @staticmethod
+    def _get_rollup_scheduled():
+        retention = config.get_global('HISTORY_RETENTION', {})
+        if not retention.get('enabled', False):
+            return None
+
+        return {'cron': f'0 {retention.get("rollup_hour", 0)} * * *'}
+
+    def _create_job_request(self, domain_id, entries):
+        """ Create a task of the due schedules of a domain
+
+        The jobs of the same fire time share the results of their identical leading stages
+        (AGGREGATE_SHARED_EXECUTION) even if they are spread.
+
+        Returns:
+            stp: SpaceONE Pipeline Template
+        """
+
+        metadata = {'token': self.TOKEN,
+                    'service': 'statistics',
+                    'resource': 'History',
+                    'verb': 'create',
+                    'authorization': True,
+                    'mutation': True,
+                    'domain_id': self.domain_id}
+
+        stages = []
+        for entry in entries:
+            tick = entry['fire_time'].isoformat()
+            if entry['kind'] == 'rollup':
+                stages.append({
+                    'locator': 'SERVICE',
+                    'name': 'HistoryService',
+                    'metadata': dict(metadata, verb='rollup'),
+                    'method': 'rollup',
+                    'params': {'params': {'domain_id': domain_id}}
+                })
+            else:
+                stages.append({
+                    'locator': 'SERVICE',
+                    'name': 'HistoryService',
+                    'metadata': metadata,
+                    'method': 'create',
+                    'params': {'params': self._make_create_params(entry, tick, domain_id)}
+                })
+
+        stp = {'name': 'statistics_schedule',
+               'version': 'v1',
+               'executionEngine': 'BaseWorker',
+               'stages': stages}
+        _LOGGER.debug(f'[_create_job_request] tasks: {stp}')
+        return stp
+
+    def _create_leader_election(self, leader_election_conf):
+        # Use the Redis of the queue, which is shared by all replicas
+        queue_conf = config.get_global('QUEUES', {}).get(self.queue, {}).copy()
+        queue_conf.pop('backend', None)
+        self._channel = queue_conf.pop('channel')
+
+        return LeaderElection(leader_election_conf.get('name', 'statistics:stat_scheduler'),
+                              leader_election_conf.get('lease_time', 15), **queue_conf)
+
+    @staticmethod
+    def _make_create_params(entry, tick, domain_id):
+        params = {'schedule_id': entry['schedule_id'], 'tick': tick, 'domain_id': domain_id}
+        if entry.get('backfill', False):
+            params['backfill'] = True
+
+        return params
+
+    @staticmethod
+    def _update_token():
+        token = config.get_global('TOKEN')
+        if token == "":
+            token = _validate_token(config.get_global('TOKEN_INFO'))
+        return token
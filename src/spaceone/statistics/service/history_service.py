@@ -1,10 +1,13 @@
 import logging
+from datetime import datetime, timedelta
 
 from spaceone.core.service import *
+from spaceone.core import utils
 from spaceone.statistics.error import *
 from spaceone.statistics.manager.resource_manager import ResourceManager
 from spaceone.statistics.manager.schedule_manager import ScheduleManager
 from spaceone.statistics.manager.history_manager import HistoryManager
+from spaceone.statistics.manager.history_rollup_manager import HistoryRollupManager, GRANULARITIES
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -19,6 +22,7 @@ class HistoryService(BaseService):
         super().__init__(*args, **kwargs)
         self.resource_mgr: ResourceManager = self.locator.get_manager('ResourceManager')
         self.history_mgr: HistoryManager = self.locator.get_manager('HistoryManager')
+        self.history_rollup_mgr: HistoryRollupManager = self.locator.get_manager('HistoryRollupManager')
 
     @transaction(append_meta={'authorization.scope': 'DOMAIN'})
     @check_required(['schedule_id', 'domain_id'])
@@ -28,6 +32,8 @@ class HistoryService(BaseService):
         Args:
             params (dict): {
                 'schedule_id': 'str',
+                'tick': 'str', // set by the scheduler. jobs of the same tick share identical leading stages
+                'backfill': 'bool', // catch-up job of a missed tick. the history is created at the tick
                 'domain_id': 'str'
             }
 
@@ -45,11 +51,66 @@ class HistoryService(BaseService):
         options = schedule_vo.options
         aggregate = options.get('aggregate', [])
         page = params.get('page', {})
+        tick = self._parse_datetime('tick', params['tick']) if 'tick' in params else None
+        created_at = None
 
-        response = self.resource_mgr.stat(aggregate, page, domain_id)
+        if params.get('backfill', False) and tick:
+            # Delta history has to be written in the order of runs
+            if self.history_mgr.get_delta_option(schedule_vo, topic).get('enabled', False):
+                _LOGGER.debug(f'[create] skip backfill of delta history: {topic} ({tick})')
+                return
+
+            created_at = tick
+
+        response = self.resource_mgr.stat(aggregate, page, domain_id, shared_key=params.get('tick'))
 
         results = response.get('results', [])
-        self.history_mgr.create_history(schedule_vo, topic, results, domain_id)
+        self.history_mgr.create_history(schedule_vo, topic, results, domain_id, created_at=created_at)
+
+        if tick:
+            schedule_mgr.update_last_scheduled_at(schedule_id, domain_id, tick)
+
+    @transaction(append_meta={'authorization.scope': 'DOMAIN'})
+    @check_required(['domain_id'])
+    def rollup(self, params):
+        """Roll up the history into daily (and monthly) aggregates
+
+        Args:
+            params (dict): {
+                'schedule_id': 'str',
+                'date': 'str', // day to roll up (default: yesterday)
+                'domain_id': 'str'
+            }
+
+        Returns:
+            None
+        """
+
+        schedule_mgr: ScheduleManager = self.locator.get_manager('ScheduleManager')
+
+        domain_id = params['domain_id']
+
+        if 'date' in params:
+            date = self._parse_datetime('date', params['date'])
+        else:
+            date = datetime.utcnow() - timedelta(days=1)
+
+        if 'schedule_id' in params:
+            schedule_vos = [schedule_mgr.get_schedule(params['schedule_id'], domain_id)]
+        else:
+            schedule_vos, total_count = schedule_mgr.list_schedules({
+                'filter': [{'k': 'domain_id', 'v': domain_id, 'o': 'eq'}]
+            })
+
+        for schedule_vo in schedule_vos:
+            if not self.history_mgr.get_retention(schedule_vo).get('enabled', False):
+                continue
+
+            self.history_rollup_mgr.rollup_history(schedule_vo, 'DAILY', date)
+
+            # Roll up the month on its last day
+            if (date + timedelta(days=1)).month != date.month:
+                self.history_rollup_mgr.rollup_history(schedule_vo, 'MONTHLY', date)
 
     @transaction(append_meta={
         'authorization.scope': 'PROJECT',
@@ -63,7 +124,7 @@ class HistoryService(BaseService):
 
         Args:
             params (dict): {
-                'topic': 'str',
+                'topic': 'str', // the history of a delta topic (HISTORY_DELTA) is read only with a topic
                 'domain_id': 'str',
                 'query': 'dict (spaceone.api.core.v1.Query)',
                 'user_projects': 'list', // from meta
@@ -75,7 +136,39 @@ class HistoryService(BaseService):
         """
 
         query = params.get('query', {})
-        return self.history_mgr.list_history(query)
+
+        # HistoryInfo of spaceone-api has no next_token field, so the token is not returned to the client
+        history_vos, total_count, _ = self.history_mgr.list_history_page(query)
+        return history_vos, total_count
+
+    @transaction(append_meta={
+        'authorization.scope': 'PROJECT',
+        'mutation.append_parameter': {'user_projects': 'authorization.projects'}
+    })
+    @check_required(['topic', 'from', 'to', 'keys', 'domain_id'])
+    def diff(self, params):
+        """ Compare two snapshots of a topic
+
+        Args:
+            params (dict): {
+                'topic': 'str',
+                'from': 'str', // datetime (ISO 8601)
+                'to': 'str', // datetime (ISO 8601)
+                'keys': 'list', // fields to align the rows
+                'fields': 'list', // fields to compare (default: all numeric fields)
+                'domain_id': 'str',
+                'user_projects': 'list', // from meta
+            }
+
+        Returns:
+            values (dict) : 'changed rows with deltas'
+        """
+
+        from_time = self._parse_datetime('from', params['from'])
+        to_time = self._parse_datetime('to', params['to'])
+
+        return self.history_mgr.diff_history(params['topic'], params['domain_id'], from_time, to_time,
+                                             params['keys'], params.get('fields'), params.get('user_projects'))
 
     @transaction(append_meta={
         'authorization.scope': 'PROJECT',
@@ -88,9 +181,10 @@ class HistoryService(BaseService):
         """
         Args:
             params (dict): {
-                'topic': 'str',
+                'topic': 'str', // the history of a delta topic (HISTORY_DELTA) is read only with a topic
                 'domain_id': 'str',
                 'query': 'dict (spaceone.api.core.v1.StatisticsQuery)',
+                'granularity': 'str', // RAW | DAILY | MONTHLY | AUTO (default: RAW)
                 'user_projects': 'list', // from meta
             }
 
@@ -100,4 +194,41 @@ class HistoryService(BaseService):
         """
 
         query = params.get('query', {})
-        return self.history_mgr.stat_history(query)
+        granularity = params.get('granularity', 'RAW')
+
+        # AUTO picks the rollups by the time range of the query (HISTORY_RETENTION.stat_granularity_days)
+        if granularity == 'AUTO':
+            retention = self._get_topic_retention(params.get('topic'), params['domain_id'])
+            granularity = self.history_rollup_mgr.get_stat_granularity(retention, query)
+
+        if granularity not in GRANULARITIES:
+            raise ERROR_INVALID_PARAMETER(key='granularity', reason=f'Choose one of AUTO | {" | ".join(GRANULARITIES)}')
+
+        if granularity == 'RAW':
+            return self.history_mgr.stat_history(query)
+        else:
+            return self.history_rollup_mgr.stat_rollups(query, granularity)
+
+    @staticmethod
+    def _parse_datetime(key, value):
+        try:
+            return utils.iso8601_to_datetime(value).replace(tzinfo=None)
+        except Exception:
+            raise ERROR_INVALID_PARAMETER_TYPE(key=key, type='datetime (ISO 8601)')
+
+    def _get_topic_retention(self, topic, domain_id):
+        schedule_vo = None
+        if topic:
+            schedule_mgr: ScheduleManager = self.locator.get_manager('ScheduleManager')
+            schedule_vos, total_count = schedule_mgr.list_schedules({
+                'filter': [
+                    {'k': 'topic', 'v': topic, 'o': 'eq'},
+                    {'k': 'domain_id', 'v': domain_id, 'o': 'eq'}
+                ],
+                'only': ['topic', 'options']
+            })
+
+            if total_count > 0:
+                schedule_vo = schedule_vos[0]
+
+        return self.history_mgr.get_retention(schedule_vo, topic)
@@ -1,9 +1,13 @@
+import hashlib
+import json
 import logging
 
+from spaceone.core import config
 from spaceone.core.service import *
 
 from spaceone.statistics.error import *
 from spaceone.statistics.manager.resource_manager import ResourceManager
+from spaceone.statistics.lib import single_flight
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -27,6 +31,8 @@ class ResourceService(BaseService):
             params (dict): {
                 'aggregate': 'list',
                 'page': 'dict',
+                'use_cache': 'bool', // internal callers only, not in the v1 proto
+                'explain': 'bool', // internal callers only, not in the v1 proto
                 'domain_id': 'str'
             }
 
@@ -35,6 +41,27 @@ class ResourceService(BaseService):
         """
         aggregate = params.get('aggregate', [])
         page = params.get('page', {})
+        use_cache = params.get('use_cache', True)
+        explain = params.get('explain', False)
         domain_id = params['domain_id']
 
-        return self.resource_mgr.stat(aggregate, page, domain_id)
+        if not config.get_global('STAT_SINGLE_FLIGHT', {}).get('enabled', False):
+            return self.resource_mgr.stat(aggregate, page, domain_id, use_cache, explain)
+
+        # Identical requests in flight (e.g. a dashboard refreshed by many users) share one execution
+        # Upstream requests run with the token of the caller, so only the requests of the same user are coalesced
+        single_flight_key = self._make_single_flight_key(aggregate, page, domain_id, use_cache, explain,
+                                                         self.transaction.get_meta('user_id'))
+        return single_flight.get_single_flight('resource_stat').do(single_flight_key, self.resource_mgr.stat,
+                                                                   aggregate, page, domain_id, use_cache, explain)
+
+    @staticmethod
+    def _make_single_flight_key(aggregate, page, domain_id, use_cache, explain, user_id=None):
+        normalized_request = json.dumps({
+            'aggregate': aggregate,
+            'page': page,
+            'use_cache': use_cache,
+            'explain': explain
+        }, sort_keys=True, default=str)
+
+        return f'{domain_id}:{user_id}:{hashlib.md5(normalized_request.encode()).hexdigest()}'
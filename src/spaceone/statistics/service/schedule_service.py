@@ -1,6 +1,8 @@
 import logging
 import copy
 
+from croniter import croniter
+
 from spaceone.core.service import *
 from spaceone.core import utils
 
@@ -202,6 +204,24 @@ class ScheduleService(BaseService):
         query = params.get('query', {})
         return self.schedule_mgr.stat_schedules(query)
 
+    @transaction
+    @append_query_filter([])
+    def list_all(self, params):
+        """ This is used by Scheduler to list the schedules of all domains in a query
+
+        Args:
+            params (dict): {
+                'query': 'dict (spaceone.api.core.v1.Query)'
+            }
+
+        Returns:
+            schedule_vos (object)
+            total_count
+        """
+
+        query = params.get('query', {})
+        return self.schedule_mgr.list_schedules(query)
+
     @transaction
     @append_query_filter([])
     def list_domains(self, params):
@@ -220,8 +240,46 @@ class ScheduleService(BaseService):
         if schedule and len(schedule) > 1:
             raise ERROR_SCHEDULE_OPTION()
 
+        if not schedule:
+            return
+
+        if 'cron' in schedule and not croniter.is_valid(schedule['cron']):
+            raise ERROR_SCHEDULE_VALUE(key='schedule.cron', reason='cron expression is invalid.')
+
+        for key, max_value in [('minutes', 59), ('hours', 23)]:
+            if key in schedule and not all(0 <= value <= max_value for value in schedule[key]):
+                raise ERROR_SCHEDULE_VALUE(key=f'schedule.{key}', reason=f'{key} must be in 0 ~ {max_value}.')
+
+    @staticmethod
+    def _check_retention(retention):
+        for key in ['raw_days', 'daily_days', 'monthly_days']:
+            value = retention.get(key, 0)
+            # Numbers in a protobuf Struct are converted to float
+            if not isinstance(value, (int, float)) or isinstance(value, bool) \
+                    or not float(value).is_integer() or value < 0:
+                raise ERROR_RETENTION_OPTION(key=f'options.retention.{key}')
+
+    @staticmethod
+    def _check_delta(delta):
+        keys = delta.get('keys', [])
+        if not isinstance(keys, list) or not all(isinstance(key, str) for key in keys):
+            raise ERROR_DELTA_OPTION(key='options.delta.keys', reason='keys must be a list of field names.')
+
+        snapshot_interval = delta.get('snapshot_interval', 24)
+        if not isinstance(snapshot_interval, (int, float)) or isinstance(snapshot_interval, bool) \
+                or snapshot_interval <= 0:
+            raise ERROR_DELTA_OPTION(key='options.delta.snapshot_interval',
+                                     reason='snapshot_interval must be a positive number of hours.')
+
     def _verify_query_option(self, options, domain_id):
         aggregate = options.get('aggregate', [])
         page = options.get('page', {})
 
+        if 'retention' in options:
+            self._check_retention(options['retention'])
+
+        if 'delta' in options:
+            self._check_delta(options['delta'])
+
+        self.resource_mgr.verify_formulas(aggregate)
         self.resource_mgr.stat(aggregate, page, domain_id)
@@ -117,6 +117,9 @@ class StorageService(BaseService):
         storage_dict = storage_vo.to_dict()
         plugin_info = storage_dict['plugin_info']
 
+        # The plugin may be deployed to another endpoint by the update
+        self.plugin_mgr.invalidate_endpoints(plugin_info['plugin_id'], domain_id)
+
         # Update plugin_version and options
         if version:
             domain_id = params['domain_id']
@@ -0,0 +1,203 @@
+"""
+History index benchmark
+
+Compares query plans and latency of the History access patterns (HistoryService.list/stat)
+with the former single-field indexes and the compound indexes of the History model.
+It requires a real MongoDB server. (mongomock does not have a query planner)
+
+    python -m test.benchmark.history_index_benchmark --host mongodb://localhost:27017 --rows 3000000
+"""
+
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from pymongo import MongoClient
+
+from spaceone.statistics.model.history_model import History
+
+SINGLE_FIELD_INDEXES = ['topic', 'schedule', 'run_id', 'domain_id', 'created_at']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='History index benchmark')
+    parser.add_argument('--host', default='mongodb://localhost:27017')
+    parser.add_argument('--db', default='statistics_benchmark')
+    parser.add_argument('--rows', type=int, default=3000000)
+    parser.add_argument('--domains', type=int, default=10)
+    parser.add_argument('--topics', type=int, default=20)
+    parser.add_argument('--projects', type=int, default=500)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--skip-load', action='store_true', help='Reuse the existing benchmark collection')
+    return parser.parse_args()
+
+
+def load_histories(collection, args):
+    collection.drop()
+    now = datetime.utcnow()
+    batch = []
+
+    for i in range(args.rows):
+        batch.append({
+            'topic': f'topic-{random.randrange(args.topics)}',
+            'values': {
+                'project_id': f'project-{random.randrange(args.projects)}',
+                'server_count': random.randrange(1000)
+            },
+            'run_id': f'run-{i // 1000}',
+            'domain_id': f'domain-{random.randrange(args.domains)}',
+            'created_at': now - timedelta(minutes=random.randrange(args.days * 24 * 60))
+        })
+
+        if len(batch) >= 10000:
+            collection.insert_many(batch, ordered=False)
+            batch = []
+
+    if batch:
+        collection.insert_many(batch, ordered=False)
+
+
+def create_indexes(collection, index_specs):
+    collection.drop_indexes()
+    for index_spec in index_specs:
+        if isinstance(index_spec, str):
+            index_spec = {'fields': [index_spec]}
+
+        keys = [(field[1:], -1) if field.startswith('-') else (field, 1) for field in index_spec['fields']]
+        collection.create_index(keys, name=index_spec.get('name'))
+
+
+def make_cases(args):
+    domain_id = 'domain-0'
+    topic = 'topic-0'
+    projects = [f'project-{i}' for i in range(0, args.projects, max(args.projects // 20, 1))]
+    start = datetime.utcnow() - timedelta(days=7)
+
+    return {
+        'list': {
+            'find': {'domain_id': domain_id, 'topic': topic},
+            'sort': [('created_at', -1)],
+            'limit': 100
+        },
+        'list_user_projects': {
+            'find': {'domain_id': domain_id, 'topic': topic, 'values.project_id': {'$in': projects}},
+            'sort': [('created_at', -1)],
+            'limit': 100
+        },
+        'count': {
+            'count': {'domain_id': domain_id, 'topic': topic}
+        },
+        'stat_last_week': {
+            'aggregate': [
+                {'$match': {'domain_id': domain_id, 'topic': topic, 'created_at': {'$gte': start}}},
+                {'$group': {'_id': '$values.project_id', 'total': {'$sum': '$values.server_count'}}}
+            ]
+        }
+    }
+
+
+def run_case(collection, case):
+    if 'find' in case:
+        return list(collection.find(case['find']).sort(case['sort']).limit(case['limit']))
+    elif 'count' in case:
+        return collection.count_documents(case['count'])
+    else:
+        return list(collection.aggregate(case['aggregate']))
+
+
+def explain_case(db, collection, case):
+    if 'find' in case:
+        command = {
+            'find': collection.name,
+            'filter': case['find'],
+            'sort': dict(case['sort']),
+            'limit': case['limit']
+        }
+    elif 'count' in case:
+        command = {'count': collection.name, 'query': case['count']}
+    else:
+        command = {'aggregate': collection.name, 'pipeline': case['aggregate'], 'cursor': {}}
+
+    return db.command('explain', command, verbosity='executionStats')
+
+
+def summarize_plan(explain):
+    stages = []
+    stats = {'keys_examined': 0, 'docs_examined': 0}
+
+    def _walk(node):
+        if isinstance(node, dict):
+            if 'stage' in node:
+                index_name = node.get('indexName')
+                stages.append(f"{node['stage']}({index_name})" if index_name else node['stage'])
+
+            if 'totalKeysExamined' in node:
+                stats['keys_examined'] += node['totalKeysExamined']
+                stats['docs_examined'] += node['totalDocsExamined']
+
+            for key, value in node.items():
+                if key not in ['rejectedPlans', 'allPlansExecution']:
+                    _walk(value)
+
+        elif isinstance(node, list):
+            for value in node:
+                _walk(value)
+
+    _walk(explain)
+    return ' <- '.join(stages), stats
+
+
+def benchmark(db, collection, cases, repeat):
+    results = {}
+    for name, case in cases.items():
+        run_case(collection, case)
+
+        elapsed_times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run_case(collection, case)
+            elapsed_times.append((time.perf_counter() - start) * 1000)
+
+        plan, stats = summarize_plan(explain_case(db, collection, case))
+        results[name] = {
+            'p50_ms': statistics.median(elapsed_times),
+            'max_ms': max(elapsed_times),
+            'plan': plan,
+            **stats
+        }
+
+    return results
+
+
+def print_results(title, results):
+    print(f'\n### {title}')
+    print(f"{'case':<20} {'p50(ms)':>10} {'max(ms)':>10} {'keys':>10} {'docs':>10}  plan")
+    for name, result in results.items():
+        print(f"{name:<20} {result['p50_ms']:>10.2f} {result['max_ms']:>10.2f} "
+              f"{result['keys_examined']:>10} {result['docs_examined']:>10}  {result['plan']}")
+
+
+def main():
+    args = parse_args()
+    client = MongoClient(args.host)
+    db = client[args.db]
+    collection = db['history']
+
+    if not args.skip_load:
+        print(f'Load {args.rows} histories ...')
+        load_histories(collection, args)
+
+    cases = make_cases(args)
+
+    create_indexes(collection, SINGLE_FIELD_INDEXES)
+    print_results('Before (single-field indexes)', benchmark(db, collection, cases, args.repeat))
+
+    create_indexes(collection, History._meta['indexes'])
+    print_results('After (History model indexes)', benchmark(db, collection, cases, args.repeat))
+
+
+if __name__ == '__main__':
+    main()
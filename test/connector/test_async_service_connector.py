@@ -0,0 +1,138 @@
+import asyncio
+import concurrent.futures
+import unittest
+from unittest.mock import patch, MagicMock
+
+import grpc
+
+from spaceone.core.unittest.runner import RichTestRunner
+from spaceone.core import config
+from spaceone.core.transaction import Transaction
+from spaceone.statistics.connector import async_service_connector
+from spaceone.statistics.connector.async_service_connector import AsyncServiceConnector
+from spaceone.statistics.lib import event_loop
+from spaceone.statistics.error.resource import *
+
+_METHOD_KEY = '/spaceone.api.inventory.v1.Server/stat'
+
+
+class _FakeStatMethod:
+
+    def __init__(self, codes):
+        self.codes = list(codes)
+        self.timeouts = []
+
+    async def __call__(self, message, metadata=None, timeout=None):
+        self.timeouts.append(timeout)
+        code = self.codes.pop(0)
+        if code != grpc.StatusCode.OK:
+            raise grpc.aio.AioRpcError(code, grpc.aio.Metadata(), grpc.aio.Metadata(), details=code.name)
+
+        return message
+
+
+class TestAsyncServiceConnector(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        config.init_conf(package='spaceone.statistics')
+        cls.transaction = Transaction()
+        super().setUpClass()
+
+    def _call_stat(self, stat_method):
+        connector = AsyncServiceConnector(self.transaction, {'inventory': 'grpc://inventory:50051/v1'})
+        connector.client['inventory'] = MagicMock()
+        connector.client['inventory']._client_interceptor._make_message.side_effect = lambda request, key: request
+
+        with patch.object(AsyncServiceConnector, '_get_stat_method', return_value=(_METHOD_KEY, stat_method)):
+            return asyncio.run(connector._call_stat('inventory', 'Server', {'query': {}}))
+
+    def test_deadline_per_service(self):
+        stat_method = _FakeStatMethod([grpc.StatusCode.OK])
+        deadline_conf = {'default': 60, 'services': {'inventory': 5}}
+
+        with patch.dict(config.get_global(), {'STAT_RESOURCE_DEADLINE': deadline_conf}):
+            self._call_stat(stat_method)
+
+        self.assertTrue(0 < stat_method.timeouts[0] <= 5)
+
+    def test_deadline_exceeded(self):
+        stat_method = _FakeStatMethod([grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.DEADLINE_EXCEEDED])
+
+        with patch.dict(config.get_global(), {'STAT_RESOURCE_DEADLINE': {'default': 5}}), \
+                patch('random.uniform', return_value=0.01) as mock_uniform:
+            with self.assertRaises(ERROR_STAT_RESOURCE_DEADLINE) as context:
+                self._call_stat(stat_method)
+
+        # The retry waits a jittered backoff
+        mock_uniform.assert_called_once_with(0, async_service_connector.RETRY_BACKOFF)
+
+        self.assertEqual(context.exception.status_code, 'DEADLINE_EXCEEDED')
+
+        # The retry only gets the rest of the deadline
+        self.assertEqual(len(stat_method.timeouts), 2)
+        self.assertLessEqual(stat_method.timeouts[1], stat_method.timeouts[0])
+
+    def test_no_deadline(self):
+        stat_method = _FakeStatMethod([grpc.StatusCode.OK])
+        self._call_stat(stat_method)
+
+        self.assertEqual(stat_method.timeouts, [None])
+
+    def test_single_flight(self):
+        stat_calls = []
+
+        async def _stat_resource(service, resource, query, domain_id, use_cache=True):
+            stat_calls.append(query)
+            await asyncio.sleep(0.05)
+            return {'results': [{'server_count': 100}]}
+
+        async def _stat_concurrently(connector):
+            return await asyncio.gather(*[
+                connector.stat_resource('inventory', 'Server', {'filter': []}, 'domain-123') for _ in range(3)
+            ], connector.stat_resource('inventory', 'Server', {'filter': []}, 'domain-456'))
+
+        connector = AsyncServiceConnector(self.transaction, {'inventory': 'grpc://inventory:50051/v1'})
+
+        with patch.object(connector, '_stat_resource', _stat_resource), \
+                patch.dict(config.get_global(), {'STAT_SINGLE_FLIGHT': {'enabled': True}}):
+            responses = asyncio.run(_stat_concurrently(connector))
+
+        # Requests of the other domain are not coalesced
+        self.assertEqual(len(stat_calls), 2)
+        self.assertEqual(len(responses), 4)
+
+        responses[0]['results'][0]['server_count'] = 0
+        self.assertEqual(responses[1]['results'][0]['server_count'], 100)
+
+    @patch('spaceone.statistics.lib.channel_pool.get_client')
+    def test_ssl_channel(self, mock_get_client):
+        connector = AsyncServiceConnector(self.transaction, {'inventory': 'grpc+ssl://inventory-ssl:443/v1'})
+
+        with patch.object(async_service_connector, '_get_ssl_credentials', return_value='credentials'), \
+                patch('grpc.aio.secure_channel') as mock_secure_channel:
+            connector._init_client('inventory', 'Server')
+            async_service_connector._get_aio_channel('inventory-ssl:443')
+
+        self.assertTrue(mock_get_client.call_args.kwargs['ssl_enabled'])
+        self.assertEqual(mock_secure_channel.call_args.args[:2], ('inventory-ssl:443', 'credentials'))
+
+    def test_event_loop_timeout(self):
+        cancelled = []
+
+        async def _wait_forever():
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        with self.assertRaises(concurrent.futures.TimeoutError):
+            event_loop.run(_wait_forever(), 0.1)
+
+        asyncio.run_coroutine_threadsafe(asyncio.sleep(0), event_loop.get_loop()).result(5)
+        self.assertEqual(cancelled, [True])
+
+
+if __name__ == "__main__":
+    unittest.main(testRunner=RichTestRunner)
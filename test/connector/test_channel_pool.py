@@ -0,0 +1,108 @@
+import threading
+import unittest
+from unittest.mock import patch
+
+import grpc
+
+from spaceone.core.unittest.runner import RichTestRunner
+from spaceone.core import config
+from spaceone.statistics.lib import channel_pool
+from spaceone.statistics.lib.channel_pool import ChannelPool
+
+
+class _FakeChannel:
+
+    def __init__(self, endpoint, ssl_enabled, options, client_opts):
+        self.state = None
+        self.options = options
+        self.client = object()
+        self.closed = False
+
+    @property
+    def is_healthy(self):
+        return self.state != grpc.ChannelConnectivity.SHUTDOWN
+
+    def close(self):
+        self.closed = True
+
+
+@patch.object(channel_pool, '_PooledChannel', _FakeChannel)
+class TestChannelPool(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        config.init_conf(package='spaceone.statistics')
+        super().setUpClass()
+
+    def test_round_robin(self, *args):
+        pool = ChannelPool(size=2)
+
+        clients = [pool.get_client('inventory:50051') for _ in range(6)]
+        self.assertEqual(len(set(clients)), 2)
+        self.assertEqual(clients[2:], [clients[0], clients[1]] * 2)
+
+        pool.get_client('identity:50051')
+        self.assertEqual(pool.get_stats(), {
+            'inventory:50051': {'hits': 4, 'new_channels': 2, 'evictions': 0, 'channels': 2},
+            'identity:50051': {'hits': 0, 'new_channels': 1, 'evictions': 0, 'channels': 1}
+        })
+
+        keepalive_options = dict(pool._channels['inventory:50051'][0].options)
+        self.assertEqual(keepalive_options['grpc.keepalive_time_ms'], 30000)
+
+    def test_evict_unhealthy_channel(self, *args):
+        pool = ChannelPool(size=1)
+
+        client = pool.get_client('inventory:50051')
+        broken_channel = pool._channels['inventory:50051'][0]
+
+        # A channel in TRANSIENT_FAILURE reconnects by itself, so it is kept
+        broken_channel.state = grpc.ChannelConnectivity.TRANSIENT_FAILURE
+        self.assertEqual(pool.get_client('inventory:50051'), client)
+
+        broken_channel.state = grpc.ChannelConnectivity.SHUTDOWN
+        new_client = pool.get_client('inventory:50051')
+        self.assertNotEqual(client, new_client)
+
+        # Connectors may still hold the client of the evicted channel
+        self.assertFalse(broken_channel.closed)
+        self.assertEqual(pool.get_stats()['inventory:50051']['evictions'], 1)
+
+    def test_connect_out_of_pool_lock(self, *args):
+        pool = ChannelPool(size=1)
+        connecting = threading.Event()
+        release = threading.Event()
+
+        class _SlowChannel(_FakeChannel):
+
+            def __init__(self, endpoint, *args):
+                if endpoint == 'inventory:50051':
+                    connecting.set()
+                    release.wait(5)
+
+                super().__init__(endpoint, *args)
+
+        with patch.object(channel_pool, '_PooledChannel', _SlowChannel):
+            slow_thread = threading.Thread(target=pool.get_client, args=('inventory:50051',))
+            slow_thread.start()
+            connecting.wait(5)
+
+            # The other endpoints are not blocked by the connecting channel
+            pool.get_client('identity:50051')
+            self.assertFalse(release.is_set())
+
+            release.set()
+            slow_thread.join(5)
+
+        self.assertEqual(pool.get_stats()['inventory:50051']['channels'], 1)
+
+    def test_get_client_without_pool(self, *args):
+        with patch.dict(config.get_global(), {'GRPC_CHANNEL_POOL': {'enabled': False}}), \
+                patch('spaceone.core.pygrpc.client') as mock_client:
+            channel_pool.get_client(endpoint='inventory:50051')
+
+        mock_client.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main(testRunner=RichTestRunner)
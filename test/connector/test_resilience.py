@@ -0,0 +1,190 @@
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+
+from spaceone.core.unittest.runner import RichTestRunner
+from spaceone.core import config
+from spaceone.core.error import *
+from spaceone.core.transaction import Transaction
+from spaceone.statistics.connector.service_connector import ServiceConnector
+from spaceone.statistics.error.resource import *
+from spaceone.statistics.lib import resilience
+from spaceone.statistics.lib.resilience import CircuitBreaker, LatencyTracker
+
+
+@patch.object(ServiceConnector, '_change_message', side_effect=lambda message: message)
+class TestResilience(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        config.init_conf(package='spaceone.statistics')
+        cls.transaction = Transaction()
+        super().setUpClass()
+
+    def setUp(self):
+        resilience._CIRCUIT_BREAKERS.clear()
+        resilience._LATENCY_TRACKERS.clear()
+        resilience._STATS.clear()
+
+    def _get_connector(self, stat_side_effect):
+        connector = ServiceConnector(self.transaction, {'inventory': 'grpc://inventory:50051/v1'})
+        connector.client['inventory'] = MagicMock()
+        connector.client['inventory'].Server.stat.side_effect = stat_side_effect
+        return connector
+
+    def test_circuit_breaker(self, *args):
+        circuit_breaker = CircuitBreaker(failure_threshold=2, recovery_time=0.05)
+
+        circuit_breaker.record_failure()
+        self.assertTrue(circuit_breaker.allow_request())
+        circuit_breaker.record_failure()
+        self.assertEqual(circuit_breaker.state, 'OPEN')
+        self.assertFalse(circuit_breaker.allow_request())
+
+        time.sleep(0.06)
+        self.assertEqual(circuit_breaker.state, 'HALF_OPEN')
+        self.assertTrue(circuit_breaker.allow_request())
+        self.assertFalse(circuit_breaker.allow_request())
+
+        # A failed probe opens the circuit again
+        circuit_breaker.record_failure()
+        self.assertEqual(circuit_breaker.state, 'OPEN')
+
+        time.sleep(0.06)
+        self.assertTrue(circuit_breaker.allow_request())
+        circuit_breaker.record_success()
+        self.assertEqual(circuit_breaker.state, 'CLOSED')
+
+    def test_latency_percentile(self, *args):
+        latency_tracker = LatencyTracker(window_size=100)
+        self.assertIsNone(latency_tracker.get_percentile(95))
+
+        for latency in range(1, 101):
+            latency_tracker.add(latency / 100)
+
+        self.assertEqual(latency_tracker.get_percentile(95), 0.95)
+        self.assertIsNone(latency_tracker.get_percentile(95, min_samples=200))
+
+    def test_circuit_open_with_stale_fallback(self, *args):
+        responses = [{'results': [{'server_count': 100}]}]
+
+        def _stat(request, metadata=None, timeout=None):
+            if responses:
+                return responses.pop(0)
+            raise ERROR_GRPC_CONNECTION(channel='inventory:50051', message='unavailable')
+
+        connector = self._get_connector(_stat)
+        global_conf = {
+            'CACHES': {
+                'local': {
+                    'backend': 'spaceone.core.cache.local_cache.LocalCache',
+                    'max_size': 128,
+                    'ttl': 86400
+                }
+            },
+            'STAT_RESOURCE_CACHE': {'enabled': True, 'backends': ['local'], 'ttl': 1},
+            'STAT_RESOURCE_RESILIENCE': {
+                'circuit_breaker': {'enabled': True, 'failure_threshold': 1, 'recovery_time': 60,
+                                    'stale_fallback': True, 'stale_ttl': 60}
+            }
+        }
+
+        with patch.dict(config.get_global(), global_conf):
+            query = {'filter': [{'k': 'state', 'v': 'ACTIVE', 'o': 'eq'}]}
+            response = connector.stat_resource('inventory', 'Server', query, 'domain-123')
+
+            with patch.object(time, 'time', return_value=time.time() + 2):
+                with self.assertRaises(ERROR_GRPC_CONNECTION):
+                    connector.stat_resource('inventory', 'Server', query, 'domain-123')
+
+                # The circuit is open, so the expired response is returned without a request
+                stale_response = connector.stat_resource('inventory', 'Server', query, 'domain-123')
+
+                with self.assertRaises(ERROR_STAT_RESOURCE_CIRCUIT_OPEN) as context:
+                    connector.stat_resource('inventory', 'Server', {}, 'domain-123')
+
+                # Clients retry an open circuit like an unavailable upstream
+                self.assertEqual(context.exception.status_code, 'UNAVAILABLE')
+
+        self.assertEqual(stale_response, response)
+        self.assertEqual(connector.client['inventory'].Server.stat.call_count, 2)
+
+        stats = resilience.get_stats()['inventory.Server']
+        self.assertEqual(stats['state'], 'OPEN')
+        self.assertEqual(stats['failures'], 1)
+        self.assertEqual(stats['rejected'], 2)
+        self.assertEqual(stats['stale_fallbacks'], 1)
+
+    def test_application_error_does_not_open_circuit(self, *args):
+        def _stat(request, metadata=None, timeout=None):
+            raise ERROR_INTERNAL_API(error_code='ERROR_INVALID_PARAMETER', message='invalid query')
+
+        connector = self._get_connector(_stat)
+        global_conf = {
+            'STAT_RESOURCE_RESILIENCE': {'circuit_breaker': {'enabled': True, 'failure_threshold': 1}}
+        }
+
+        with patch.dict(config.get_global(), global_conf):
+            for _ in range(2):
+                with self.assertRaises(ERROR_INTERNAL_API):
+                    connector.stat_resource('inventory', 'Server', {}, 'domain-123')
+
+        self.assertEqual(resilience.get_stats()['inventory.Server']['state'], 'CLOSED')
+
+    def test_hedged_request(self, *args):
+        timeouts = []
+
+        def _stat(request, metadata=None, timeout=None):
+            timeouts.append(timeout)
+            if len(timeouts) == 1:
+                time.sleep(0.2)
+                raise ERROR_INTERNAL_API(message='upstream failed')
+
+            return {'results': []}
+
+        connector = self._get_connector(_stat)
+        latency_tracker = resilience.get_latency_tracker('inventory.Server')
+        for _ in range(10):
+            latency_tracker.add(0.01)
+
+        global_conf = {
+            'STAT_RESOURCE_DEADLINE': {'default': 5},
+            'STAT_RESOURCE_RESILIENCE': {'hedge': {'enabled': True, 'min_samples': 10, 'min_delay': 0.01,
+                                                   'budget': 1}}
+        }
+
+        with patch.dict(config.get_global(), global_conf):
+            response = connector.stat_resource('inventory', 'Server', {}, 'domain-123')
+
+        # The first request failed, so the response of the hedged request is used
+        self.assertEqual(response, {'results': []})
+        self.assertEqual(timeouts, [5, 5])
+
+        stats = resilience.get_stats()['inventory.Server']
+        self.assertEqual(stats['hedges'], 1)
+        self.assertEqual(stats['hedge_wins'], 1)
+
+    def test_no_hedge_without_deadline(self, *args):
+        def _stat(request, metadata=None, timeout=None):
+            time.sleep(0.1)
+            return {'results': []}
+
+        connector = self._get_connector(_stat)
+        latency_tracker = resilience.get_latency_tracker('inventory.Server')
+        for _ in range(10):
+            latency_tracker.add(0.01)
+
+        global_conf = {
+            'STAT_RESOURCE_RESILIENCE': {'hedge': {'enabled': True, 'min_samples': 10, 'min_delay': 0.01,
+                                                   'budget': 1}}
+        }
+
+        with patch.dict(config.get_global(), global_conf):
+            connector.stat_resource('inventory', 'Server', {}, 'domain-123')
+
+        self.assertEqual(connector.client['inventory'].Server.stat.call_count, 1)
+        self.assertEqual(resilience.get_stats()['inventory.Server']['hedges'], 0)
+
+
+if __name__ == "__main__":
+    unittest.main(testRunner=RichTestRunner)
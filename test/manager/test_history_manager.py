@@ -0,0 +1,274 @@
+import unittest
+from unittest.mock import patch
+from datetime import datetime, timedelta
+from mongoengine import connect, disconnect
+
+from spaceone.core.unittest.runner import RichTestRunner
+from spaceone.core import config
+from spaceone.core import utils
+from spaceone.core.model.mongo_model import MongoModel
+from spaceone.core.transaction import Transaction
+from spaceone.statistics.error import *
+from spaceone.statistics.manager.history_manager import HistoryManager
+from spaceone.statistics.model.history_model import History, HistoryBucket, HistoryDelta, HistoryRun
+from test.factory.schedule_factory import ScheduleFactory
+
+
+class TestHistoryManager(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        config.init_conf(package='spaceone.statistics')
+        connect('test', host='mongomock://localhost')
+
+        cls.domain_id = utils.generate_id('domain')
+        cls.transaction = Transaction({
+            'service': 'statistics',
+            'api_class': 'History'
+        })
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        disconnect()
+
+    @patch.object(MongoModel, 'connect', return_value=None)
+    def tearDown(self, *args) -> None:
+        print()
+        History.objects.delete()
+        HistoryBucket.objects.delete()
+        HistoryDelta.objects.delete()
+        HistoryRun.objects.delete()
+
+    @patch.object(MongoModel, 'connect', return_value=None)
+    def test_create_history_bulk(self, *args):
+        schedule_vo = ScheduleFactory(domain_id=self.domain_id)
+        results = [{'project_id': f'project-{i}', 'server_count': i} for i in range(25)]
+
+        with patch.dict(config.get_global(), {'HISTORY_BULK_INSERT': {'chunk_size': 10}}):
+            history_mgr = HistoryManager(transaction=self.transaction)
+            run_id = history_mgr.create_history(schedule_vo, schedule_vo.topic, iter(results), self.domain_id)
+
+        history_vos = History.objects(run_id=run_id)
+        self.assertEqual(history_vos.count(), 25)
+        self.assertEqual(len(set(history_vo.created_at for history_vo in history_vos)), 1)
+
+    @patch.object(MongoModel, 'connect', return_value=None)
+    def test_create_history_stream_and_rollback(self, *args):
+        schedule_vo = ScheduleFactory(domain_id=self.domain_id)
+        transaction = Transaction({
+            'service': 'statistics',
+            'api_class': 'History'
+        })
+
+        history_mgr = HistoryManager(transaction=transaction)
+        run_id = utils.generate_id('run')
+        created_at = datetime.utcnow()
+
+        for chunk in range(3):
+            results = [{'project_id': f'project-{chunk}-{i}'} for i in range(5)]
+            history_mgr.create_history(schedule_vo, schedule_vo.topic, results, self.domain_id,
+                                       run_id=run_id, created_at=created_at)
+
+        self.assertEqual(History.objects(run_id=run_id).count(), 15)
+
+        transaction.execute_rollback()
+        self.assertEqual(History.objects(run_id=run_id).count(), 0)
+
+    @patch.object(MongoModel, 'connect', return_value=None)
+    def test_create_history_bucket(self, *args):
+        schedule_vo = ScheduleFactory(domain_id=self.domain_id)
+        results = [{'project_id': f'project-{i % 5}', 'server_count': i} for i in range(25)]
+
+        with patch.dict(config.get_global(), {'HISTORY_STORAGE': {'layout': 'BUCKET', 'bucket_size': 10}}):
+            history_mgr = HistoryManager(transaction=self.transaction)
+            run_id = history_mgr.create_history(schedule_vo, schedule_vo.topic, results, self.domain_id)
+
+            history_vos, total_count = history_mgr.list_history({
+                'filter': [
+                    {'k': 'values.project_id', 'v': 'project-1', 'o': 'eq'},
+                    {'k': 'domain_id', 'v': self.domain_id, 'o': 'eq'}
+                ],
+                'sort': {'key': 'values.server_count', 'desc': True},
+                'page': {'start': 2, 'limit': 2}
+            })
+
+            all_history_vos, all_total_count = history_mgr.list_history({
+                'filter': [{'k': 'run_id', 'v': run_id, 'o': 'eq'}]
+            })
+            _, count_only_total_count = history_mgr.list_history({
+                'filter': [{'k': 'run_id', 'v': run_id, 'o': 'eq'}],
+                'count_only': True
+            })
+
+            stat_result = history_mgr.stat_history({
+                'aggregate': [{
+                    'group': {
+                        'keys': [{'key': 'values.project_id', 'name': 'project_id'}],
+                        'fields': [{'key': 'values.server_count', 'name': 'total', 'operator': 'sum'}]
+                    }
+                }],
+                'filter': [{'k': 'run_id', 'v': run_id, 'o': 'eq'}]
+            })
+
+        bucket_vos = HistoryBucket.objects(run_id=run_id).order_by('bucket_index')
+        self.assertEqual([bucket_vo.value_count for bucket_vo in bucket_vos], [10, 10, 5])
+        self.assertEqual(History.objects(run_id=run_id).count(), 0)
+
+        self.assertEqual(total_count, 5)
+        self.assertEqual([history_vo.values['server_count'] for history_vo in history_vos], [16, 11])
+        self.assertEqual((len(all_history_vos), all_total_count, count_only_total_count), (25, 25, 25))
+
+        totals = {row['project_id']: row['total'] for row in stat_result['results']}
+        self.assertEqual(totals['project-1'], 1 + 6 + 11 + 16 + 21)
+
+    @patch.object(MongoModel, 'connect', return_value=None)
+    def test_list_history_page(self, *args):
+        schedule_vo = ScheduleFactory(domain_id=self.domain_id)
+        history_mgr = HistoryManager(transaction=self.transaction)
+
+        # Rows of a run share created_at, so the cursor has to break ties by _id
+        created_at = datetime.utcnow()
+        for run in range(3):
+            results = [{'project_id': f'project-{run}-{i}'} for i in range(9)]
+            history_mgr.create_history(schedule_vo, schedule_vo.topic, results, self.domain_id,
+                                       created_at=created_at - timedelta(hours=run))
+
+        query = {
+            'filter': [{'k': 'topic', 'v': schedule_vo.topic, 'o': 'eq'}],
+            'page': {'limit': 10}
+        }
+
+        project_ids = []
+        next_token = None
+        page_count = 0
+        while True:
+            history_vos, total_count, next_token = history_mgr.list_history_page(query, next_token)
+            project_ids += [history_vo.values['project_id'] for history_vo in history_vos]
+            page_count += 1
+
+            self.assertEqual(total_count, 27)
+            if next_token is None:
+                break
+
+        self.assertEqual(page_count, 3)
+        self.assertEqual(len(set(project_ids)), 27)
+        self.assertEqual(project_ids[0].split('-')[1], '0')
+        self.assertEqual(project_ids[-1].split('-')[1], '2')
+
+        with self.assertRaises(ERROR_INVALID_PARAMETER):
+            history_mgr.list_history_page(query, 'invalid-token')
+
+    @patch.object(MongoModel, 'connect', return_value=None)
+    def test_diff_history(self, *args):
+        schedule_vo = ScheduleFactory(domain_id=self.domain_id)
+        history_mgr = HistoryManager(transaction=self.transaction)
+
+        from_time = datetime.utcnow() - timedelta(hours=2)
+        to_time = from_time + timedelta(hours=1)
+
+        history_mgr.create_history(schedule_vo, schedule_vo.topic, [
+            {'project_id': 'project-a', 'server_count': 10, 'name': 'a'},
+            {'project_id': 'project-b', 'server_count': 5, 'name': 'b'},
+            {'project_id': 'project-c', 'server_count': 3, 'name': 'c'}
+        ], self.domain_id, created_at=from_time)
+
+        history_mgr.create_history(schedule_vo, schedule_vo.topic, [
+            {'project_id': 'project-a', 'server_count': 15, 'name': 'a'},
+            {'project_id': 'project-b', 'server_count': 5, 'name': 'b'},
+            {'project_id': 'project-d', 'server_count': 1, 'name': 'd'}
+        ], self.domain_id, created_at=to_time)
+
+        response = history_mgr.diff_history(schedule_vo.topic, self.domain_id, from_time + timedelta(minutes=30),
+                                            datetime.utcnow(), ['project_id'])
+
+        results = {result['key']['project_id']: result for result in response['results']}
+        self.assertEqual(response['total_count'], 3)
+        self.assertEqual(results['project-a']['status'], 'CHANGED')
+        self.assertEqual(results['project-a']['values']['server_count'],
+                         {'from': 10.0, 'to': 15.0, 'delta': 5.0, 'percentage': 50.0})
+        self.assertEqual(results['project-c']['status'], 'DELETED')
+        self.assertEqual(results['project-d']['status'], 'ADDED')
+        self.assertIsNone(results['project-d']['values']['server_count']['percentage'])
+
+        with self.assertRaises(ERROR_NOT_FOUND_DIFF_FIELDS):
+            history_mgr.diff_history(schedule_vo.topic, self.domain_id, from_time, to_time, ['region'])
+
+        with self.assertRaises(ERROR_DIFF_TIME_RANGE):
+            history_mgr.diff_history(schedule_vo.topic, self.domain_id, to_time, from_time, ['project_id'])
+
+    @patch.object(MongoModel, 'connect', return_value=None)
+    def test_create_history_delta(self, *args):
+        schedule_vo = ScheduleFactory(domain_id=self.domain_id)
+        schedule_vo.options = dict(schedule_vo.options, delta={'enabled': True, 'keys': ['project_id'],
+                                                               'snapshot_interval': 24})
+        schedule_vo.save()
+
+        transaction = Transaction({
+            'service': 'statistics',
+            'api_class': 'History'
+        })
+        history_mgr = HistoryManager(transaction=transaction)
+
+        created_at = datetime.utcnow().replace(microsecond=0) - timedelta(hours=3)
+        runs = [
+            [{'project_id': 'project-a', 'server_count': 1}, {'project_id': 'project-b', 'server_count': 2}],
+            [{'project_id': 'project-a', 'server_count': 1}, {'project_id': 'project-b', 'server_count': 3},
+             {'project_id': 'project-c', 'server_count': 1}],
+            [{'project_id': 'project-a', 'server_count': 1}, {'project_id': 'project-c', 'server_count': 1}]
+        ]
+
+        for hour, results in enumerate(runs):
+            run_id = history_mgr.create_history(schedule_vo, schedule_vo.topic, results, self.domain_id,
+                                                created_at=created_at + timedelta(hours=hour))
+
+        # run 1: a, b / run 2: b (changed), c / run 3: nothing is inserted
+        self.assertEqual(HistoryDelta.objects(topic=schedule_vo.topic).count(), 4)
+        self.assertEqual(History.objects(topic=schedule_vo.topic).count(), 0)
+        self.assertEqual([history_run_vo.change_count for history_run_vo
+                          in HistoryRun.objects(topic=schedule_vo.topic).order_by('created_at')], [2, 3, 1])
+
+        topic_filter = [
+            {'k': 'topic', 'v': schedule_vo.topic, 'o': 'eq'},
+            {'k': 'domain_id', 'v': self.domain_id, 'o': 'eq'}
+        ]
+
+        history_vos, total_count = history_mgr.list_history({'filter': topic_filter})
+        self.assertEqual(total_count, 7)
+        self.assertEqual(sorted(history_vo.values['project_id'] for history_vo in history_vos[:2]),
+                         ['project-a', 'project-c'])
+
+        stat_result = history_mgr.stat_history({
+            'filter': topic_filter + [{'k': 'created_at', 'v': created_at + timedelta(hours=1), 'o': 'gte'}],
+            'aggregate': [{
+                'group': {
+                    'keys': [{'key': 'created_at', 'name': 'created_at'}],
+                    'fields': [{'key': 'values.server_count', 'name': 'total', 'operator': 'sum'}]
+                }
+            }, {
+                'sort': {'key': 'created_at'}
+            }]
+        })
+        self.assertEqual([row['total'] for row in stat_result['results']], [5, 2])
+
+        # A query without a topic filter does not include the delta topics
+        _, total_count = history_mgr.list_history({'filter': [{'k': 'domain_id', 'v': self.domain_id, 'o': 'eq'}]})
+        self.assertEqual(total_count, 0)
+
+        values = list(history_mgr.list_history_values(schedule_vo.topic, self.domain_id,
+                                                      created_at + timedelta(hours=1),
+                                                      created_at + timedelta(hours=2)))
+        self.assertEqual(sorted(row['server_count'] for _, row in values), [1, 1, 3])
+
+        schedule_vo.options = dict(schedule_vo.options, delta={'enabled': True})
+        with self.assertRaises(ERROR_DELTA_OPTION):
+            history_mgr.create_history(schedule_vo, schedule_vo.topic, runs[0], self.domain_id)
+
+        transaction.execute_rollback()
+        self.assertEqual(HistoryDelta.objects(topic=schedule_vo.topic).count(), 0)
+        self.assertEqual(HistoryRun.objects(topic=schedule_vo.topic).count(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main(testRunner=RichTestRunner)
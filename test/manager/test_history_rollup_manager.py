@@ -0,0 +1,117 @@
+import unittest
+from unittest.mock import patch
+from datetime import datetime, timedelta
+from mongoengine import connect, disconnect
+
+from spaceone.core.unittest.runner import RichTestRunner
+from spaceone.core import config
+from spaceone.core import utils
+from spaceone.core.model.mongo_model import MongoModel
+from spaceone.core.transaction import Transaction
+from spaceone.statistics.manager.history_manager import HistoryManager
+from spaceone.statistics.manager.history_rollup_manager import HistoryRollupManager
+from spaceone.statistics.model.history_model import History, HistoryRollup
+from test.factory.schedule_factory import ScheduleFactory
+
+RETENTION = {
+    'enabled': True,
+    'raw_days': 7,
+    'daily_days': 365,
+    'monthly_days': 0,
+    'topics': {},
+    'stat_granularity_days': {
+        'DAILY': 7,
+        'MONTHLY': 180
+    }
+}
+
+
+class TestHistoryRollupManager(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        config.init_conf(package='spaceone.statistics')
+        connect('test', host='mongomock://localhost')
+
+        cls.domain_id = utils.generate_id('domain')
+        cls.transaction = Transaction({
+            'service': 'statistics',
+            'api_class': 'History'
+        })
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        disconnect()
+
+    @patch.object(MongoModel, 'connect', return_value=None)
+    def tearDown(self, *args) -> None:
+        print()
+        History.objects.delete()
+        HistoryRollup.objects.delete()
+
+    @patch.object(MongoModel, 'connect', return_value=None)
+    def test_rollup_history(self, *args):
+        schedule_vo = ScheduleFactory(domain_id=self.domain_id)
+        # Raw history expires by the TTL index after raw_days
+        yesterday = datetime.utcnow() - timedelta(days=1)
+        day = datetime(yesterday.year, yesterday.month, yesterday.day)
+
+        with patch.dict(config.get_global(), {'HISTORY_RETENTION': RETENTION}):
+            history_mgr = HistoryManager(transaction=self.transaction)
+            for hour in range(3):
+                results = [
+                    {'project_id': 'project-a', 'server_count': 10 + hour},
+                    {'project_id': 'project-b', 'server_count': 20 * hour}
+                ]
+                history_mgr.create_history(schedule_vo, schedule_vo.topic, results, self.domain_id,
+                                           created_at=day + timedelta(hours=hour))
+
+            history_rollup_mgr = HistoryRollupManager(transaction=self.transaction)
+            daily_count = history_rollup_mgr.rollup_history(schedule_vo, 'DAILY', day)
+            monthly_count = history_rollup_mgr.rollup_history(schedule_vo, 'MONTHLY', day)
+
+        self.assertEqual(daily_count, 2)
+        self.assertEqual(monthly_count, 2)
+        self.assertEqual(History.objects(topic=schedule_vo.topic).order_by('created_at').first().expire_at,
+                         day + timedelta(days=7))
+
+        daily_vo = HistoryRollup.objects(granularity='DAILY', values__project_id='project-a').first()
+        self.assertEqual(daily_vo.created_at, day)
+        self.assertEqual(daily_vo.expire_at, day + timedelta(days=365))
+        self.assertEqual(daily_vo.sample_count, 3)
+        self.assertEqual(daily_vo.values, {'project_id': 'project-a', 'server_count': 12})
+        self.assertEqual(daily_vo.aggregates['server_count'],
+                         {'sum': 33, 'avg': 11.0, 'min': 10, 'max': 12, 'last': 12, 'count': 3})
+
+        monthly_vo = HistoryRollup.objects(granularity='MONTHLY', values__project_id='project-b').first()
+        self.assertEqual(monthly_vo.created_at, day.replace(day=1))
+        self.assertIsNone(monthly_vo.expire_at)
+        self.assertEqual(monthly_vo.aggregates['server_count']['max'], 40)
+        self.assertEqual(monthly_vo.aggregates['server_count']['last'], 40)
+
+    @patch.object(MongoModel, 'connect', return_value=None)
+    def test_get_stat_granularity(self, *args):
+        history_rollup_mgr = HistoryRollupManager(transaction=self.transaction)
+        now = datetime.utcnow()
+
+        def _query(days, end_days=None):
+            query = {'filter': [{'k': 'created_at', 'v': utils.datetime_to_iso8601(now - timedelta(days=days)),
+                                 'o': 'datetime_gte'}]}
+            if end_days is not None:
+                query['filter'].append({'k': 'created_at', 'v': now - timedelta(days=end_days), 'o': 'lt'})
+            return query
+
+        with patch.dict(config.get_global(), {'HISTORY_RETENTION': RETENTION}):
+            self.assertEqual(history_rollup_mgr.get_stat_granularity(RETENTION, {}), 'RAW')
+            self.assertEqual(history_rollup_mgr.get_stat_granularity(RETENTION, _query(1)), 'RAW')
+            self.assertEqual(history_rollup_mgr.get_stat_granularity(RETENTION, _query(30)), 'DAILY')
+            self.assertEqual(history_rollup_mgr.get_stat_granularity(RETENTION, _query(20, 18)), 'DAILY')
+            self.assertEqual(history_rollup_mgr.get_stat_granularity(RETENTION, _query(400)), 'MONTHLY')
+            self.assertEqual(history_rollup_mgr.get_stat_granularity(dict(RETENTION, enabled=False),
+                                                                     _query(400)), 'RAW')
+
+
+if __name__ == "__main__":
+    unittest.main(testRunner=RichTestRunner)
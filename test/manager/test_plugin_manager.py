@@ -0,0 +1,82 @@
+import unittest
+from unittest.mock import patch, MagicMock
+
+from spaceone.core.unittest.runner import RichTestRunner
+from spaceone.core import config
+from spaceone.core import utils
+from spaceone.core.error import *
+from spaceone.core.locator import Locator
+from spaceone.core.transaction import Transaction
+from spaceone.statistics.manager import plugin_manager
+from spaceone.statistics.manager.plugin_manager import PluginManager
+
+
+def _get_connector(name, **kwargs):
+    connector = MagicMock()
+    connector.get_plugin_endpoint.return_value = 'grpc://plugin-1:50051'
+    return connector
+
+
+@patch.object(Locator, 'get_connector', side_effect=_get_connector)
+class TestPluginManager(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        config.init_conf(package='spaceone.statistics')
+
+        cls.domain_id = utils.generate_id('domain')
+        cls.transaction = Transaction({
+            'service': 'statistics',
+            'api_class': 'Storage'
+        })
+        super().setUpClass()
+
+    def setUp(self):
+        plugin_manager._PLUGIN_ENDPOINTS = None
+
+    def test_initialize_with_cache(self, *args):
+        with patch.dict(config.get_global(), {'PLUGIN_ENDPOINT_CACHE': {'enabled': True}}):
+            plugin_mgr = PluginManager(transaction=self.transaction)
+            plugin_mgr.initialize('plugin-123', '1.0', self.domain_id)
+
+            other_plugin_mgr = PluginManager(transaction=self.transaction)
+            other_plugin_mgr.initialize('plugin-123', '1.0', self.domain_id)
+
+            # The endpoint of the first resolution is reused, the client is made by the connector
+            other_plugin_mgr.plugin_connector.get_plugin_endpoint.assert_not_called()
+            other_plugin_mgr.plugin_connector.initialize.assert_called_once_with('grpc://plugin-1:50051')
+
+            other_plugin_mgr.initialize('plugin-123', '1.1', self.domain_id)
+            other_plugin_mgr.plugin_connector.get_plugin_endpoint.assert_called_once()
+
+            PluginManager.invalidate_endpoints('plugin-123', self.domain_id)
+
+            plugin_mgr.initialize('plugin-123', '1.0', self.domain_id)
+            self.assertEqual(plugin_mgr.plugin_connector.get_plugin_endpoint.call_count, 2)
+
+    def test_initialize_without_cache(self, *args):
+        plugin_mgr = PluginManager(transaction=self.transaction)
+        plugin_mgr.initialize('plugin-123', '1.0', self.domain_id)
+        plugin_mgr.initialize('plugin-123', '1.0', self.domain_id)
+
+        self.assertEqual(plugin_mgr.plugin_connector.get_plugin_endpoint.call_count, 2)
+
+    def test_refresh_moved_endpoint(self, *args):
+        with patch.dict(config.get_global(), {'PLUGIN_ENDPOINT_CACHE': {'enabled': True}}):
+            plugin_mgr = PluginManager(transaction=self.transaction)
+            plugin_mgr.initialize('plugin-123', '1.0', self.domain_id)
+
+            moved_plugin_connector = plugin_mgr.plugin_connector
+            moved_plugin_connector.init.side_effect = ERROR_GRPC_CONNECTION(channel='plugin-1:50051',
+                                                                            message='unavailable')
+
+            plugin_mgr.init_plugin({})
+
+        # The endpoint is resolved again with a new connector and the call is retried once
+        self.assertNotEqual(plugin_mgr.plugin_connector, moved_plugin_connector)
+        plugin_mgr.plugin_connector.get_plugin_endpoint.assert_called_once()
+        plugin_mgr.plugin_connector.init.assert_called_once_with({})
+
+
+if __name__ == "__main__":
+    unittest.main(testRunner=RichTestRunner)
@@ -0,0 +1,48 @@
+import unittest
+from unittest.mock import patch, MagicMock
+
+from spaceone.core.unittest.runner import RichTestRunner
+from spaceone.core import config
+from spaceone.core.locator import Locator
+from spaceone.statistics.scheduler.stat_hourly_scheduler import StatHourlyScheduler
+
+
+class _ScheduleVO:
+
+    def __init__(self, schedule_id, domain_id):
+        self.schedule_id = schedule_id
+        self.domain_id = domain_id
+
+
+class TestStatHourlyScheduler(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        config.init_conf(package='spaceone.statistics')
+        super().setUpClass()
+
+    @patch('spaceone.statistics.scheduler.stat_hourly_scheduler._get_domain_id_from_token',
+           return_value='domain-root')
+    @patch.object(StatHourlyScheduler, '_update_token', return_value='token')
+    def test_create_task_in_a_query(self, *args):
+        stat_hourly_scheduler = StatHourlyScheduler(None, 1)
+
+        schedule_svc = MagicMock()
+        schedule_svc.list_all.return_value = ([_ScheduleVO('sch-1', 'domain-a'),
+                                               _ScheduleVO('sch-2', 'domain-b'),
+                                               _ScheduleVO('sch-3', 'domain-a')], 3)
+
+        with patch.object(Locator, 'get_service', return_value=schedule_svc), \
+                patch.dict(config.get_global(), {'HISTORY_RETENTION': {'enabled': False}}):
+            tasks = stat_hourly_scheduler.create_task()
+
+        schedule_svc.list_all.assert_called_once()
+        schedule_svc.list_domains.assert_not_called()
+
+        schedule_ids = [[stage['params']['params']['schedule_id'] for stage in task['stages']] for task in tasks]
+        self.assertEqual(schedule_ids, [['sch-1', 'sch-3'], ['sch-2']])
+        self.assertNotEqual(stat_hourly_scheduler.count['ended_at'], 0)
+
+
+if __name__ == "__main__":
+    unittest.main(testRunner=RichTestRunner)
@@ -0,0 +1,238 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch, MagicMock
+
+from spaceone.core.unittest.runner import RichTestRunner
+from spaceone.core import config
+from spaceone.statistics.model.schedule_model import Scheduled
+from spaceone.statistics.scheduler.stat_scheduler import StatScheduler, get_next_fire_time
+
+
+class _ScheduleVO:
+
+    def __init__(self, schedule_id, domain_id, **scheduled):
+        self.schedule_id = schedule_id
+        self.domain_id = domain_id
+        self.schedule = Scheduled(**scheduled)
+        self.last_scheduled_at = None
+
+
+class TestStatScheduler(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        config.init_conf(package='spaceone.statistics')
+        super().setUpClass()
+
+    @patch('spaceone.statistics.scheduler.stat_scheduler._get_domain_id_from_token', return_value='domain-root')
+    @patch.object(StatScheduler, '_update_token', return_value='token')
+    def _create_scheduler(self, *args):
+        return StatScheduler(None)
+
+    def test_get_next_fire_time(self, *args):
+        base_time = datetime(2026, 1, 31, 23, 50, 30)
+
+        self.assertEqual(get_next_fire_time({'cron': '*/15 * * * *'}, base_time), datetime(2026, 2, 1, 0, 0))
+        self.assertEqual(get_next_fire_time({'interval': 7}, base_time), datetime(2026, 1, 31, 23, 55))
+        self.assertEqual(get_next_fire_time({'interval': 10}, base_time), datetime(2026, 2, 1, 0, 0))
+        self.assertEqual(get_next_fire_time({'minutes': [5, 55]}, base_time), datetime(2026, 1, 31, 23, 55))
+        self.assertEqual(get_next_fire_time({'minutes': [5, 50]}, base_time), datetime(2026, 2, 1, 0, 5))
+        self.assertEqual(get_next_fire_time({'hours': [3, 12]}, base_time), datetime(2026, 2, 1, 3, 0))
+        self.assertIsNone(get_next_fire_time({}, base_time))
+
+    def test_dispatch_due_schedules(self, *args):
+        stat_scheduler = self._create_scheduler()
+        now = datetime(2026, 1, 1, 10, 0)
+        schedule_vos = {
+            'domain-a': [_ScheduleVO('sch-1', 'domain-a', interval=5),
+                         _ScheduleVO('sch-2', 'domain-a', hours=[12])],
+            'domain-b': [_ScheduleVO('sch-3', 'domain-b', cron='*/5 * * * *')]
+        }
+
+        with patch.object(stat_scheduler, '_list_schedules',
+                          side_effect=lambda: schedule_vos['domain-a'] + schedule_vos['domain-b']):
+            stat_scheduler.sync_schedules(now)
+
+        self.assertEqual(len(stat_scheduler._timer_heap), 3)
+
+        # The schedules due in the current minute are fired
+        due_entries = stat_scheduler.pop_due_entries(now)
+        self.assertEqual(sorted(due_entries.keys()), ['domain-a', 'domain-b'])
+        self.assertEqual(stat_scheduler.pop_due_entries(now + timedelta(minutes=4)), {})
+
+        due_entries = stat_scheduler.pop_due_entries(now + timedelta(minutes=5))
+        self.assertEqual([entry['schedule_id'] for entry in due_entries['domain-a']], ['sch-1'])
+        self.assertEqual([entry['schedule_id'] for entry in due_entries['domain-b']], ['sch-3'])
+
+        stp = stat_scheduler._create_job_request('domain-a', due_entries['domain-a'])
+        self.assertEqual(stp['stages'][0]['params']['params'],
+                         {'schedule_id': 'sch-1', 'tick': '2026-01-01T10:05:00', 'domain_id': 'domain-a'})
+
+        # A changed schedule is rescheduled and its old timer is ignored
+        schedule_vos['domain-a'] = [_ScheduleVO('sch-1', 'domain-a', minutes=[30])]
+        with patch.object(stat_scheduler, '_list_schedules', side_effect=lambda: schedule_vos['domain-a']):
+            stat_scheduler.sync_schedules(now + timedelta(minutes=6))
+
+        self.assertEqual(stat_scheduler.pop_due_entries(now + timedelta(minutes=12)), {})
+
+        due_entries = stat_scheduler.pop_due_entries(now + timedelta(minutes=30))
+        self.assertEqual(list(due_entries.keys()), ['domain-a'])
+        self.assertEqual(due_entries['domain-a'][0]['schedule_id'], 'sch-1')
+
+    def test_restart_in_due_minute(self, *args):
+        stat_scheduler = self._create_scheduler()
+        now = datetime(2026, 1, 1, 10, 0, 40)
+
+        stat_scheduler.update_entries({
+            'sch-1': {'kind': 'schedule', 'schedule_id': 'sch-1', 'domain_id': 'domain-a',
+                      'scheduled': {'minutes': [0]}, 'last_scheduled_at': datetime(2026, 1, 1, 9, 0)},
+            'sch-2': {'kind': 'schedule', 'schedule_id': 'sch-2', 'domain_id': 'domain-b',
+                      'scheduled': {'minutes': [0]}, 'last_scheduled_at': datetime(2026, 1, 1, 10, 0)}
+        }, now)
+
+        # sch-1 fires the current minute once, sch-2 has fired it before the restart
+        due_entries = stat_scheduler.pop_due_entries(now)
+        self.assertEqual(list(due_entries.keys()), ['domain-a'])
+        self.assertEqual(due_entries['domain-a'][0]['fire_time'], datetime(2026, 1, 1, 10, 0))
+        self.assertEqual(stat_scheduler.pop_backfill_entries(), {})
+        self.assertEqual(stat_scheduler.pop_due_entries(now + timedelta(minutes=30)), {})
+
+    def test_skip_missed_ticks(self, *args):
+        stat_scheduler = self._create_scheduler()
+        now = datetime(2026, 1, 1, 10, 0)
+        stat_scheduler.update_entries({'sch-1': {'kind': 'schedule', 'schedule_id': 'sch-1',
+                                                 'domain_id': 'domain-a', 'scheduled': {'interval': 1}}}, now)
+
+        due_entries = stat_scheduler.pop_due_entries(now + timedelta(minutes=10))
+        self.assertEqual(len(due_entries['domain-a']), 1)
+        self.assertEqual(stat_scheduler._timer_heap[0][0], now + timedelta(minutes=11))
+
+    def test_apply_schedule_events(self, *args):
+        stat_scheduler = self._create_scheduler()
+        now = datetime(2026, 1, 1, 10, 0)
+        stat_scheduler.update_entries({'sch-1': {'kind': 'schedule', 'schedule_id': 'sch-1',
+                                                 'domain_id': 'domain-a', 'scheduled': {'interval': 5}}}, now)
+
+        stat_scheduler._events.extend([
+            {'event': 'UPSERT', 'schedule_id': 'sch-2', 'domain_id': 'domain-b', 'state': 'ENABLED',
+             'schedule': {'minutes': [3]}},
+            {'event': 'UPSERT', 'schedule_id': 'sch-1', 'domain_id': 'domain-a', 'state': 'DISABLED',
+             'schedule': {'interval': 5}}
+        ])
+        stat_scheduler.apply_schedule_events(now)
+
+        due_entries = stat_scheduler.pop_due_entries(now + timedelta(minutes=5))
+        self.assertEqual(list(due_entries.keys()), ['domain-b'])
+
+        # Re-enabled schedule does not revive its old timer
+        stat_scheduler._events.append({'event': 'UPSERT', 'schedule_id': 'sch-1', 'domain_id': 'domain-a',
+                                       'state': 'ENABLED', 'schedule': {'interval': 5}})
+        stat_scheduler.apply_schedule_events(now + timedelta(minutes=6))
+        stat_scheduler._events.append({'event': 'DELETE', 'schedule_id': 'sch-2', 'domain_id': 'domain-b'})
+        stat_scheduler.apply_schedule_events(now + timedelta(minutes=6))
+
+        self.assertEqual(stat_scheduler.pop_due_entries(now + timedelta(minutes=9)), {})
+        due_entries = stat_scheduler.pop_due_entries(now + timedelta(minutes=10))
+        self.assertEqual(list(due_entries.keys()), ['domain-a'])
+        self.assertEqual(len(due_entries['domain-a']), 1)
+
+    def test_spread_dispatch(self, *args):
+        stat_scheduler = self._create_scheduler()
+        stat_scheduler.spread_window = 30
+        now = datetime(2026, 1, 1, 9, 30)
+
+        entries = {}
+        for i in range(20):
+            entries[f'sch-{i}'] = {'kind': 'schedule', 'schedule_id': f'sch-{i}', 'domain_id': 'domain-a',
+                                   'scheduled': {'hours': [10]}}
+
+        entries['sch-interval'] = {'kind': 'schedule', 'schedule_id': 'sch-interval', 'domain_id': 'domain-a',
+                                   'scheduled': {'interval': 5}}
+        stat_scheduler.update_entries(entries, now)
+
+        offsets = [entry['offset'] for key, entry in stat_scheduler._entries.items() if key != 'sch-interval']
+        self.assertGreater(len(set(offsets)), 1)
+        self.assertTrue(all(offset < timedelta(minutes=30) for offset in offsets))
+        self.assertLess(stat_scheduler._entries['sch-interval']['offset'], timedelta(minutes=5))
+
+        # Offsets are stable
+        other_scheduler = self._create_scheduler()
+        other_scheduler.spread_window = 30
+        other_scheduler.update_entries(dict((key, dict(entry)) for key, entry in entries.items()), now)
+        self.assertEqual(other_scheduler._entries['sch-0']['offset'], stat_scheduler._entries['sch-0']['offset'])
+
+        dispatched = {}
+        for minute in range(0, 61):
+            for entry in stat_scheduler.pop_due_entries(datetime(2026, 1, 1, 10, 0) + timedelta(minutes=minute)) \
+                    .get('domain-a', []):
+                if entry['schedule_id'] != 'sch-interval':
+                    dispatched[entry['schedule_id']] = entry['fire_time']
+
+        # Every hourly schedule is dispatched once with the same fire time
+        self.assertEqual(len(dispatched), 20)
+        self.assertEqual(set(dispatched.values()), {datetime(2026, 1, 1, 10, 0)})
+
+    def test_backfill_missed_ticks(self, *args):
+        stat_scheduler = self._create_scheduler()
+        stat_scheduler.backfill_limit = 3
+        stat_scheduler.backfill_per_tick = 2
+        now = datetime(2026, 1, 1, 10, 30)
+
+        stat_scheduler.update_entries({
+            'sch-1': {'kind': 'schedule', 'schedule_id': 'sch-1', 'domain_id': 'domain-a',
+                      'scheduled': {'minutes': [0]}, 'last_scheduled_at': datetime(2026, 1, 1, 4, 0)},
+            'sch-2': {'kind': 'schedule', 'schedule_id': 'sch-2', 'domain_id': 'domain-b',
+                      'scheduled': {'minutes': [0]}, 'last_scheduled_at': datetime(2026, 1, 1, 10, 0)}
+        }, now)
+
+        # Only the latest backfill_limit ticks of sch-1 (05:00 ~ 10:00) are backfilled
+        backfill_entries = stat_scheduler.pop_backfill_entries()
+        self.assertEqual([entry['fire_time'] for entry in backfill_entries['domain-a']],
+                         [datetime(2026, 1, 1, 8, 0), datetime(2026, 1, 1, 9, 0)])
+
+        stp = stat_scheduler._create_job_request('domain-a', backfill_entries['domain-a'])
+        self.assertEqual(stp['stages'][0]['params']['params'],
+                         {'schedule_id': 'sch-1', 'tick': '2026-01-01T08:00:00', 'backfill': True,
+                          'domain_id': 'domain-a'})
+
+        # The backfill of a changed schedule is dropped
+        stat_scheduler.update_entries({
+            'sch-1': {'kind': 'schedule', 'schedule_id': 'sch-1', 'domain_id': 'domain-a',
+                      'scheduled': {'minutes': [30]}}
+        }, now)
+        self.assertEqual(stat_scheduler.pop_backfill_entries(), {})
+
+        # Overrun: 11:30 and 12:30 are skipped by the tick of 13:00
+        due_entries = stat_scheduler.pop_due_entries(datetime(2026, 1, 1, 13, 0))
+        self.assertEqual(due_entries['domain-a'][0]['fire_time'], datetime(2026, 1, 1, 11, 30))
+        backfill_entries = stat_scheduler.pop_backfill_entries()
+        self.assertEqual([entry['fire_time'] for entry in backfill_entries['domain-a']],
+                         [datetime(2026, 1, 1, 12, 30)])
+
+    def test_push_task_only_by_leader(self, *args):
+        stat_scheduler = self._create_scheduler()
+        stat_scheduler._synced_at = datetime.utcnow()
+        stat_scheduler._channel = 'stat_scheduler'
+        stat_scheduler.leader_election = MagicMock()
+        stat_scheduler.update_entries({'sch-1': {'kind': 'schedule', 'schedule_id': 'sch-1',
+                                                 'domain_id': 'domain-a', 'scheduled': {'interval': 1}}},
+                                      datetime.utcnow() - timedelta(minutes=5))
+
+        # A standby pops the due entries but does not create tasks
+        stat_scheduler.leader_election.is_leader = False
+        stat_scheduler.push_task()
+        stat_scheduler.leader_election.push.assert_not_called()
+        self.assertGreater(stat_scheduler._timer_heap[0][0], datetime.utcnow())
+
+        stat_scheduler._timer_heap[0] = (datetime.utcnow() - timedelta(minutes=1),) + stat_scheduler._timer_heap[0][1:]
+        stat_scheduler.leader_election.is_leader = True
+        stat_scheduler.push_task()
+
+        stat_scheduler.leader_election.push.assert_called_once()
+        channel, item = stat_scheduler.leader_election.push.call_args[0]
+        self.assertEqual(channel, 'stat_scheduler')
+        self.assertIn('sch-1', item)
+
+
+if __name__ == "__main__":
+    unittest.main(testRunner=RichTestRunner)
@@ -191,6 +191,35 @@ class TestHistoryService(unittest.TestCase):
 
         self.assertIsNone(result)
 
+    @patch.object(MongoModel, 'connect', return_value=None)
+    @patch.object(ServiceConnector, '_check_resource_type', return_value=None)
+    @patch.object(ServiceConnector, 'stat_resource')
+    def test_create_history_backfill(self, mock_stat_resource, *args):
+        new_schedule_vo = ScheduleFactory(domain_id=self.domain_id, options={
+            'aggregate': [{'query': {'resource_type': 'identity.Project', 'query': {}}}]
+        })
+        mock_stat_resource.return_value = {'results': [{'project_id': 'project-123', 'server_count': 100}]}
+
+        now = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+        ticks = [now - timedelta(hours=1), now - timedelta(hours=3)]
+
+        self.transaction.method = 'create'
+        history_svc = HistoryService(transaction=self.transaction)
+        for tick in ticks:
+            history_svc.create({
+                'schedule_id': new_schedule_vo.schedule_id,
+                'tick': tick.isoformat(),
+                'backfill': True,
+                'domain_id': self.domain_id
+            })
+
+        history_vos = History.objects(topic=new_schedule_vo.topic, domain_id=self.domain_id).order_by('created_at')
+        self.assertEqual([history_vo.created_at for history_vo in history_vos], sorted(ticks))
+
+        # A backfilled tick does not move last_scheduled_at back
+        new_schedule_vo.reload()
+        self.assertEqual(new_schedule_vo.last_scheduled_at, ticks[0])
+
     @patch.object(MongoModel, 'connect', return_value=None)
     def test_list_schedules_by_topic(self, *args):
         history_vos = HistoryFactory.build_batch(10, domain_id=self.domain_id)
@@ -210,6 +239,25 @@ class TestHistoryService(unittest.TestCase):
         self.assertIsInstance(history_vos[0], History)
         self.assertEqual(total_count, 1)
 
+    @patch.object(MongoModel, 'connect', return_value=None)
+    def test_list_history_with_page(self, *args):
+        history_vos = HistoryFactory.build_batch(10, topic='topic-page', domain_id=self.domain_id)
+        list(map(lambda vo: vo.save(), history_vos))
+
+        params = {
+            'topic': 'topic-page',
+            'domain_id': self.domain_id,
+            'query': {'page': {'limit': 3}}
+        }
+
+        self.transaction.method = 'list'
+        history_svc = HistoryService(transaction=self.transaction)
+        history_vos, total_count = history_svc.list(params.copy())
+        history_info = HistoryInfo(history_vos, total_count)
+
+        self.assertEqual(len(history_info.results), 3)
+        self.assertEqual(history_info.total_count, 10)
+
     @patch.object(MongoModel, 'connect', return_value=None)
     def test_stat_history(self, *args):
         history_vos = HistoryFactory.build_batch(10, domain_id=self.domain_id)
@@ -1,5 +1,10 @@
+import asyncio
+import copy
+import threading
+import time
 import unittest
-from unittest.mock import patch
+import random
+from unittest.mock import patch, MagicMock
 from mongoengine import connect, disconnect
 
 from spaceone.core.unittest.result import print_data
@@ -10,8 +15,11 @@ from spaceone.core.model.mongo_model import MongoModel
 from spaceone.core.transaction import Transaction
 from spaceone.statistics.error import *
 from spaceone.statistics.service.resource_service import ResourceService
+from spaceone.statistics.manager.resource_manager import ResourceManager
 from spaceone.statistics.info.common_info import StatisticsInfo
 from spaceone.statistics.connector.service_connector import ServiceConnector
+from spaceone.statistics.connector.async_service_connector import AsyncServiceConnector
+from spaceone.statistics.lib import single_flight
 from test.factory.resource_factory import StatFactory
 
 
@@ -458,6 +466,624 @@ class TestResourceService(unittest.TestCase):
         print_data(results, 'test_resource_stat_distinct')
         StatisticsInfo(results)
 
+    @patch.object(MongoModel, 'connect', return_value=None)
+    @patch.object(ServiceConnector, '_check_resource_type', return_value=None)
+    @patch.object(ServiceConnector, 'stat_resource')
+    def test_resource_stat_parallel_join(self, mock_stat_resource, *args):
+        stat_results = {
+            'identity.Project': [{
+                'project_id': 'project-123',
+                'project_name': 'ncsoft'
+            }, {
+                'project_id': 'project-456',
+                'project_name': 'nexon'
+            }],
+            'inventory.Server': [{
+                'project_id': 'project-123',
+                'server_count': 100
+            }, {
+                'project_id': 'project-456',
+                'server_count': 65
+            }],
+            'inventory.CloudService': [{
+                'project_id': 'project-456',
+                'cloud_service_count': 87
+            }]
+        }
+
+        def _stat_resource(service, resource, query, domain_id, use_cache=True):
+            return {'results': stat_results[f'{service}.{resource}']}
+
+        mock_stat_resource.side_effect = _stat_resource
+
+        params = {
+            'aggregate': [
+                {
+                    'query': {
+                        'resource_type': 'identity.Project',
+                        'query': {}
+                    }
+                },
+                {
+                    'join': {
+                        'resource_type': 'inventory.Server',
+                        'keys': ['project_id'],
+                        'query': {}
+                    }
+                },
+                {
+                    'join': {
+                        'resource_type': 'inventory.CloudService',
+                        'keys': ['project_id'],
+                        'query': {}
+                    }
+                },
+                {
+                    'fill_na': {
+                        'data': {
+                            'cloud_service_count': 0
+                        }
+                    }
+                }
+            ],
+            'domain_id': utils.generate_id('domain')
+        }
+
+        with patch.dict(config.get_global(), {'AGGREGATE_PARALLEL_QUERY': {'enabled': True, 'max_workers': 3}}):
+            self.transaction.method = 'stat'
+            resource_svc = ResourceService(transaction=self.transaction)
+            results = resource_svc.stat(params.copy())
+
+        print_data(results, 'test_resource_stat_parallel_join')
+        StatisticsInfo(results)
+
+        self.assertEqual(mock_stat_resource.call_count, 3)
+        self.assertEqual(results['total_count'], 2)
+        self.assertEqual(results['results'][0]['project_id'], 'project-123')
+        self.assertEqual(results['results'][0]['cloud_service_count'], 0)
+        self.assertEqual(results['results'][1]['cloud_service_count'], 87)
+
+    @patch.object(MongoModel, 'connect', return_value=None)
+    @patch.object(ServiceConnector, '_check_resource_type', return_value=None)
+    @patch.object(ServiceConnector, 'stat_resource')
+    def test_resource_stat_invalid_stage_before_prefetch(self, mock_stat_resource, *args):
+        mock_stat_resource.return_value = {'results': [{'project_id': 'project-123'}]}
+
+        def _aggregate(last_stage):
+            return [
+                {'query': {'resource_type': 'identity.Project', 'query': {}}},
+                {'join': {'resource_type': 'inventory.Server', 'keys': ['project_id'], 'query': {}}},
+                {'concat': {'resource_type': 'inventory.CloudService', 'query': {}}},
+                last_stage
+            ]
+
+        invalid_stages = [
+            ({'join': {'resource_type': 'inventory.Server', 'type': 'CROSS', 'query': {}}},
+             ERROR_INVALID_PARAMETER_TYPE),
+            ({'concat': {'resource_type': 'inventory.CloudService'}}, ERROR_REQUIRED_PARAMETER),
+            ({'formula': {'eval': 'a = b +'}}, ERROR_STATISTICS_FORMULA),
+            ({'unknown': {}}, ERROR_REQUIRED_PARAMETER)
+        ]
+
+        with patch.dict(config.get_global(), {'AGGREGATE_PARALLEL_QUERY': {'enabled': True, 'max_workers': 4}}):
+            resource_svc = ResourceService(transaction=self.transaction)
+
+            for last_stage, error in invalid_stages:
+                with self.assertRaises(error):
+                    resource_svc.resource_mgr.stat(_aggregate(last_stage), {}, utils.generate_id('domain'))
+
+            with self.assertRaises(ERROR_REQUIRED_QUERY_OPERATION):
+                resource_svc.resource_mgr.stat(_aggregate({'sort': {'key': 'project_id'}})[1:], {},
+                                               utils.generate_id('domain'))
+
+        self.assertEqual(mock_stat_resource.call_count, 0)
+
+    @patch.object(MongoModel, 'connect', return_value=None)
+    def test_resource_stat_async_join(self, *args):
+        stat_results = {
+            'identity.Project': [{
+                'project_id': 'project-123',
+                'project_name': 'ncsoft'
+            }, {
+                'project_id': 'project-456',
+                'project_name': 'nexon'
+            }],
+            'inventory.Server': [{
+                'project_id': 'project-123',
+                'server_count': 100
+            }]
+        }
+        stat_threads = set()
+
+        async def _stat_resource(connector, service, resource, query, domain_id, use_cache=True):
+            stat_threads.add(threading.get_ident())
+            await asyncio.sleep(0.01)
+            return {'results': stat_results[f'{service}.{resource}']}
+
+        params = {
+            'aggregate': [
+                {
+                    'query': {
+                        'resource_type': 'identity.Project',
+                        'query': {}
+                    }
+                },
+                {
+                    'join': {
+                        'resource_type': 'inventory.Server',
+                        'keys': ['project_id'],
+                        'query': {}
+                    }
+                }
+            ],
+            'domain_id': utils.generate_id('domain')
+        }
+
+        with patch.object(AsyncServiceConnector, 'stat_resource', _stat_resource), \
+                patch.dict(config.get_global(), {'AGGREGATE_PARALLEL_QUERY': {'enabled': True, 'mode': 'ASYNC'}}):
+            self.transaction.method = 'stat'
+            resource_svc = ResourceService(transaction=self.transaction)
+            results = resource_svc.stat(params.copy())
+
+        print_data(results, 'test_resource_stat_async_join')
+        StatisticsInfo(results)
+
+        self.assertEqual(len(stat_threads), 1)
+        self.assertNotIn(threading.get_ident(), stat_threads)
+        self.assertEqual(results['total_count'], 2)
+        self.assertEqual(results['results'][0]['server_count'], 100)
+
+    @patch.object(MongoModel, 'connect', return_value=None)
+    @patch.object(ServiceConnector, '_check_resource_type', return_value=None)
+    @patch.object(ServiceConnector, 'stat_resource')
+    def test_resource_stat_single_flight(self, mock_stat_resource, *args):
+        def _stat_resource(service, resource, query, domain_id, use_cache=True):
+            time.sleep(0.2)
+            return {'results': [{'project_id': 'project-123', 'server_count': 100}]}
+
+        mock_stat_resource.side_effect = _stat_resource
+
+        params = {
+            'aggregate': [
+                {
+                    'query': {
+                        'resource_type': 'inventory.Server',
+                        'query': {}
+                    }
+                }
+            ],
+            'domain_id': utils.generate_id('domain')
+        }
+
+        results = []
+
+        def _stat():
+            results.append(resource_svc.stat(copy.deepcopy(params)))
+
+        with patch.dict(config.get_global(), {'STAT_SINGLE_FLIGHT': {'enabled': True}}):
+            self.transaction.method = 'stat'
+            resource_svc = ResourceService(transaction=self.transaction)
+
+            threads = [threading.Thread(target=_stat) for _ in range(5)]
+            for thread in threads:
+                thread.start()
+
+            for thread in threads:
+                thread.join()
+
+        print_data(results[0], 'test_resource_stat_single_flight')
+        StatisticsInfo(results[0])
+
+        self.assertEqual(mock_stat_resource.call_count, 1)
+        self.assertEqual(len(results), 5)
+        self.assertEqual(single_flight.get_stats()['resource_stat']['in_flight'], 0)
+        self.assertGreaterEqual(single_flight.get_stats()['resource_stat']['coalesced'], 4)
+
+        # Each caller gets its own copy of the shared result
+        results[0]['results'][0]['server_count'] = 0
+        self.assertEqual(results[1]['results'][0]['server_count'], 100)
+
+    @patch.object(MongoModel, 'connect', return_value=None)
+    @patch.object(ServiceConnector, '_check_resource_type', return_value=None)
+    @patch.object(ServiceConnector, 'stat_resource')
+    def test_resource_stat_shared_prefix(self, mock_stat_resource, *args):
+        def _stat_resource(service, resource, query, domain_id, use_cache=True):
+            if resource == 'Project':
+                return {'results': [{'project_id': 'project-123'}, {'project_id': 'project-456'}]}
+            else:
+                return {'results': [{'project_id': 'project-123', 'server_count': 100},
+                                    {'project_id': 'project-456', 'server_count': 65}]}
+
+        mock_stat_resource.side_effect = _stat_resource
+
+        def _aggregate(domain_id, last_stage):
+            return [
+                {'query': {'resource_type': 'identity.Project',
+                           'query': {'filter': [{'k': 'domain_id', 'v': domain_id, 'o': 'eq'}]}}},
+                {'join': {'resource_type': 'inventory.Server', 'keys': ['project_id'], 'query': {}}},
+                last_stage
+            ]
+
+        domain_id = utils.generate_id('domain')
+        other_domain_id = utils.generate_id('domain')
+
+        with patch.dict(config.get_global(), {'AGGREGATE_SHARED_EXECUTION': {'enabled': True}}):
+            resource_svc = ResourceService(transaction=self.transaction)
+            resource_mgr = resource_svc.resource_mgr
+
+            sorted_results = resource_mgr.stat(_aggregate(domain_id, {'sort': {'key': 'server_count'}}), {},
+                                               domain_id, shared_key='tick-1')
+            self.assertEqual(mock_stat_resource.call_count, 2)
+
+            # The query and join of the same tick are shared and only the trailing stage is executed
+            formula_stage = {'formula': {'eval': 'double = server_count * 2'}}
+            formula_results = resource_mgr.stat(_aggregate(domain_id, formula_stage), {}, domain_id,
+                                                shared_key='tick-1')
+            self.assertEqual(mock_stat_resource.call_count, 2)
+
+            # Results are not shared between domains and ticks
+            resource_mgr.stat(_aggregate(other_domain_id, {'sort': {'key': 'server_count'}}), {},
+                              other_domain_id, shared_key='tick-1')
+            resource_mgr.stat(_aggregate(domain_id, {'sort': {'key': 'server_count'}}), {},
+                              domain_id, shared_key='tick-2')
+            self.assertEqual(mock_stat_resource.call_count, 6)
+
+        self.assertEqual(sorted_results['results'][0]['project_id'], 'project-456')
+        self.assertEqual(formula_results['results'][0]['double'], 200)
+        self.assertNotIn('double', sorted_results['results'][0])
+
+    @patch.object(MongoModel, 'connect', return_value=None)
+    @patch.object(ServiceConnector, '_check_resource_type', return_value=None)
+    @patch.object(ServiceConnector, 'stat_resource')
+    def test_resource_stat_concurrent_shared_prefix(self, mock_stat_resource, *args):
+        def _stat_resource(service, resource, query, domain_id, use_cache=True):
+            time.sleep(0.2)
+            if resource == 'Project':
+                return {'results': [{'project_id': 'project-123'}, {'project_id': 'project-456'}]}
+            else:
+                return {'results': [{'project_id': 'project-123', 'server_count': 100},
+                                    {'project_id': 'project-456', 'server_count': 65}]}
+
+        mock_stat_resource.side_effect = _stat_resource
+
+        domain_id = utils.generate_id('domain')
+        last_stages = [
+            {'sort': {'key': 'server_count'}},
+            {'sort': {'key': 'server_count', 'desc': True}},
+            {'formula': {'eval': 'double = server_count * 2'}},
+            {'fill_na': {'data': {'server_count': 0}}}
+        ]
+
+        results = []
+
+        def _stat(last_stage):
+            aggregate = [
+                {'query': {'resource_type': 'identity.Project', 'query': {}}},
+                {'join': {'resource_type': 'inventory.Server', 'keys': ['project_id'], 'query': {}}},
+                last_stage
+            ]
+            results.append(resource_mgr.stat(aggregate, {}, domain_id, shared_key='tick-concurrent'))
+
+        with patch.dict(config.get_global(), {'AGGREGATE_SHARED_EXECUTION': {'enabled': True}}):
+            resource_svc = ResourceService(transaction=self.transaction)
+            resource_mgr = resource_svc.resource_mgr
+
+            threads = [threading.Thread(target=_stat, args=(last_stage,)) for last_stage in last_stages]
+            for thread in threads:
+                thread.start()
+
+            for thread in threads:
+                thread.join()
+
+        # The jobs of the same tick wait for the one computing the query and join
+        self.assertEqual(mock_stat_resource.call_count, 2)
+        self.assertEqual(len(results), 4)
+        self.assertEqual(single_flight.get_stats()['aggregate_shared_prefix']['in_flight'], 0)
+        self.assertGreaterEqual(single_flight.get_stats()['aggregate_shared_prefix']['coalesced'], 3)
+
+    @patch.object(MongoModel, 'connect', return_value=None)
+    @patch.object(ServiceConnector, '_check_resource_type', return_value=None)
+    @patch.object(ServiceConnector, '_change_message')
+    @patch.object(ServiceConnector, '_init_client', autospec=True)
+    def test_resource_stat_with_cache(self, mock_init_client, mock_change_message, *args):
+        def _init_client(connector, service, resource):
+            connector.client[service] = MagicMock()
+
+        mock_init_client.side_effect = _init_client
+        mock_change_message.return_value = {
+            'results': [{
+                'project_id': 'project-123',
+                'server_count': 100
+            }]
+        }
+
+        params = {
+            'aggregate': [
+                {
+                    'query': {
+                        'resource_type': 'inventory.Server',
+                        'query': {
+                            'aggregate': [
+                                {
+                                    'group': {
+                                        'keys': [
+                                            {
+                                                'key': 'project_id',
+                                                'name': 'project_id'
+                                            }
+                                        ],
+                                        'fields': [
+                                            {
+                                                'operator': 'count',
+                                                'name': 'server_count'
+                                            }
+                                        ]
+                                    }
+                                }
+                            ]
+                        }
+                    }
+                }
+            ],
+            'domain_id': utils.generate_id('domain')
+        }
+
+        global_conf = {
+            'CACHES': {
+                'local': {
+                    'backend': 'spaceone.core.cache.local_cache.LocalCache',
+                    'max_size': 128,
+                    'ttl': 86400
+                }
+            },
+            'STAT_RESOURCE_CACHE': {
+                'enabled': True,
+                'backends': ['local'],
+                'ttl': 60
+            }
+        }
+
+        with patch.dict(config.get_global(), global_conf):
+            self.transaction.method = 'stat'
+            resource_svc = ResourceService(transaction=self.transaction)
+            resource_svc.stat(params.copy())
+            results = resource_svc.stat(params.copy())
+            self.assertEqual(mock_change_message.call_count, 1)
+
+            resource_svc.stat(dict(params, use_cache=False))
+            self.assertEqual(mock_change_message.call_count, 2)
+
+            # Responses are not shared with the other users who may have narrower permissions
+            user_id = self.transaction.get_meta('user_id')
+            self.transaction.set_meta('user_id', 'other-user')
+            try:
+                resource_svc.stat(params.copy())
+            finally:
+                self.transaction.set_meta('user_id', user_id)
+
+            self.assertEqual(mock_change_message.call_count, 3)
+
+        print_data(results, 'test_resource_stat_with_cache')
+        StatisticsInfo(results)
+
+        self.assertEqual(results['results'][0]['server_count'], 100)
+
+    @patch.object(MongoModel, 'connect', return_value=None)
+    @patch.object(ServiceConnector, '_check_resource_type', return_value=None)
+    @patch.object(ServiceConnector, 'stat_resource')
+    def test_resource_stat_page(self, mock_stat_resource, *args):
+        mock_stat_resource.side_effect = [
+            {
+                'results': [{
+                    'project_id': f'project-{i}',
+                    'server_count': i if i % 2 == 0 else None
+                } for i in range(100)]
+            }
+        ]
+
+        params = {
+            'aggregate': [
+                {
+                    'query': {
+                        'resource_type': 'inventory.Server',
+                        'query': {}
+                    }
+                }
+            ],
+            'page': {
+                'start': 11,
+                'limit': 5
+            },
+            'domain_id': utils.generate_id('domain')
+        }
+
+        self.transaction.method = 'stat'
+        resource_svc = ResourceService(transaction=self.transaction)
+        results = resource_svc.stat(params.copy())
+
+        print_data(results, 'test_resource_stat_page')
+        StatisticsInfo(results)
+
+        self.assertEqual(results['total_count'], 100)
+        self.assertEqual([result['project_id'] for result in results['results']],
+                         ['project-10', 'project-11', 'project-12', 'project-13', 'project-14'])
+        self.assertIsNone(results['results'][1]['server_count'])
+
+    @patch.object(MongoModel, 'connect', return_value=None)
+    @patch.object(ServiceConnector, '_check_resource_type', return_value=None)
+    @patch.object(ServiceConnector, 'stat_resource')
+    def test_resource_stat_top_k_sort(self, mock_stat_resource, *args):
+        server_counts = random.sample(range(1000), 50)
+        mock_stat_resource.side_effect = [
+            {
+                'results': [{
+                    'project_id': utils.generate_id('project'),
+                    'server_count': server_count
+                } for server_count in server_counts]
+            }
+        ]
+
+        params = {
+            'aggregate': [
+                {
+                    'query': {
+                        'resource_type': 'inventory.Server',
+                        'query': {}
+                    }
+                },
+                {
+                    'sort': {
+                        'key': 'server_count',
+                        'desc': True
+                    }
+                }
+            ],
+            'page': {
+                'start': 2,
+                'limit': 3
+            },
+            'domain_id': utils.generate_id('domain')
+        }
+
+        self.transaction.method = 'stat'
+        resource_svc = ResourceService(transaction=self.transaction)
+        results = resource_svc.stat(params.copy())
+
+        print_data(results, 'test_resource_stat_top_k_sort')
+        StatisticsInfo(results)
+
+        self.assertEqual(results['total_count'], 50)
+        self.assertEqual([result['server_count'] for result in results['results']],
+                         sorted(server_counts, reverse=True)[1:4])
+
+    @patch.object(MongoModel, 'connect', return_value=None)
+    @patch.object(ServiceConnector, '_check_resource_type', return_value=None)
+    @patch.object(ServiceConnector, 'stat_resource')
+    def test_resource_stat_formula_query(self, mock_stat_resource, *args):
+        mock_stat_resource.side_effect = [
+            {
+                'results': [{
+                    'project_id': 'project-123',
+                    'server_count': 100,
+                    'cloud_service_count': 45
+                }, {
+                    'project_id': 'project-456',
+                    'server_count': 65,
+                    'cloud_service_count': 87
+                }, {
+                    'project_id': 'project-789',
+                    'server_count': 77,
+                    'cloud_service_count': 104
+                }]
+            }
+        ]
+
+        params = {
+            'aggregate': [
+                {
+                    'query': {
+                        'resource_type': 'inventory.Server',
+                        'query': {}
+                    }
+                },
+                {
+                    'formula': {
+                        'eval': 'resource_count = server_count + cloud_service_count'
+                    }
+                },
+                {
+                    'formula': {
+                        'query': 'resource_count > 150 and not server_count == 77'
+                    }
+                }
+            ],
+            'domain_id': utils.generate_id('domain')
+        }
+
+        self.transaction.method = 'stat'
+        resource_svc = ResourceService(transaction=self.transaction)
+        results = resource_svc.stat(params.copy())
+
+        print_data(results, 'test_resource_stat_formula_query')
+        StatisticsInfo(results)
+
+        self.assertEqual(results['total_count'], 1)
+        self.assertEqual(results['results'][0]['project_id'], 'project-456')
+        self.assertEqual(results['results'][0]['resource_count'], 152)
+
+    def test_verify_wrong_formula(self):
+        resource_mgr = ResourceManager(transaction=self.transaction)
+
+        with self.assertRaises(ERROR_STATISTICS_FORMULA):
+            resource_mgr.verify_formulas([{'formula': {'eval': 'resource_count = server_count +'}}])
+
+        with self.assertRaises(ERROR_STATISTICS_FORMULA):
+            resource_mgr.verify_formulas([{'formula': {'eval': 'server_count + cloud_service_count'}}])
+
+    @patch.object(MongoModel, 'connect', return_value=None)
+    @patch.object(ServiceConnector, '_check_resource_type', return_value=None)
+    @patch.object(ServiceConnector, 'stat_resource')
+    def test_resource_stat_explain(self, mock_stat_resource, *args):
+        mock_stat_resource.side_effect = [
+            {
+                'results': [{
+                    'project_id': 'project-123',
+                    'project_name': 'ncsoft'
+                }, {
+                    'project_id': 'project-456',
+                    'project_name': 'nexon'
+                }]
+            }, {
+                'results': [{
+                    'project_id': 'project-123',
+                    'server_count': 100
+                }]
+            }
+        ]
+
+        params = {
+            'aggregate': [
+                {
+                    'query': {
+                        'resource_type': 'identity.Project',
+                        'query': {}
+                    }
+                },
+                {
+                    'join': {
+                        'resource_type': 'inventory.Server',
+                        'keys': ['project_id'],
+                        'query': {}
+                    }
+                },
+                {
+                    'sort': {
+                        'key': 'project_id',
+                        'desc': True
+                    }
+                }
+            ],
+            'explain': True,
+            'domain_id': utils.generate_id('domain')
+        }
+
+        self.transaction.method = 'stat'
+        resource_svc = ResourceService(transaction=self.transaction)
+        results = resource_svc.stat(params.copy())
+
+        print_data(results, 'test_resource_stat_explain')
+        StatisticsInfo(results)
+
+        stages = results['explain']['stages']
+        self.assertEqual([stage['stage'] for stage in stages], ['query', 'join', 'sort'])
+        self.assertEqual(stages[1]['resource_type'], 'inventory.Server')
+        self.assertEqual(stages[1]['upstream_rows'], 1)
+        self.assertEqual(stages[1]['rows_in'], 2)
+        self.assertEqual(stages[1]['rows_out'], 2)
+        self.assertIn('upstream_time', stages[0])
+        self.assertIn('memory_delta', stages[2])
+        self.assertIn('serialization_time', results['explain'])
+
 
 if __name__ == "__main__":
     unittest.main(testRunner=RichTestRunner)